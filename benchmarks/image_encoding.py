@@ -0,0 +1,74 @@
+"""Benchmark peak memory and time of encoding large image files to data URIs.
+
+Compares the streaming, memory-mapped encoder used by
+`tinyloop.features.vision` against the naive read/b64encode/f-string approach.
+
+Usage:
+    python benchmarks/image_encoding.py [sizes in MB, default: 10 25 50]
+"""
+
+import base64
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from tinyloop.features.image_cache import set_image_cache
+from tinyloop.features.vision import _encode_image_from_file
+
+MB = 1024 * 1024
+
+
+def naive_encode(file_path: str) -> str:
+    """The previous implementation: four copies of the image at once."""
+    with open(file_path, "rb") as file:
+        file_data = file.read()
+    encoded_data = base64.b64encode(file_data).decode("utf-8")
+    return f"data:image/tiff;base64,{encoded_data}"
+
+
+def streaming_encode(file_path: str) -> str:
+    data_uri, _ = _encode_image_from_file(file_path)
+    return data_uri
+
+
+def measure(func, file_path: str):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func(file_path)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10, 25, 50]
+    set_image_cache(None)
+
+    print(
+        f"{'size':>6} {'encoder':>10} {'time (s)':>9} {'peak (MB)':>10} {'x size':>7}"
+    )
+    with tempfile.TemporaryDirectory() as directory:
+        for size in sizes:
+            file_path = os.path.join(directory, f"scan_{size}mb.tiff")
+            with open(file_path, "wb") as file:
+                file.write(os.urandom(size * MB))
+
+            results = {}
+            for name, func in (
+                ("naive", naive_encode),
+                ("streaming", streaming_encode),
+            ):
+                result, elapsed, peak = measure(func, file_path)
+                results[name] = result
+                print(
+                    f"{size:>4}MB {name:>10} {elapsed:>9.3f} "
+                    f"{peak / MB:>10.1f} {peak / (size * MB):>7.2f}"
+                )
+            assert results["naive"] == results["streaming"]
+
+
+if __name__ == "__main__":
+    main()
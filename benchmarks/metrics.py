@@ -0,0 +1,64 @@
+"""Benchmark the cost of recording metrics, per update.
+
+Compares the per-thread sharded counter and histogram with a counter
+guarded by a single lock, from one and from several threads.
+
+Usage:
+    python benchmarks/metrics.py [updates per thread, default: 200000]
+"""
+
+import sys
+import threading
+import time
+
+from tinyloop.utils.metrics import MetricsRegistry
+
+
+class LockedCounter:
+    def __init__(self):
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+
+def measure(update, updates, threads):
+    def work():
+        for _ in range(updates):
+            update()
+
+    workers = [threading.Thread(target=work) for _ in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return (time.perf_counter() - start) / (updates * threads)
+
+
+def main():
+    updates = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    registry = MetricsRegistry()
+    counter = registry.counter("requests_total", "Requests", ("model", "module"))
+    histogram = registry.histogram("latency_seconds", "Latency", ("model", "module"))
+    locked = LockedCounter()
+
+    rows = [
+        ("sharded counter", lambda: counter.inc("gpt-4.1", "ToolLoop")),
+        ("locked counter", lambda: locked.inc("gpt-4.1", "ToolLoop")),
+        (
+            "sharded histogram",
+            lambda: histogram.observe("gpt-4.1", "ToolLoop", value=0.8),
+        ),
+    ]
+    print(f"{'Per update':<20} {'1 thread':>10} {'8 threads':>10}")
+    for label, update in rows:
+        single = measure(update, updates, 1)
+        multi = measure(update, updates, 8)
+        print(f"{label:<20} {single * 1e9:7.0f} ns {multi * 1e9:7.0f} ns")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Benchmark streaming a large structured output through the partial parser.
+
+Compares parsing the value and rebuilding the partial model on every chunk
+with only doing so when the parser says a new value is due.
+
+Usage:
+    python benchmarks/partial_json.py [sizes in KB, default: 10 20 40]
+"""
+
+import json
+import sys
+import time
+from typing import List
+
+from pydantic import BaseModel
+
+from tinyloop.features.partial_json import PartialJSONParser, partial_model
+
+CHUNK = 4
+
+
+class Item(BaseModel):
+    name: str
+    description: str
+    tags: List[str]
+
+
+class Catalog(BaseModel):
+    items: List[Item]
+
+
+def document(size: int) -> str:
+    item = {"name": "Widget", "description": "A widget " * 8, "tags": ["a", "b"]}
+    count = size // len(json.dumps(item)) + 1
+    return json.dumps({"items": [item] * count})
+
+
+def every_chunk(text: str) -> int:
+    parser = PartialJSONParser()
+    for start in range(0, len(text), CHUNK):
+        partial_model(Catalog, parser.feed(text[start : start + CHUNK]))
+    return len(text) // CHUNK
+
+
+def when_due(text: str) -> int:
+    parser = PartialJSONParser()
+    parses = 0
+    for start in range(0, len(text), CHUNK):
+        parser.scan(text[start : start + CHUNK])
+        if parser.is_due():
+            partial_model(Catalog, parser.value)
+            parses += 1
+    return parses
+
+
+def main():
+    sizes = [int(size) for size in sys.argv[1:]] or [10, 20, 40]
+    print(f"{'Size':>8} {'every chunk':>18} {'when due':>18}")
+    for size in sizes:
+        text = document(size * 1024)
+        row = []
+        for func in (every_chunk, when_due):
+            start = time.perf_counter()
+            parses = func(text)
+            row.append(f"{time.perf_counter() - start:7.2f} s ({parses:>5})")
+        print(f"{size:>5} KB {row[0]:>18} {row[1]:>18}")
+
+
+if __name__ == "__main__":
+    main()
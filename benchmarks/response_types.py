@@ -0,0 +1,81 @@
+"""Benchmark building streamed response objects, per chunk.
+
+Compares the slot-based response types with their pydantic models.
+
+Usage:
+    python benchmarks/response_types.py [chunks, default: 200000]
+"""
+
+import sys
+import time
+import tracemalloc
+
+from tinyloop.types import (
+    LLMStreamingResponse,
+    LLMStreamingResponseModel,
+    ToolCall,
+    ToolCallModel,
+)
+
+
+def measure(build, chunks):
+    start = time.perf_counter()
+    for index in range(chunks):
+        build(index)
+    elapsed = time.perf_counter() - start
+
+    # Memory held by the chunks a caller keeps
+    tracemalloc.start()
+    kept = [build(index) for index in range(chunks)]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del kept
+    return elapsed / chunks, size / chunks
+
+
+def main():
+    chunks = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    text = "partial response text"
+    tool_calls = [
+        ToolCall(function_name="get_weather", args={"city": "Lisbon"}, id="1")
+    ]
+    tool_call_models = [
+        ToolCallModel(function_name="get_weather", args={"city": "Lisbon"}, id="1")
+    ]
+
+    rows = [
+        (
+            "pydantic",
+            measure(
+                lambda i: LLMStreamingResponseModel(
+                    id="chunk", response=text, tool_calls=tool_call_models
+                ),
+                chunks,
+            ),
+        ),
+        (
+            "slots",
+            measure(
+                lambda i: LLMStreamingResponse(
+                    id="chunk", response=text, tool_calls=tool_calls
+                ),
+                chunks,
+            ),
+        ),
+        (
+            "slots + to_model()",
+            measure(
+                lambda i: LLMStreamingResponse(
+                    id="chunk", response=text, tool_calls=tool_calls
+                ).to_model(),
+                chunks,
+            ),
+        ),
+    ]
+    print(f"{'Per chunk':<20} {'time':>10} {'memory':>10}")
+    for label, (seconds, size) in rows:
+        print(f"{label:<20} {seconds * 1e9:8.0f} ns {size:8.0f} B")
+
+
+if __name__ == "__main__":
+    main()
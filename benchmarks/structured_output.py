@@ -0,0 +1,116 @@
+"""Benchmark the per-call overhead of a large nested response_format.
+
+Compares building the provider schema, hashing the request and validating the
+response on every call with the per-class caches.
+
+Usage:
+    python benchmarks/structured_output.py [iterations, default: 2000]
+"""
+
+import json
+import sys
+import timeit
+from typing import Dict, List, Literal, Optional
+
+from litellm.utils import type_to_response_format_param
+from pydantic import BaseModel, Field
+
+from tinyloop.features.structured_output import get_response_format, validate_output
+from tinyloop.inference.singleflight import make_request_key
+
+
+class Address(BaseModel):
+    street: str
+    city: str
+    postal_code: Optional[str] = None
+    country: str = Field(description="ISO country code")
+
+
+class Contact(BaseModel):
+    name: str
+    email: Optional[str] = None
+    phone: Optional[str] = None
+    addresses: List[Address] = []
+
+
+class LineItem(BaseModel):
+    sku: str
+    description: str
+    quantity: int
+    unit_price: float
+    tax_rate: float = 0.0
+
+
+class Invoice(BaseModel):
+    number: str
+    issued_on: str
+    currency: Literal["EUR", "USD", "GBP"]
+    seller: Contact
+    buyer: Contact
+    items: List[LineItem]
+    notes: Optional[str] = None
+    metadata: Dict[str, str] = {}
+
+
+class Extraction(BaseModel):
+    invoices: List[Invoice]
+    warnings: List[str] = []
+
+
+def make_response() -> str:
+    contact = {
+        "name": "ACME",
+        "email": "billing@acme.test",
+        "addresses": [{"street": "Main St 1", "city": "Lisbon", "country": "PT"}],
+    }
+    items = [
+        {"sku": f"SKU-{i}", "description": "Widget", "quantity": i, "unit_price": 9.5}
+        for i in range(20)
+    ]
+    invoice = {
+        "number": "INV-1",
+        "issued_on": "2025-01-01",
+        "currency": "EUR",
+        "seller": contact,
+        "buyer": contact,
+        "items": items,
+    }
+    return json.dumps({"invoices": [invoice] * 5})
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    response = make_response()
+    messages = [{"role": "user", "content": "Extract the invoices"}]
+
+    def uncached():
+        response_format = type_to_response_format_param(Extraction)
+        make_request_key({"messages": messages, "response_format": response_format})
+        Extraction.model_validate_json(response)
+
+    def cached():
+        response_format = get_response_format(Extraction)
+        make_request_key(
+            {"messages": messages, "response_format": response_format.serialized}
+        )
+        validate_output(response, Extraction)
+
+    rows = [
+        (
+            "Schema + key + validation, per call",
+            timeit.timeit(uncached, number=iterations),
+        ),
+        ("Cached schema + key + validation", timeit.timeit(cached, number=iterations)),
+        (
+            "Schema generation alone",
+            timeit.timeit(
+                lambda: type_to_response_format_param(Extraction), number=iterations
+            ),
+        ),
+    ]
+    for label, seconds in rows:
+        print(f"{label:<40} {seconds / iterations * 1e6:9.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Benchmark building tool definitions for a large tool catalog.
+
+Usage:
+    python benchmarks/tool_definitions.py [number of tools, default: 1000]
+"""
+
+import enum
+import sys
+import time
+from typing import Annotated, List, Literal, Optional
+
+from pydantic import BaseModel, Field
+
+from tinyloop.features.function_calling import Tool
+
+
+class Priority(enum.Enum):
+    LOW = "low"
+    HIGH = "high"
+
+
+class Address(BaseModel):
+    street: str
+    city: str
+    country: str = "PT"
+
+
+class Customer(BaseModel):
+    name: str
+    email: Optional[str] = None
+    addresses: List[Address] = []
+
+
+def make_function(index: int):
+    def create_ticket(
+        title: str,
+        customer: Customer,
+        priority: Priority = Priority.LOW,
+        tags: Optional[List[str]] = None,
+        channel: Literal["email", "chat", "phone"] = "email",
+        estimate: Annotated[int, Field(description="Hours", ge=0)] = 1,
+    ):
+        """Create a support ticket.
+
+        Args:
+            title: Short summary of the issue
+            customer: Who reported it
+        """
+        return index
+
+    create_ticket.__name__ = f"create_ticket_{index}"
+    return create_ticket
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    functions = [make_function(i) for i in range(count)]
+
+    start = time.perf_counter()
+    tools = [Tool(func) for func in functions]
+    cold = time.perf_counter() - start
+
+    start = time.perf_counter()
+    tools = [Tool(func) for func in functions]
+    warm = time.perf_counter() - start
+
+    print(f"{len(tools)} tools, first build:  {cold * 1000:8.1f} ms")
+    print(f"{len(tools)} tools, cached build: {warm * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""Benchmark the per-call overhead of validating tool arguments.
+
+Usage:
+    python benchmarks/tool_validation.py [iterations, default: 100000]
+"""
+
+import sys
+import timeit
+from typing import List, Literal, Optional
+
+from tinyloop.features.function_calling import Tool, function_to_args_model
+
+
+def search_flights(
+    origin: str,
+    destination: str,
+    date: str,
+    passengers: int = 1,
+    cabin: Literal["economy", "business", "first"] = "economy",
+    max_stops: Optional[int] = None,
+    airlines: Optional[List[str]] = None,
+):
+    """Search flights between two airports."""
+    return origin, destination
+
+
+ARGS = {
+    "origin": "LIS",
+    "destination": "YVR",
+    "date": "2025-06-01",
+    "passengers": "2",
+    "cabin": "business",
+    "airlines": ["TP", "AC"],
+}
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+
+    build = timeit.timeit(lambda: function_to_args_model(search_flights), number=100)
+    build /= 100
+    tool = Tool(search_flights)
+    raw = timeit.timeit(lambda: search_flights(**ARGS), number=iterations)
+    validated = timeit.timeit(
+        lambda: search_flights(**tool.validate_args(ARGS)), number=iterations
+    )
+
+    rows = [
+        ("Compiling the validator (once per function)", build),
+        ("Raw call", raw / iterations),
+        ("Validated call", validated / iterations),
+        ("Validation overhead per call", (validated - raw) / iterations),
+    ]
+    for label, seconds in rows:
+        print(f"{label:<45} {seconds * 1e6:9.2f} us")
+
+
+if __name__ == "__main__":
+    main()
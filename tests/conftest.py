@@ -56,3 +56,23 @@ def sample_messages():
 def simple_question():
     """Simple question for testing."""
     return [{"role": "user", "content": "What is 2+2? Answer with just the number."}]
+
+
+@pytest.fixture
+def make_model_response():
+    """Factory for litellm ModelResponse objects used to mock completions."""
+    from litellm import ModelResponse
+
+    def _make(content="Hello!", tool_calls=None, cost=0.001, usage=None):
+        message = {"role": "assistant", "content": content}
+        if tool_calls:
+            message["tool_calls"] = tool_calls
+        response = ModelResponse(
+            choices=[{"message": message}],
+            usage=usage
+            or {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15},
+        )
+        response._hidden_params = {"response_cost": cost}
+        return response
+
+    return _make
@@ -0,0 +1,357 @@
+"""
+Tests for token usage accounting and budgets.
+"""
+
+import asyncio
+
+import pytest
+from litellm import ModelResponseStream
+from litellm.types.utils import Usage
+from PIL import Image as PILImage
+from pydantic import BaseModel
+
+from tinyloop.features.function_calling import Tool
+from tinyloop.features.vision import Image
+from tinyloop.inference.budget import (
+    Budget,
+    BudgetExceededError,
+    TokenUsage,
+    estimate_input_tokens,
+    get_token_costs,
+)
+from tinyloop.inference.litellm import LLM
+from tinyloop.modules.tool_loop import ToolLoop
+
+MODEL = "openai/gpt-4.1-nano"
+
+
+def get_weather(location: str):
+    """Get the weather for a city."""
+    return f"Sunny in {location}"
+
+
+class TestTokenUsage:
+    """Test reading and adding token usage."""
+
+    def test_from_litellm(self):
+        usage = TokenUsage.from_litellm(
+            Usage(
+                prompt_tokens=100,
+                completion_tokens=40,
+                total_tokens=140,
+                prompt_tokens_details={"cached_tokens": 64},
+                completion_tokens_details={"reasoning_tokens": 30},
+            )
+        )
+
+        assert usage == TokenUsage(
+            input_tokens=100, output_tokens=40, cached_tokens=64, reasoning_tokens=30
+        )
+        assert usage.total_tokens == 140
+
+    def test_from_dict_and_none(self):
+        assert TokenUsage.from_litellm(
+            {"prompt_tokens": 3, "completion_tokens": 2}
+        ) == TokenUsage(input_tokens=3, output_tokens=2)
+        assert TokenUsage.from_litellm(None) == TokenUsage()
+
+    def test_sum(self):
+        total = TokenUsage(input_tokens=1, output_tokens=2) + TokenUsage(
+            input_tokens=3, cached_tokens=1
+        )
+
+        assert total == TokenUsage(input_tokens=4, output_tokens=2, cached_tokens=1)
+
+
+class TestLLMUsage:
+    """Test usage accounting on LLM."""
+
+    def test_usage_per_call_and_instance(self, make_model_response):
+        llm = LLM(model="openai/gpt-4.1-nano")
+        llm.sync_client = lambda **kwargs: make_model_response()
+
+        response = llm(prompt="Hello")
+        llm(prompt="Again")
+
+        assert response.usage == TokenUsage(input_tokens=10, output_tokens=5)
+        assert len(llm.run_usage) == 2
+        assert llm.get_total_usage().total_tokens == 30
+        assert llm.fork().get_total_usage() == TokenUsage()
+
+
+class TestEstimateInputTokens:
+    """Test estimating the input of a request before sending it."""
+
+    def test_text_and_tools(self):
+        messages = [{"role": "user", "content": "What is the weather in Lisbon?"}]
+        tools = [Tool(get_weather).definition]
+
+        text = estimate_input_tokens(MODEL, messages)
+
+        assert text > 0
+        assert estimate_input_tokens(MODEL, messages, tools) > text
+
+    def test_images(self):
+        image = Image.from_PIL(PILImage.new("RGB", (1024, 1024)))
+        messages = [
+            {
+                "role": "user",
+                "content": [
+                    {"type": "text", "text": "Describe"},
+                    *image.format(),
+                ],
+            }
+        ]
+        text = estimate_input_tokens(MODEL, [{"role": "user", "content": "Describe"}])
+
+        assert estimate_input_tokens(MODEL, messages) == text + image.estimate_tokens(
+            MODEL
+        )
+
+    def test_remote_images_are_assumed_large(self):
+        messages = [
+            {
+                "role": "user",
+                "content": [
+                    {"type": "image_url", "image_url": {"url": "https://x.io/a.png"}}
+                ],
+            }
+        ]
+
+        assert estimate_input_tokens("claude-sonnet-4", messages) >= 1500
+
+
+def _client(make_model_response, calls, output_tokens=5):
+    """Client reporting the estimated input of each request as its usage."""
+
+    def client(**params):
+        calls.append(params)
+        input_tokens = estimate_input_tokens(
+            MODEL, params["messages"], params.get("tools")
+        )
+        return make_model_response(
+            usage={
+                "prompt_tokens": input_tokens,
+                "completion_tokens": output_tokens,
+                "total_tokens": input_tokens + output_tokens,
+            }
+        )
+
+    return client
+
+
+class TestBudget:
+    """Test budget enforcement."""
+
+    def _llm(self, make_model_response, calls, **kwargs):
+        llm = LLM(model=MODEL, **kwargs)
+        llm.sync_client = _client(make_model_response, calls)
+        return llm
+
+    def test_calls_whose_input_does_not_fit_are_rejected(self, make_model_response):
+        calls = []
+        budget = Budget(max_tokens=1000)
+        llm = self._llm(make_model_response, calls)
+        prompt = "word " * 900
+
+        llm(prompt=prompt, budget=budget)
+        with pytest.raises(BudgetExceededError, match="the next call needs about"):
+            llm(prompt=prompt, budget=budget)
+
+        assert len(calls) == 1
+        assert budget.usage.total_tokens <= 1000
+        # The rejected call left the history untouched
+        assert len(llm.get_history()) == 2
+
+    def test_rejects_calls_once_spent(self, make_model_response):
+        calls = []
+        budget = Budget(max_tokens=10)
+        budget.record(TokenUsage(input_tokens=10), 0)
+        llm = self._llm(make_model_response, calls, budget=budget)
+
+        with pytest.raises(BudgetExceededError, match="10 of 10 tokens"):
+            llm(prompt="One")
+
+        assert calls == []
+
+    def test_completion_length_is_capped_after_the_input(self, make_model_response):
+        calls = []
+        llm = self._llm(make_model_response, calls)
+        budget = Budget(max_tokens=200)
+
+        llm(prompt="One", budget=budget)
+        llm(prompt="Two", budget=budget, max_tokens=10)
+        llm(prompt="Three", budget=budget, max_tokens=190)
+
+        used = 0
+        for params, given in zip(calls, (None, 10, 190)):
+            estimate = estimate_input_tokens(MODEL, params["messages"])
+            left = 200 - used - estimate
+            assert params["max_tokens"] == (left if given is None else min(given, left))
+            used += estimate + 5
+        assert budget.usage.total_tokens == used
+
+    def test_cost_budget(self, make_model_response):
+        calls = []
+        llm = self._llm(make_model_response, calls)
+        budget = Budget(max_cost=0.0015)
+
+        llm(prompt="One", budget=budget)
+        llm(prompt="Two", budget=budget)
+        with pytest.raises(BudgetExceededError, match="spent"):
+            llm(prompt="Three", budget=budget)
+        assert budget.cost == pytest.approx(0.002)
+        assert budget.remaining_cost == 0.0
+
+    def test_cost_projection(self, make_model_response):
+        input_cost, output_cost = get_token_costs(MODEL)
+        calls = []
+        llm = self._llm(make_model_response, calls)
+
+        with pytest.raises(BudgetExceededError, match="the next call needs about"):
+            llm(prompt="word " * 1000, budget=Budget(max_cost=500 * input_cost))
+        assert calls == []
+
+        llm(prompt="Hello", budget=Budget(max_cost=0.0001))
+        estimate = estimate_input_tokens(MODEL, calls[0]["messages"])
+        assert calls[0]["max_tokens"] == int(
+            (0.0001 - estimate * input_cost) / output_cost
+        )
+
+    def test_budget_shared_across_instances(self, make_model_response):
+        budget = Budget(max_tokens=40)
+        llms = [self._llm(make_model_response, []) for _ in range(4)]
+
+        results = []
+        for llm in llms:
+            try:
+                results.append(llm(prompt="Extract", budget=budget))
+            except BudgetExceededError:
+                results.append(None)
+
+        assert results[0] is not None
+        assert results[-1] is None
+        assert budget.usage.total_tokens <= 40
+
+    @pytest.mark.asyncio
+    async def test_concurrent_calls_reserve_the_budget(self, make_model_response):
+        calls = []
+        client = _client(make_model_response, calls)
+
+        async def async_client(**params):
+            # Keep every call in flight until all of them were checked
+            await asyncio.sleep(0.05)
+            return client(**params)
+
+        llms = [LLM(model=MODEL) for _ in range(5)]
+        for llm in llms:
+            llm.async_client = async_client
+        budget = Budget(max_tokens=1000)
+        prompt = "word " * 900
+
+        results = await asyncio.gather(
+            *(llm.ainvoke(prompt=prompt, budget=budget) for llm in llms),
+            return_exceptions=True,
+        )
+
+        rejected = [r for r in results if isinstance(r, BudgetExceededError)]
+        assert len(calls) == 1
+        assert len(rejected) == 4
+        assert "by calls in progress" in str(rejected[0])
+        assert budget.usage.total_tokens <= 1000
+        assert budget.reserved_tokens == 0
+
+    def test_failed_calls_release_their_reservation(self):
+        def client(**params):
+            raise ConnectionError("offline")
+
+        llm = LLM(model=MODEL)
+        llm.sync_client = client
+        budget = Budget(max_tokens=1000, max_cost=1.0)
+
+        with pytest.raises(ConnectionError):
+            llm(prompt="Hello", budget=budget)
+
+        assert budget.reserved_tokens == 0
+        assert budget.reserved_cost == 0.0
+        assert budget.remaining_tokens == 1000
+
+    @pytest.mark.asyncio
+    async def test_streams_report_their_usage(self):
+        calls = []
+
+        async def stream():
+            yield ModelResponseStream(
+                id="chunk", choices=[{"delta": {"content": "Hi"}}]
+            )
+            yield ModelResponseStream(
+                id="chunk",
+                choices=[],
+                usage=Usage(prompt_tokens=12, completion_tokens=3, total_tokens=15),
+            )
+            # What the litellm cost callback prints
+            print("tloop_final_cost=0.000100")
+
+        async def async_client(**params):
+            calls.append(params)
+            return stream()
+
+        llm = LLM(model=MODEL)
+        llm.async_client = async_client
+        budget = Budget(max_tokens=1000)
+
+        async for _ in await llm.ainvoke(prompt="Hello", stream=True, budget=budget):
+            pass
+
+        assert calls[0]["stream_options"] == {"include_usage": True}
+        assert budget.usage.total_tokens == 15
+        assert budget.reserved_tokens == 0
+
+
+class TestToolLoopBudget:
+    """Test budgets stopping tool loops."""
+
+    def test_runaway_loop_is_stopped(self, make_model_response):
+        class Answer(BaseModel):
+            answer: str
+
+        calls = []
+
+        def client(**kwargs):
+            calls.append(kwargs)
+            input_tokens = estimate_input_tokens(
+                MODEL, kwargs["messages"], kwargs.get("tools")
+            )
+            return make_model_response(
+                content=None,
+                tool_calls=[
+                    {
+                        "id": str(len(calls)),
+                        "type": "function",
+                        "function": {
+                            "name": "get_weather",
+                            "arguments": '{"location": "Lisbon"}',
+                        },
+                    }
+                ],
+                usage={
+                    "prompt_tokens": input_tokens,
+                    "completion_tokens": 20,
+                    "total_tokens": input_tokens + 20,
+                },
+            )
+
+        loop = ToolLoop(
+            model=MODEL,
+            tools=[Tool(get_weather)],
+            output_format=Answer,
+            max_iterations=20,
+        )
+        loop.llm.sync_client = client
+        budget = Budget(max_tokens=1000)
+
+        with pytest.raises(BudgetExceededError):
+            loop("Weather in Lisbon?", budget=budget)
+
+        assert 1 < len(calls) < 20
+        assert budget.usage.total_tokens <= 1000
@@ -1,8 +1,22 @@
 """Tests for function calling module."""
 
+import enum
+import gc
+import warnings
+from typing import Annotated, Literal, Optional
 from unittest.mock import patch
 
-from tinyloop.features.function_calling import Tool
+import pytest
+from pydantic import BaseModel, Field
+
+from tinyloop.features import function_calling
+from tinyloop.features.function_calling import (
+    Tool,
+    ToolArgumentsError,
+    function_to_args_model,
+    function_to_tool_json,
+)
+from tinyloop.modules.tool_loop import ToolLoop
 
 
 def test_tool_mlflow_tracing():
@@ -87,3 +101,282 @@ def test_tool_default_name():
         mock_trace.assert_called()
         call_args = mock_trace.call_args
         assert call_args[1]["name"] == "sample_function.__call__"
+
+
+def test_tool_validates_and_coerces_args():
+    """Test that model arguments are validated against the signature."""
+
+    def get_forecast(location: str, days: int = 3, metric: bool = True):
+        """Get the forecast for a location."""
+        return f"{location}: {days} days"
+
+    tool = Tool(get_forecast)
+
+    assert tool.validate_args({"location": "Paris", "days": "5"}) == {
+        "location": "Paris",
+        "days": 5,
+    }
+    # Defaults are left to the function
+    assert tool.validate_args({"location": "Paris"}) == {"location": "Paris"}
+
+
+def test_tool_invalid_args_error():
+    """Test the structured error returned for invalid arguments."""
+
+    def get_forecast(location: str, days: int = 3):
+        """Get the forecast for a location."""
+        return location
+
+    tool = Tool(get_forecast)
+
+    with pytest.raises(ToolArgumentsError) as exc_info:
+        tool.validate_args({"days": "soon", "country": "FR"})
+
+    error = exc_info.value
+    assert error.tool_name == "get_forecast"
+    assert {tuple(e["loc"]) for e in error.errors} == {
+        ("location",),
+        ("days",),
+        ("country",),
+    }
+    assert str(error).startswith("Invalid arguments for tool 'get_forecast': ")
+    assert "location: Field required" in str(error)
+
+
+def test_tool_hidden_params_are_not_validated():
+    """Test that hidden params are neither required nor accepted from the model."""
+
+    def lookup(query: str, context: dict):
+        """Look something up."""
+        return query
+
+    tool = Tool(lookup, hidden_params=["context"])
+
+    assert tool.validate_args({"query": "cats"}) == {"query": "cats"}
+    with pytest.raises(ToolArgumentsError):
+        tool.validate_args({"query": "cats", "context": {}})
+
+
+def test_tool_var_keyword_args_pass_through():
+    """Test that functions taking **kwargs receive the extra arguments."""
+
+    def search(query: int, context: dict = None, **extra):
+        """Search for something."""
+        return extra
+
+    tool = Tool(search, hidden_params=["context"])
+
+    assert tool.validate_args({"query": "3", "b": 1}) == {"query": 3, "b": 1}
+    with pytest.raises(ToolArgumentsError, match="context: Extra inputs"):
+        tool.validate_args({"query": "3", "context": {}})
+
+
+def test_tool_args_named_like_model_attributes():
+    """Test parameters that are not valid pydantic field names."""
+
+    def query(
+        _private: int,
+        model_config: str,
+        json: bool = False,
+        schema: str = "public",
+        copy: int = 1,
+        validate: bool = True,
+        **extra,
+    ):
+        """Run a query."""
+        return _private
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        tool = Tool(query)
+        args = tool.validate_args(
+            {"_private": "2", "model_config": "x", "json": "true", "arg_0": 9}
+        )
+
+    assert tool.args_model is not None
+    assert args == {"_private": 2, "model_config": "x", "json": True, "arg_0": 9}
+    with pytest.raises(ToolArgumentsError) as exc_info:
+        tool.validate_args({"model_config": "x", "copy": "many"})
+    assert {tuple(e["loc"]) for e in exc_info.value.errors} == {
+        ("_private",),
+        ("copy",),
+    }
+
+
+def test_args_model_of_unsupported_signature():
+    """Test that callables without a readable signature are not validated."""
+    assert function_to_args_model(min) is None
+
+
+def test_tool_loop_returns_argument_errors_to_model(make_model_response):
+    """Test that invalid tool calls are reported back instead of raising."""
+
+    class Answer(BaseModel):
+        answer: str
+
+    calls = []
+
+    def get_forecast(location: str, days: int = 3):
+        """Get the forecast for a location."""
+        calls.append((location, days))
+        return f"Sunny in {location}"
+
+    def tool_call(call_id, name, arguments):
+        return {
+            "id": call_id,
+            "type": "function",
+            "function": {"name": name, "arguments": arguments},
+        }
+
+    responses = iter(
+        [
+            make_model_response(
+                content=None,
+                tool_calls=[tool_call("1", "get_forecast", '{"days": "two"}')],
+            ),
+            make_model_response(
+                content=None,
+                tool_calls=[
+                    tool_call("2", "get_forecast", '{"location": "Rome", "days": "2"}')
+                ],
+            ),
+            make_model_response(
+                content=None, tool_calls=[tool_call("3", "finish", "{}")]
+            ),
+            make_model_response(content='{"answer": "Sunny"}'),
+        ]
+    )
+
+    loop = ToolLoop(
+        model="openai/gpt-4.1-nano", tools=[Tool(get_forecast)], output_format=Answer
+    )
+    loop.llm.sync_client = lambda **kwargs: next(responses)
+
+    loop("What is the weather in Rome?")
+
+    tool_messages = [m for m in loop.llm.get_history() if m["role"] == "tool"]
+    assert tool_messages[0]["content"].startswith(
+        "Invalid arguments for tool 'get_forecast'"
+    )
+    assert tool_messages[1]["content"] == "Sunny in Rome"
+    assert calls == [("Rome", 2)]
+
+
+def test_tool_json_schema_for_rich_types():
+    """Test schemas for nested models, list[T], Literal, Enum and Annotated."""
+
+    class Unit(enum.Enum):
+        CELSIUS = "celsius"
+        FAHRENHEIT = "fahrenheit"
+
+    class Address(BaseModel):
+        street: str
+        title: Optional[str] = None
+
+    class Order(BaseModel):
+        items: list[str]
+        address: Address
+
+    def place_order(
+        order: Order,
+        quantities: list[int],
+        unit: Unit,
+        mode: Literal["fast", "cheap"] = "fast",
+        note: Annotated[str, "Free-form note"] = "",
+        budget: Annotated[float, Field(description="Max spend", ge=0)] = 0,
+        coupon: Optional[str] = None,
+    ):
+        """Place an order."""
+
+    parameters = function_to_tool_json(place_order, None)["function"]["parameters"]
+    properties = parameters["properties"]
+
+    assert properties["quantities"] == {"type": "array", "items": {"type": "integer"}}
+    assert properties["unit"] == {"enum": ["celsius", "fahrenheit"], "type": "string"}
+    assert properties["mode"] == {"enum": ["fast", "cheap"], "type": "string"}
+    assert properties["note"] == {"type": "string", "description": "Free-form note"}
+    assert properties["budget"] == {
+        "type": "number",
+        "description": "Max spend",
+        "minimum": 0,
+    }
+    assert properties["coupon"] == {"type": "string"}
+    assert properties["order"]["properties"]["address"] == {"$ref": "#/$defs/Address"}
+    # Properties named "title" survive the removal of generated titles
+    assert "title" in parameters["$defs"]["Address"]["properties"]
+    assert "title" not in parameters["$defs"]["Address"]
+    assert parameters["required"] == ["order", "quantities", "unit"]
+
+
+def test_tool_json_keeps_docstring_descriptions_and_enums():
+    """Test that docstring-driven descriptions still apply."""
+
+    def get_weather(location: str, unit: str = "celsius", days=None):
+        """Get weather for a location.
+
+        Args:
+            location: The city name
+            unit: Temperature unit {'celsius', 'fahrenheit'}
+        """
+
+    definition = function_to_tool_json(get_weather, None)["function"]
+
+    assert definition["description"] == "Get weather for a location."
+    assert definition["parameters"]["properties"] == {
+        "location": {"type": "string", "description": "The city name"},
+        "unit": {
+            "type": "string",
+            "enum": ["celsius", "fahrenheit"],
+            "description": "Temperature unit",
+        },
+        "days": {"type": "string"},
+    }
+    assert "$defs" not in definition["parameters"]
+
+
+def test_tool_json_is_cached_per_function():
+    """Test that definitions are cached and callers get their own copy."""
+
+    def lookup(query: str):
+        """Look something up."""
+
+    first = function_to_tool_json(lookup, "lookup")
+    first["function"]["parameters"]["properties"]["query"]["type"] = "integer"
+    second = function_to_tool_json(lookup, "lookup")
+
+    assert second["function"]["parameters"]["properties"]["query"]["type"] == "string"
+    assert function_to_tool_json(lookup, "search")["function"]["name"] == "search"
+
+
+def test_tool_caches_do_not_keep_functions_alive():
+    """Test that the cache entries of closures go away with them."""
+
+    def make_tool(offset):
+        def shift(value: int):
+            """Shift a value."""
+            return value + offset
+
+        tool = Tool(shift)
+        tool.validate_args({"value": "1"})
+        return tool
+
+    json_entries = len(function_calling._tool_json_cache)
+    model_entries = len(function_calling._args_model_cache)
+    tools = [make_tool(offset) for offset in range(100)]
+    assert len(function_calling._args_model_cache) == model_entries + 100
+
+    del tools
+    gc.collect()
+
+    assert len(function_calling._tool_json_cache) == json_entries
+    assert len(function_calling._args_model_cache) == model_entries
+
+
+def test_tool_validates_annotated_constraints():
+    """Test that Annotated constraints are enforced on arguments."""
+
+    def reserve(seats: Annotated[int, Field(ge=1)]):
+        """Reserve seats."""
+
+    with pytest.raises(ToolArgumentsError):
+        Tool(reserve).validate_args({"seats": 0})
@@ -0,0 +1,119 @@
+"""Tests for hedged requests."""
+
+import asyncio
+
+import pytest
+
+from tinyloop.inference.hedging import (
+    HedgePolicy,
+    LatencyHistogram,
+    hedged_call,
+    prefetch_first_chunk,
+)
+from tinyloop.inference.litellm import LLM
+
+
+async def _respond_after(delay, value):
+    await asyncio.sleep(delay)
+    return value
+
+
+async def _fail_after(delay):
+    await asyncio.sleep(delay)
+    raise RuntimeError("primary failed")
+
+
+class TestLatencyHistogram:
+    """Test percentile computation and hedge delays."""
+
+    def test_percentile(self):
+        histogram = LatencyHistogram()
+        for i in range(1, 101):
+            histogram.record(i / 100)
+        assert histogram.percentile(0.5) == pytest.approx(0.51)
+        assert histogram.percentile(0.95) == pytest.approx(0.96)
+        assert LatencyHistogram().percentile(0.5) is None
+
+    def test_policy_uses_default_until_enough_samples(self):
+        policy = HedgePolicy(min_samples=10, default_delay=1.5, min_delay=0.01)
+        histogram = LatencyHistogram()
+        histogram.record(0.2)
+        assert policy.get_delay(histogram) == 1.5
+        for _ in range(10):
+            histogram.record(0.2)
+        assert policy.get_delay(histogram) == pytest.approx(0.2)
+
+
+class TestHedgedCall:
+    """Test racing primary and hedged requests."""
+
+    @pytest.mark.asyncio
+    async def test_fast_primary_does_not_hedge(self):
+        hedge_calls = []
+
+        async def hedge():
+            hedge_calls.append(1)
+            return "hedge"
+
+        outcome = await hedged_call(lambda: _respond_after(0, "primary"), hedge, 0.5)
+
+        assert outcome.result == "primary"
+        assert not outcome.hedged
+        assert hedge_calls == []
+
+    @pytest.mark.asyncio
+    async def test_slow_primary_is_hedged_and_cancelled(self):
+        outcome = await hedged_call(
+            lambda: _respond_after(5, "primary"),
+            lambda: _respond_after(0, "hedge"),
+            0.01,
+        )
+
+        assert outcome.result == "hedge"
+        assert outcome.hedged and outcome.hedge_won
+        assert outcome.discarded == []
+
+    @pytest.mark.asyncio
+    async def test_failed_primary_falls_back_to_hedge(self):
+        outcome = await hedged_call(
+            lambda: _fail_after(0.05), lambda: _respond_after(0.1, "hedge"), 0.01
+        )
+        assert outcome.result == "hedge"
+
+    @pytest.mark.asyncio
+    async def test_prefetched_stream_replays_first_chunk(self):
+        async def stream():
+            for chunk in ["a", "b", "c"]:
+                yield chunk
+
+        prefetched = await prefetch_first_chunk(stream())
+        assert [chunk async for chunk in prefetched] == ["a", "b", "c"]
+
+
+class TestLLMHedging:
+    """Test hedging wired into LLM.ainvoke."""
+
+    @pytest.mark.asyncio
+    async def test_hedge_to_secondary_model(self, make_model_response):
+        llm = LLM(
+            model="primary-model",
+            hedge_policy=HedgePolicy(
+                default_delay=0.01, min_samples=1000, hedge_model="secondary-model"
+            ),
+        )
+        models = []
+
+        async def async_client(**kwargs):
+            models.append(kwargs["model"])
+            if kwargs["model"] == "primary-model":
+                await asyncio.sleep(5)
+            return make_model_response(content=kwargs["model"])
+
+        llm.async_client = async_client
+
+        response = await llm.ainvoke(prompt="Hi")
+
+        assert response.response == "secondary-model"
+        assert models == ["primary-model", "secondary-model"]
+        assert llm.hedge_stats == {"fired": 1, "won": 1}
+        assert len(llm.get_history()) == 2
@@ -0,0 +1,88 @@
+"""Tests for the copy-on-write message history."""
+
+import pytest
+
+from tinyloop.inference.history import History
+from tinyloop.inference.litellm import LLM
+
+
+def _message(i):
+    return {"role": "user", "content": f"message {i}"}
+
+
+class TestHistory:
+    """Test the History sequence type."""
+
+    def test_behaves_like_a_list(self):
+        history = History([_message(0)])
+        history.append(_message(1))
+        history.extend([_message(2), _message(3)])
+
+        assert len(history) == 4
+        assert history == [_message(i) for i in range(4)]
+        assert history[-1] == _message(3)
+        assert history[1:3] == [_message(1), _message(2)]
+        assert list(history) == history.to_list()
+        assert History() == []
+
+    def test_fork_shares_prefix_without_copying(self):
+        image_message = {"role": "user", "content": "data:image/png;base64,AAAA"}
+        history = History([image_message])
+        branch = history.fork()
+
+        branch.append(_message(1))
+        history.append(_message(2))
+
+        assert branch == [image_message, _message(1)]
+        assert history == [image_message, _message(2)]
+        assert branch[0] is history[0]
+
+    def test_nested_forks(self):
+        root = History([_message(0)])
+        branches = []
+        for i in range(1, 4):
+            branch = root.fork()
+            branch.append(_message(i))
+            branches.append(branch.fork())
+
+        for i, branch in enumerate(branches, start=1):
+            assert branch == [_message(0), _message(i)]
+
+    def test_truncate_into_shared_prefix(self):
+        history = History([_message(0), _message(1)])
+        branch = history.fork()
+        branch.append(_message(2))
+
+        del branch[1:]
+        assert branch == [_message(0)]
+        assert history == [_message(0), _message(1)]
+
+        with pytest.raises(TypeError):
+            del branch[0]
+
+
+class TestLLMFork:
+    """Test forking LLM conversations."""
+
+    def test_fork_branches_conversation(self, make_model_response):
+        llm = LLM(model="gpt-4o-mini", system_prompt="Be nice")
+        llm.sync_client = lambda **kwargs: make_model_response()
+        llm.invoke(prompt="Hi")
+
+        branch_a = llm.fork()
+        branch_b = llm.fork()
+        branch_a.invoke(prompt="Option A")
+        branch_b.invoke(prompt="Option B")
+
+        assert len(llm.get_history()) == 3
+        assert branch_a.get_history()[3]["content"] == "Option A"
+        assert branch_b.get_history()[3]["content"] == "Option B"
+        assert branch_a.get_history()[:3] == llm.get_history()
+        assert llm.run_cost == [0.001]
+        assert branch_a.run_cost == [0.001]
+
+    def test_set_history_accepts_lists(self):
+        llm = LLM(model="gpt-4o-mini")
+        llm.set_history([_message(0)])
+        assert isinstance(llm.message_history, History)
+        assert llm.get_history() == [_message(0)]
@@ -0,0 +1,109 @@
+"""Tests for the content-addressed image encoding cache."""
+
+import os
+
+import pytest
+from PIL import Image as PILImage
+
+from tinyloop.features import image_cache as image_cache_module
+from tinyloop.features.image_cache import (
+    ImageCache,
+    file_cache_key,
+    pil_cache_key,
+    set_image_cache,
+)
+from tinyloop.features.vision import Image, encode_image
+
+
+@pytest.fixture
+def cache():
+    """Install a fresh image cache for the duration of a test."""
+    previous = image_cache_module.get_image_cache()
+    cache = ImageCache()
+    set_image_cache(cache)
+    yield cache
+    set_image_cache(previous)
+
+
+class TestImageCache:
+    """Test the ImageCache class."""
+
+    def test_get_and_put(self):
+        cache = ImageCache()
+        assert cache.get("key") is None
+        cache.put("key", "data:image/png;base64,AAAA", "image/png")
+        assert cache.get("key") == ("data:image/png;base64,AAAA", "image/png")
+        assert cache.stats()["hit_rate"] == 0.5
+
+    def test_lru_eviction_under_memory_budget(self):
+        cache = ImageCache(max_bytes=100)
+        cache.put("a", "a" * 40, "image/png")
+        cache.put("b", "b" * 40, "image/png")
+        cache.get("a")
+        cache.put("c", "c" * 40, "image/png")
+
+        assert cache.get("b") is None
+        assert cache.get("a") is not None
+        assert cache.stats()["evictions"] == 1
+        assert cache.stats()["bytes"] == 80
+
+    def test_disk_tier(self, tmp_path):
+        cache = ImageCache(disk_dir=str(tmp_path))
+        cache.put("key", "data:image/png;base64,AAAA", "image/png")
+
+        fresh_cache = ImageCache(disk_dir=str(tmp_path))
+        assert fresh_cache.get("key") == ("data:image/png;base64,AAAA", "image/png")
+        assert fresh_cache.stats()["disk_hits"] == 1
+
+
+class TestCacheKeys:
+    """Test how cache keys are derived."""
+
+    def test_file_key_changes_when_file_changes(self, tmp_path):
+        path = tmp_path / "image.png"
+        PILImage.new("RGB", (10, 10), color="red").save(path)
+        key = file_cache_key(str(path))
+        assert file_cache_key(str(path)) == key
+
+        PILImage.new("RGB", (20, 20), color="red").save(path)
+        os.utime(path, ns=(0, 0))
+        assert file_cache_key(str(path)) != key
+
+    def test_pil_key_depends_on_pixels(self):
+        red = PILImage.new("RGB", (10, 10), color="red")
+        assert pil_cache_key(red) == pil_cache_key(red.copy())
+        assert pil_cache_key(red) != pil_cache_key(
+            PILImage.new("RGB", (10, 10), color="blue")
+        )
+        assert pil_cache_key(red, format="PNG") != pil_cache_key(red, format="JPEG")
+
+
+class TestVisionCaching:
+    """Test that the vision encoders go through the cache."""
+
+    def test_file_encoding_is_cached(self, cache, tmp_path):
+        path = tmp_path / "image.png"
+        PILImage.new("RGB", (10, 10), color="red").save(path)
+
+        first = Image.from_file(str(path))
+        second_uri, _ = encode_image(str(path))
+
+        assert first.url == second_uri
+        assert cache.stats()["hits"] == 1
+        assert cache.stats()["misses"] == 1
+
+    def test_pil_encoding_is_cached(self, cache):
+        pil_image = PILImage.new("RGB", (10, 10), color="green")
+
+        Image.from_PIL(pil_image).encode()
+        Image.from_PIL(pil_image).encode()
+
+        assert cache.stats()["hits"] == 1
+
+    def test_cache_can_be_disabled(self, cache, tmp_path):
+        set_image_cache(None)
+        path = tmp_path / "image.png"
+        PILImage.new("RGB", (10, 10), color="red").save(path)
+
+        assert Image.from_file(str(path)).url.startswith("data:image/png;base64,")
+        assert cache.stats()["misses"] == 0
@@ -0,0 +1,192 @@
+"""
+Tests for pooled image downloading.
+"""
+
+import asyncio
+import base64
+import io
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from PIL import Image as PILImage
+
+from tinyloop.features.image_download import (
+    ImageDownloader,
+    ImageTooLargeError,
+    _Base64Encoder,
+    get_image_downloader,
+    set_image_downloader,
+)
+from tinyloop.features.vision import aencode_images, encode_image
+
+
+def _png_bytes(size=(64, 64)) -> bytes:
+    buffer = io.BytesIO()
+    PILImage.effect_noise(size, 64).convert("RGB").save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+IMAGE = _png_bytes()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    concurrent = 0
+    max_concurrent = 0
+    lock = threading.Lock()
+
+    def do_GET(self):
+        with _Handler.lock:
+            _Handler.concurrent += 1
+            _Handler.max_concurrent = max(_Handler.max_concurrent, _Handler.concurrent)
+        try:
+            if self.path.startswith("/slow"):
+                threading.Event().wait(0.1)
+            if self.path.startswith("/missing"):
+                self.send_response(404)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "image/png; charset=binary")
+            if not self.path.startswith("/chunked"):
+                self.send_header("Content-Length", str(len(IMAGE)))
+            self.end_headers()
+            self.wfile.write(IMAGE)
+        finally:
+            with _Handler.lock:
+                _Handler.concurrent -= 1
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope="module")
+def server():
+    """Local HTTP server serving a PNG image."""
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def downloader():
+    """Fresh downloader installed as the shared one."""
+    previous = get_image_downloader()
+    downloader = ImageDownloader(timeout=5, max_concurrency=2)
+    set_image_downloader(downloader)
+    yield downloader
+    downloader.close()
+    set_image_downloader(previous)
+
+
+class TestBase64Encoder:
+    """Test incremental base64 encoding."""
+
+    @pytest.mark.parametrize("chunk_size", [1, 2, 3, 4, 7, 1000])
+    def test_matches_one_shot_encoding(self, chunk_size):
+        encoder = _Base64Encoder("test", max_bytes=None)
+        for start in range(0, len(IMAGE), chunk_size):
+            encoder.update(IMAGE[start : start + chunk_size])
+        assert encoder.finish() == base64.b64encode(IMAGE).decode("ascii")
+
+    def test_size_cap(self):
+        encoder = _Base64Encoder("test", max_bytes=5)
+        encoder.update(b"abc")
+        with pytest.raises(ImageTooLargeError):
+            encoder.update(b"def")
+
+
+class TestImageDownloader:
+    """Test sync and async downloads."""
+
+    def test_fetch(self, server, downloader):
+        data_uri, mime_type = encode_image(f"{server}/a.png", download_images=True)
+
+        assert mime_type == "image/png"
+        assert data_uri == f"data:image/png;base64,{base64.b64encode(IMAGE).decode()}"
+
+    def test_fetch_reuses_session(self, server, downloader):
+        downloader.fetch(f"{server}/a.png")
+        session = downloader.session
+        downloader.fetch(f"{server}/b.png")
+        assert downloader.session is session
+
+    def test_http_errors_raise(self, server, downloader):
+        with pytest.raises(Exception):
+            downloader.fetch(f"{server}/missing.png")
+
+    def test_announced_size_over_cap(self, server):
+        downloader = ImageDownloader(max_bytes=100)
+        with pytest.raises(ImageTooLargeError):
+            downloader.fetch(f"{server}/a.png")
+
+    @pytest.mark.asyncio
+    async def test_streamed_size_over_cap(self, server):
+        downloader = ImageDownloader(max_bytes=100)
+        with pytest.raises(ImageTooLargeError):
+            await downloader.afetch(f"{server}/chunked.png")
+        await downloader.aclose()
+
+    @pytest.mark.asyncio
+    async def test_afetch_many_keeps_order_and_limits_concurrency(
+        self, server, downloader
+    ):
+        urls = [f"{server}/slow/{i}.png" for i in range(6)]
+        _Handler.max_concurrent = 0
+
+        results = await aencode_images(urls, download_images=True)
+
+        assert len(results) == 6
+        assert all(mime_type == "image/png" for _, mime_type in results)
+        assert _Handler.max_concurrent <= 2
+        await downloader.aclose()
+
+    @pytest.mark.asyncio
+    async def test_does_not_block_event_loop(self, server, downloader):
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        task = asyncio.ensure_future(ticker())
+        await downloader.afetch_many([f"{server}/slow/{i}.png" for i in range(2)])
+        task.cancel()
+
+        assert ticks > 0
+        await downloader.aclose()
+
+    def test_pools_of_finished_loops_are_dropped(self, server):
+        downloader = ImageDownloader()
+
+        for _ in range(3):
+            asyncio.run(downloader.afetch(f"{server}/a.png"))
+
+        assert len(downloader._async_clients) <= 1
+        asyncio.run(downloader.aclose())
+        assert len(downloader._async_clients) == 0
+
+    @pytest.mark.asyncio
+    async def test_context_manager_closes_pool(self, server):
+        async with ImageDownloader() as downloader:
+            await downloader.afetch(f"{server}/a.png")
+            client, _ = downloader._async_client()
+
+        assert client.is_closed
+        assert len(downloader._async_clients) == 0
+
+    @pytest.mark.asyncio
+    async def test_non_url_images_are_encoded(self, downloader):
+        pil_image = PILImage.new("RGB", (10, 10), color="red")
+
+        results = await aencode_images(
+            [pil_image, "https://example.com/a.jpg"], download_images=False
+        )
+
+        assert results[0][0].startswith("data:image/png;base64,")
+        assert results[1] == ("https://example.com/a.jpg", "image/jpeg")
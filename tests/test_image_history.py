@@ -0,0 +1,276 @@
+"""
+Tests for image deduplication and pruning across the history.
+"""
+
+import pytest
+from PIL import Image as PILImage
+
+from tinyloop.features.image_history import (
+    IMAGE_REF_PREFIX,
+    ImageHistoryPolicy,
+    ImageStore,
+)
+from tinyloop.features.vision import Image
+from tinyloop.inference.litellm import LLM
+from tinyloop.inference.sessions import SQLiteConversationStore
+
+
+def _user(text, *urls):
+    return {
+        "role": "user",
+        "content": [
+            {"type": "text", "text": text},
+            *[{"type": "image_url", "image_url": {"url": url}} for url in urls],
+        ],
+    }
+
+
+def _assistant(text):
+    return {"role": "assistant", "content": text}
+
+
+def _images(message):
+    return [
+        part["image_url"]["url"]
+        for part in message["content"]
+        if part["type"] == "image_url"
+    ]
+
+
+def _texts(message):
+    return [part["text"] for part in message["content"] if part["type"] == "text"]
+
+
+class TestImageStore:
+    """Test the content-addressed image store."""
+
+    def test_identical_images_stored_once(self):
+        store = ImageStore()
+        first = store.put("data:image/png;base64,AAAA")
+        second = store.put("data:image/png;base64,AAAA")
+
+        assert first == second
+        assert first.startswith(IMAGE_REF_PREFIX)
+        assert len(store) == 1
+        assert store.get(first) == "data:image/png;base64,AAAA"
+
+    def test_remote_urls_are_not_stored(self):
+        store = ImageStore()
+        assert store.put("https://example.com/a.png") == "https://example.com/a.png"
+        assert store.get("https://example.com/a.png") == "https://example.com/a.png"
+        assert len(store) == 0
+
+    def test_unknown_reference(self):
+        with pytest.raises(KeyError, match="Unknown image reference"):
+            ImageStore().get(f"{IMAGE_REF_PREFIX}missing")
+
+    def test_expand(self):
+        store = ImageStore()
+        ref = store.put("data:image/png;base64,AAAA")
+        messages = [_user("Look", ref, "https://example.com/a.png"), _assistant("Ok")]
+
+        expanded = store.expand(messages)
+
+        assert _images(expanded[0]) == [
+            "data:image/png;base64,AAAA",
+            "https://example.com/a.png",
+        ]
+        assert expanded[1] is messages[1]
+        assert _images(messages[0])[0] == ref
+
+    def test_retain_drops_unreferenced_images(self):
+        store = ImageStore(max_bytes=40)
+        kept = store.put("data:image/png;base64," + "A" * 16)
+        store.put("data:image/png;base64," + "B" * 16)
+
+        assert store.over_limit
+        assert store.retain([_user("Look", kept)]) == 38
+        assert len(store) == 1
+        assert store.bytes == 38
+        assert not store.over_limit
+
+    def test_copy(self):
+        store = ImageStore()
+        ref = store.put("data:image/png;base64,AAAA")
+        copied = store.copy()
+        copied.retain([])
+
+        assert store.get(ref) == "data:image/png;base64,AAAA"
+        assert len(copied) == 0
+
+
+class TestImageHistoryPolicy:
+    """Test how images are sent."""
+
+    def test_references_are_expanded(self):
+        store = ImageStore()
+        ref = store.put("data:image/png;base64,AAAA")
+
+        messages = ImageHistoryPolicy().apply([_user("Look", ref)], store)
+
+        assert _images(messages[0]) == ["data:image/png;base64,AAAA"]
+
+    def test_repeated_images_sent_once(self):
+        store = ImageStore()
+        ref = store.put("data:image/png;base64,AAAA")
+        history = [
+            _user("Look", ref),
+            _assistant("A cat"),
+            _user("Look again", ref),
+        ]
+
+        messages = ImageHistoryPolicy().apply(history, store)
+
+        assert _images(messages[0]) == ["data:image/png;base64,AAAA"]
+        assert _images(messages[2]) == []
+        assert _texts(messages[2]) == ["Look again", "[same image as above]"]
+        # The stored history is left untouched
+        assert _images(history[2]) == [ref]
+
+    def test_dedupe_disabled(self):
+        store = ImageStore()
+        ref = store.put("data:image/png;base64,AAAA")
+        history = [_user("Look", ref), _user("Again", ref)]
+
+        messages = ImageHistoryPolicy(dedupe=False).apply(history, store)
+
+        assert _images(messages[1]) == ["data:image/png;base64,AAAA"]
+
+    def test_old_images_replaced(self):
+        store = ImageStore()
+        history = [
+            _user("First", "https://example.com/1.png"),
+            _assistant("One"),
+            _user("Second", "https://example.com/2.png"),
+            _assistant("Two"),
+            _user("Third", "https://example.com/3.png"),
+        ]
+
+        messages = ImageHistoryPolicy(max_image_turns=2).apply(history, store)
+
+        assert _images(messages[0]) == []
+        assert _texts(messages[0]) == ["First", "[image removed from history]"]
+        assert _images(messages[2]) == ["https://example.com/2.png"]
+        assert _images(messages[4]) == ["https://example.com/3.png"]
+
+    def test_old_images_dropped_without_placeholder(self):
+        history = [_user("First", "https://example.com/1.png"), _user("Second")]
+
+        messages = ImageHistoryPolicy(max_image_turns=1, placeholder=None).apply(
+            history, ImageStore()
+        )
+
+        assert messages[0]["content"] == [{"type": "text", "text": "First"}]
+
+    def test_repeat_of_dropped_image_is_sent(self):
+        """Test that pruning old copies keeps the most recent one."""
+        url = "https://example.com/1.png"
+        history = [_user("First", url), _user("Second"), _user("Third", url)]
+
+        messages = ImageHistoryPolicy(max_image_turns=1).apply(history, ImageStore())
+
+        assert _images(messages[0]) == []
+        assert _images(messages[2]) == [url]
+
+
+class TestLLMImagePolicy:
+    """Test the image policy on LLM calls."""
+
+    def test_history_keeps_references(self, make_model_response):
+        sent = []
+
+        def client(**kwargs):
+            sent.append(kwargs["messages"])
+            return make_model_response()
+
+        llm = LLM(model="openai/gpt-4.1-nano", image_policy=ImageHistoryPolicy())
+        llm.sync_client = client
+        pil_image = PILImage.new("RGB", (20, 20), color="red")
+
+        llm.invoke("Describe", images=[Image.from_PIL(pil_image)])
+        llm.invoke("Describe again", images=[Image.from_PIL(pil_image)])
+
+        history = llm.get_history()
+        assert _images(history[0])[0].startswith(IMAGE_REF_PREFIX)
+        assert _images(history[0]) == _images(history[2])
+        assert len(llm.image_store) == 1
+
+        assert _images(sent[1][0])[0].startswith("data:image/png;base64,")
+        assert _images(sent[1][2]) == []
+
+    def test_store_is_pruned_past_its_limit(self, make_model_response):
+        llm = LLM(model="openai/gpt-4.1-nano", image_policy=ImageHistoryPolicy())
+        llm.sync_client = lambda **kwargs: make_model_response()
+        llm.image_store.max_bytes = 1
+
+        for color in ("red", "green", "blue"):
+            image = Image.from_PIL(PILImage.new("RGB", (20, 20), color=color))
+            llm.set_history([])
+            llm.invoke("Describe", images=[image])
+
+        assert len(llm.image_store) == 1
+        assert _images(llm.get_history()[0])[0] in llm.image_store._images
+
+    def test_sessions_persist_images_inline(self, make_model_response, tmp_path):
+        store = SQLiteConversationStore(str(tmp_path / "sessions.db"))
+        pil_image = PILImage.new("RGB", (20, 20), color="red")
+
+        first = LLM(
+            model="openai/gpt-4.1-nano",
+            image_policy=ImageHistoryPolicy(),
+            conversation_store=store,
+        )
+        first.sync_client = lambda **kwargs: make_model_response()
+        first.invoke("Describe", images=[Image.from_PIL(pil_image)], session_id="u1")
+
+        sent = []
+
+        def client(**kwargs):
+            sent.append(kwargs["messages"])
+            return make_model_response()
+
+        second = LLM(
+            model="openai/gpt-4.1-nano",
+            image_policy=ImageHistoryPolicy(),
+            conversation_store=store,
+        )
+        second.sync_client = client
+        second.invoke("And now?", images=[Image.from_PIL(pil_image)], session_id="u1")
+
+        assert _images(store.load("u1")[0])[0].startswith("data:image/png;base64,")
+        assert _images(sent[0][0])[0].startswith("data:image/png;base64,")
+        # The repeated image is still only sent once
+        assert _images(sent[0][2]) == []
+        assert len(first.image_store) == len(second.image_store) == 0
+        store.close()
+
+    def test_release_images(self, make_model_response):
+        sent = []
+
+        def client(**kwargs):
+            sent.append(kwargs["messages"])
+            return make_model_response()
+
+        llm = LLM(model="openai/gpt-4.1-nano", release_images=True)
+        llm.sync_client = client
+        image = Image.from_PIL(PILImage.new("RGB", (20, 20), color="red"))
+
+        llm.invoke("Describe", images=[image])
+        assert not image.is_encoded
+        llm.invoke("And now?")
+
+        assert _images(llm.get_history()[0])[0].startswith(IMAGE_REF_PREFIX)
+        assert _images(sent[0][0]) == _images(sent[1][0])
+        assert _images(sent[1][0])[0].startswith("data:image/png;base64,")
+        assert not image.is_encoded
+        assert llm.image_store.bytes == 0
+
+    def test_no_policy_embeds_images(self, make_model_response):
+        llm = LLM(model="openai/gpt-4.1-nano")
+        llm.sync_client = lambda **kwargs: make_model_response()
+        pil_image = PILImage.new("RGB", (20, 20), color="red")
+
+        llm.invoke("Describe", images=[Image.from_PIL(pil_image)])
+
+        assert _images(llm.get_history()[0])[0].startswith("data:image/png;base64,")
+        assert len(llm.image_store) == 0
@@ -0,0 +1,106 @@
+"""
+Tests for image token estimation.
+"""
+
+import pytest
+from PIL import Image as PILImage
+
+from tinyloop.features.image_tokens import (
+    estimate_image_tokens,
+    fit_within,
+    get_image_provider,
+)
+from tinyloop.features.vision import Image
+
+
+class TestEstimateImageTokens:
+    """Test the per-provider formulas against published examples."""
+
+    def test_provider_detection(self):
+        assert get_image_provider("anthropic/claude-sonnet-4") == "anthropic"
+        assert get_image_provider("gemini/gemini-2.5-flash") == "gemini"
+        assert get_image_provider("openai/gpt-4o") == "openai"
+        assert get_image_provider("some-local-model") == "openai"
+
+    @pytest.mark.parametrize(
+        "width, height, expected",
+        [(1024, 1024, 765), (2048, 4096, 1105), (512, 512, 255)],
+    )
+    def test_openai_tiles(self, width, height, expected):
+        assert estimate_image_tokens(width, height, "openai/gpt-4o") == expected
+
+    def test_openai_low_detail(self):
+        assert estimate_image_tokens(4096, 4096, "gpt-4o", detail="low") == 85
+
+    def test_openai_patches(self):
+        # 1024x1024 fits in 1024 patches, 1800x2400 is scaled to 1452 patches
+        assert estimate_image_tokens(1024, 1024, "gpt-4.1-mini") == 1659
+        assert estimate_image_tokens(1800, 2400, "openai/gpt-4.1-mini") == 2353
+        assert estimate_image_tokens(1800, 2400, "gpt-4.1-nano") == 3572
+
+    def test_openai_patches_of_thin_images(self):
+        # The short side still takes a patch, the long side is capped
+        assert estimate_image_tokens(100000, 20, "openai/gpt-4.1-mini") == 2489
+        assert estimate_image_tokens(20, 100000, "openai/gpt-4.1-mini") == 2489
+        assert estimate_image_tokens(2000, 20, "openai/gpt-4.1-mini") > 0
+
+    def test_anthropic(self):
+        assert estimate_image_tokens(1000, 1000, "claude-sonnet-4") == 1334
+        # Large images are resized server-side, so the cost is capped
+        assert estimate_image_tokens(8000, 8000, "claude-sonnet-4") == 1600
+
+    def test_gemini(self):
+        assert estimate_image_tokens(384, 384, "gemini-2.5-pro") == 258
+        assert estimate_image_tokens(1024, 1024, "gemini-2.5-pro") == 258 * 4
+
+    def test_fit_within(self):
+        assert fit_within((4000, 1000), 1000) == (1000, 250)
+        assert fit_within((400, 100), 1000) == (400, 100)
+        assert fit_within((400, 100), None) == (400, 100)
+
+
+class TestImageEstimateTokens:
+    """Test estimation on Image instances."""
+
+    def test_file_size_read_without_encoding(self, tmp_path):
+        path = tmp_path / "photo.png"
+        PILImage.new("RGB", (1024, 1024), color="red").save(path)
+
+        image = Image.from_file(str(path))
+
+        assert image.size == (1024, 1024)
+        assert image.estimate_tokens("openai/gpt-4o") == 765
+        assert not image.is_encoded
+
+    def test_resize_policy_is_accounted_for(self):
+        pil_image = PILImage.new("RGB", (4000, 1000), color="red")
+
+        image = Image.from_PIL(pil_image, max_side=1000)
+
+        assert image.sent_size == (1000, 250)
+        assert image.estimate_tokens("claude-sonnet-4") == 334
+
+    def test_detail(self):
+        pil_image = PILImage.new("RGB", (1024, 1024), color="red")
+
+        image = Image.from_PIL(pil_image, detail="low")
+
+        assert image.estimate_tokens("gpt-4o") == 85
+        assert image.estimate_tokens("gpt-4o", detail="high") == 765
+
+    def test_remote_url(self):
+        image = Image.from_url("https://example.com/image.jpg")
+
+        assert image.size is None
+        with pytest.raises(ValueError, match="Cannot estimate tokens"):
+            image.estimate_tokens("gpt-4o")
+
+    def test_detail_is_sent(self):
+        from tinyloop.inference.litellm import LLM
+
+        pil_image = PILImage.new("RGB", (10, 10), color="red")
+        message = LLM(model="openai/gpt-4o")._prepare_user_message(
+            "Describe", [Image.from_PIL(pil_image, detail="low")]
+        )
+
+        assert message["content"][1]["image_url"]["detail"] == "low"
@@ -0,0 +1,285 @@
+"""
+Tests for the metrics registry and the LLM and module metrics.
+"""
+
+import threading
+import urllib.request
+
+import httpx
+import litellm
+import pytest
+from litellm import ModelResponseStream
+from pydantic import BaseModel
+
+from tinyloop.features.function_calling import Tool
+from tinyloop.inference.litellm import LLM
+from tinyloop.inference.retry import RetryPolicy
+from tinyloop.modules.generate import Generate
+from tinyloop.modules.tool_loop import ToolLoop
+from tinyloop.utils.metrics import (
+    MetricsRegistry,
+    generate_latest,
+    llm_metrics,
+    module_metrics,
+    registry,
+    start_http_server,
+)
+
+MODEL = "openai/gpt-4.1-nano"
+
+
+def get_weather(location: str):
+    """Get the weather for a city."""
+    return f"Sunny in {location}"
+
+
+@pytest.fixture(autouse=True)
+def clean_registry():
+    registry.reset()
+    yield
+    registry.reset()
+
+
+class TestRegistry:
+    """Test the metric types and the exposition format."""
+
+    def test_counter_across_threads(self):
+        counter = MetricsRegistry().counter("requests_total", "Requests", ("model",))
+
+        def work():
+            for _ in range(1000):
+                counter.inc("a")
+
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        counter.inc("b", amount=2.5)
+
+        assert counter.value("a") == 8000
+        assert counter.value("b") == 2.5
+        assert counter.value("c") == 0.0
+
+    def test_finished_threads_are_folded(self):
+        metrics = MetricsRegistry()
+        counter = metrics.counter("requests_total", "Requests")
+        histogram = metrics.histogram("latency_seconds", "Latency", buckets=(1.0,))
+
+        def work():
+            counter.inc()
+            histogram.observe(value=0.5)
+
+        for _ in range(200):
+            thread = threading.Thread(target=work)
+            thread.start()
+            thread.join()
+
+        assert counter.value() == 200
+        assert histogram.count() == 200
+        assert len(counter._shards) <= 1
+        assert len(histogram._shards) <= 1
+        counter.reset()
+        assert counter.value() == 0.0
+
+    def test_gauge(self):
+        gauge = MetricsRegistry().gauge("in_flight", "In flight")
+        gauge.inc()
+        gauge.inc()
+        gauge.dec()
+
+        assert gauge.value() == 1
+
+    def test_histogram(self):
+        histogram = MetricsRegistry().histogram(
+            "latency_seconds", "Latency", ("model",), buckets=(0.1, 1.0)
+        )
+        for value in (0.05, 0.1, 0.5, 3.0):
+            histogram.observe("a", value=value)
+
+        assert histogram.count("a") == 4
+        assert histogram.sum("a") == pytest.approx(3.65)
+        assert histogram.collect()[("a",)][:3] == [2, 1, 1]
+
+    def test_get_or_create(self):
+        metrics = MetricsRegistry()
+
+        assert metrics.counter("x_total", "X") is metrics.counter("x_total", "X")
+        with pytest.raises(ValueError):
+            metrics.gauge("x_total", "X")
+
+    def test_exposition(self):
+        metrics = MetricsRegistry()
+        metrics.counter("requests_total", "Requests\nmade", ("model",)).inc('say "hi"')
+        metrics.histogram("latency_seconds", "Latency", buckets=(1.0,)).observe(
+            value=0.5
+        )
+
+        assert metrics.exposition() == (
+            "# HELP latency_seconds Latency\n"
+            "# TYPE latency_seconds histogram\n"
+            'latency_seconds_bucket{le="1.0"} 1.0\n'
+            'latency_seconds_bucket{le="+Inf"} 1.0\n'
+            "latency_seconds_sum 0.5\n"
+            "latency_seconds_count 1.0\n"
+            "# HELP requests_total Requests\\nmade\n"
+            "# TYPE requests_total counter\n"
+            'requests_total{model="say \\"hi\\""} 1.0\n'
+        )
+
+    def test_http_server(self):
+        llm_metrics.requests.inc(MODEL, "LLM", "ok")
+        server = start_http_server(0, addr="127.0.0.1")
+        try:
+            url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+            with urllib.request.urlopen(url) as response:
+                body = response.read().decode()
+        finally:
+            server.shutdown()
+
+        assert body == generate_latest()
+        assert (
+            f'tinyloop_llm_requests_total{{model="{MODEL}",module="LLM",status="ok"}} 1.0'
+            in body
+        )
+
+
+class TestLLMMetrics:
+    """Test the metrics recorded by LLM calls."""
+
+    def test_successful_call(self, make_model_response):
+        llm = LLM(model=MODEL)
+        llm.sync_client = lambda **kwargs: make_model_response(cost=0.002)
+
+        llm(prompt="Hello")
+
+        assert llm_metrics.requests.value(MODEL, "LLM", "ok") == 1
+        assert llm_metrics.in_flight.value(MODEL, "LLM") == 0
+        assert llm_metrics.latency.count(MODEL, "LLM") == 1
+        assert llm_metrics.tokens.value(MODEL, "LLM", "input") == 10
+        assert llm_metrics.tokens.value(MODEL, "LLM", "output") == 5
+        assert llm_metrics.cost.value(MODEL, "LLM") == pytest.approx(0.002)
+
+    def test_failed_call(self):
+        def client(**kwargs):
+            raise litellm.BadRequestError(
+                message="bad request", llm_provider="openai", model=MODEL
+            )
+
+        llm = LLM(model=MODEL, retry_policy=RetryPolicy(initial_delay=0, jitter=0))
+        llm.sync_client = client
+
+        with pytest.raises(litellm.BadRequestError):
+            llm(prompt="Hello")
+
+        assert llm_metrics.requests.value(MODEL, "LLM", "error") == 1
+        assert llm_metrics.in_flight.value(MODEL, "LLM") == 0
+        assert llm_metrics.retries.value(MODEL, "LLM") == 0
+
+    def test_retries(self, make_model_response):
+        errors = [
+            litellm.ServiceUnavailableError(
+                message="overloaded",
+                llm_provider="openai",
+                model=MODEL,
+                response=httpx.Response(
+                    503, request=httpx.Request("POST", "https://api.openai.com")
+                ),
+            )
+        ]
+
+        def client(**kwargs):
+            if errors:
+                raise errors.pop()
+            return make_model_response()
+
+        llm = LLM(model=MODEL, retry_policy=RetryPolicy(initial_delay=0, jitter=0))
+        llm.sync_client = client
+
+        llm(prompt="Hello")
+
+        assert llm_metrics.retries.value(MODEL, "LLM") == 1
+        assert llm_metrics.requests.value(MODEL, "LLM", "ok") == 1
+
+    @pytest.mark.asyncio
+    async def test_streams_stay_in_flight(self):
+        async def stream():
+            for text in ["Hel", "lo", "!"]:
+                yield ModelResponseStream(
+                    id="chunk", choices=[{"delta": {"content": text}}]
+                )
+            print("tloop_final_cost=0.000100")
+
+        async def async_client(**kwargs):
+            return stream()
+
+        llm = LLM(model=MODEL)
+        llm.async_client = async_client
+
+        updates = await llm.acall(prompt="Hi", stream=True)
+        await anext(updates)
+        assert llm_metrics.in_flight.value(MODEL, "LLM") == 1
+        async for _ in updates:
+            pass
+        assert llm_metrics.in_flight.value(MODEL, "LLM") == 0
+        assert llm_metrics.requests.value(MODEL, "LLM", "ok") == 1
+
+        updates = await llm.acall(prompt="Hi", stream=True)
+        await anext(updates)
+        await updates.aclose()
+        assert llm_metrics.in_flight.value(MODEL, "LLM") == 0
+
+
+class TestModuleMetrics:
+    """Test the module labels."""
+
+    def test_generate(self, make_model_response):
+        generate = Generate(model=MODEL)
+        generate.llm.sync_client = lambda **kwargs: make_model_response()
+
+        generate.call("Hello")
+
+        assert module_metrics.calls.value("Generate", MODEL, "ok") == 1
+        assert llm_metrics.requests.value(MODEL, "Generate", "ok") == 1
+        assert llm_metrics.requests.value(MODEL, "LLM", "ok") == 0
+
+    def test_tool_loop(self, make_model_response):
+        class Answer(BaseModel):
+            answer: str
+
+        responses = [
+            make_model_response(
+                content=None,
+                tool_calls=[
+                    {
+                        "id": "1",
+                        "type": "function",
+                        "function": {
+                            "name": "get_weather",
+                            "arguments": '{"location": "Lisbon"}',
+                        },
+                    }
+                ],
+            ),
+            make_model_response(
+                content=None,
+                tool_calls=[
+                    {
+                        "id": "2",
+                        "type": "function",
+                        "function": {"name": "finish", "arguments": "{}"},
+                    }
+                ],
+            ),
+            make_model_response(content='{"answer": "Sunny"}'),
+        ]
+        loop = ToolLoop(model=MODEL, tools=[Tool(get_weather)], output_format=Answer)
+        loop.llm.sync_client = lambda **kwargs: responses.pop(0)
+
+        loop("Weather in Lisbon?")
+
+        assert module_metrics.calls.value("ToolLoop", MODEL, "ok") == 1
+        assert module_metrics.calls.value("Tool", MODEL, "ok") == 2
+        assert module_metrics.in_flight.value("ToolLoop", MODEL) == 0
+        assert module_metrics.latency.count("ToolLoop", MODEL) == 1
+        assert llm_metrics.requests.value(MODEL, "ToolLoop", "ok") == 3
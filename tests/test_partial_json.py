@@ -0,0 +1,164 @@
+"""
+Tests for streaming structured output.
+"""
+
+import json
+from typing import List, Optional
+
+import pytest
+from litellm import ModelResponseStream
+from pydantic import BaseModel
+
+from tinyloop.features.partial_json import PartialJSONParser, partial_model
+from tinyloop.inference.litellm import LLM
+from tinyloop.types import LLMResponse, LLMStreamingResponse
+
+DOCUMENT = {
+    "title": 'Quarterly "report"\nQ3 été',
+    "score": -12.5e2,
+    "published": True,
+    "reviewer": None,
+    "sections": [
+        {"heading": "Intro", "paragraphs": ["First", "Second"]},
+        {"heading": "Numbers", "paragraphs": []},
+    ],
+    "tags": [1, 2, 3],
+}
+
+
+class Section(BaseModel):
+    heading: str
+    paragraphs: List[str] = []
+
+
+class Report(BaseModel):
+    title: str
+    score: float
+    published: bool
+    reviewer: Optional[str] = None
+    sections: List[Section]
+    tags: List[int] = []
+
+
+def _feed_all(text, chunk_size):
+    parser = PartialJSONParser()
+    values = []
+    for start in range(0, len(text), chunk_size):
+        values.append(parser.feed(text[start : start + chunk_size]))
+    return values
+
+
+class TestPartialJSONParser:
+    """Test parsing of incomplete JSON."""
+
+    @pytest.mark.parametrize("chunk_size", [1, 3, 7, 1000])
+    def test_every_prefix_parses(self, chunk_size):
+        """Test that each chunk gives a value and the last one is exact."""
+        text = json.dumps(DOCUMENT)
+
+        values = _feed_all(text, chunk_size)
+
+        assert values[-1] == DOCUMENT
+        assert all(value is None or isinstance(value, dict) for value in values)
+        assert values[0] is not None or chunk_size == 1
+
+    @pytest.mark.parametrize(
+        "text, expected",
+        [
+            ('{"title": "Quarterly rep', {"title": "Quarterly rep"}),
+            ('{"title": "Q", "sco', {"title": "Q"}),
+            ('{"title": "Q", "score"', {"title": "Q"}),
+            ('{"title": "Q", "score": ', {"title": "Q"}),
+            ('{"score": -', {}),
+            ('{"score": 12.', {}),
+            ('{"score": 12', {"score": 12}),
+            ('{"ok": tr', {"ok": True}),
+            ('{"items": [1, 2, ', {"items": [1, 2]}),
+            ('{"items": [{"a": "x"}, {"a', {"items": [{"a": "x"}, {}]}),
+            ('{"text": "line\\', {"text": "line"}),
+            ('{"text": "caf\\u00', {"text": "caf"}),
+            ("[", []),
+            ("", None),
+        ],
+    )
+    def test_completion(self, text, expected):
+        parser = PartialJSONParser()
+        assert parser.feed(text) == expected
+
+    def test_pretty_printed_input(self):
+        text = json.dumps(DOCUMENT, indent=2)
+        assert _feed_all(text, 5)[-1] == DOCUMENT
+
+    def test_parses_are_spaced_out(self):
+        """Test that streams re-parse a bounded number of times."""
+        text = json.dumps({"items": [DOCUMENT] * 200})
+        parser = PartialJSONParser()
+        parses = 0
+        for start in range(0, len(text), 4):
+            parser.scan(text[start : start + 4])
+            if parser.is_due():
+                parser.value
+                parses += 1
+
+        assert parses < len(text) // 4 // 10
+        assert parser.value == {"items": [DOCUMENT] * 200}
+
+
+class TestPartialModel:
+    """Test building partial pydantic instances."""
+
+    def test_missing_fields_are_none(self):
+        report = partial_model(Report, {"title": "Q3", "sections": [{"head": 1}]})
+
+        assert report.title == "Q3"
+        assert report.score is None
+        assert report.tags == []
+        assert isinstance(report.sections[0], Section)
+        assert report.sections[0].heading is None
+
+    def test_non_dict(self):
+        assert partial_model(Report, None) is None
+
+
+def _stream(text, chunk_size=4):
+    async def generator():
+        for start in range(0, len(text), chunk_size):
+            yield ModelResponseStream(
+                id="chunk",
+                choices=[{"delta": {"content": text[start : start + chunk_size]}}],
+            )
+        # What the litellm cost callback prints
+        print("tloop_final_cost=0.000100")
+
+    return generator()
+
+
+class TestStreamingStructuredOutput:
+    """Test LLM streaming with a response_format."""
+
+    @pytest.mark.asyncio
+    async def test_yields_partial_then_validated_model(self):
+        text = json.dumps(DOCUMENT)
+
+        async def async_client(**kwargs):
+            return _stream(text)
+
+        llm = LLM(model="openai/gpt-4.1-nano")
+        llm.async_client = async_client
+
+        updates = []
+        async for item in await llm.ainvoke(
+            prompt="Write the report", stream=True, response_format=Report
+        ):
+            updates.append(item)
+
+        partials = [u for u in updates if isinstance(u, LLMStreamingResponse)]
+        final = updates[-1]
+
+        assert isinstance(final, LLMResponse)
+        assert final.response == Report.model_validate(DOCUMENT)
+        assert all(isinstance(p.response, Report) for p in partials[2:])
+        titles = [p.response.title for p in partials if p.response is not None]
+        assert titles[0] != titles[-1]
+        assert partials[-1].response.sections[1].heading == "Numbers"
+        assert llm.get_history()[-1]["content"] == text
@@ -0,0 +1,201 @@
+"""
+Tests for prompt-caching breakpoints.
+"""
+
+from pydantic import BaseModel
+
+from tinyloop.features.function_calling import Tool
+from tinyloop.inference.litellm import LLM
+from tinyloop.inference.prompt_cache import (
+    CACHE_CONTROL,
+    get_prompt_cache_support,
+    mark_messages,
+    mark_tools,
+)
+from tinyloop.modules.tool_loop import ToolLoop
+
+
+def get_weather(location: str):
+    """Get the weather for a city."""
+    return f"Sunny in {location}"
+
+
+class Answer(BaseModel):
+    answer: str
+
+
+def _conversation():
+    return [
+        {"role": "system", "content": "You are helpful"},
+        {"role": "user", "content": "Weather in Lisbon?"},
+        {
+            "role": "assistant",
+            "content": "",
+            "tool_calls": [{"id": "1", "type": "function", "function": {}}],
+        },
+        {"role": "tool", "tool_call_id": "1", "content": "Sunny"},
+        {"role": "assistant", "content": "It is sunny."},
+        {"role": "user", "content": [{"type": "text", "text": "And tomorrow?"}]},
+    ]
+
+
+def _marked(messages):
+    return [
+        index
+        for index, message in enumerate(messages)
+        if "cache_control" in message
+        or (
+            isinstance(message["content"], list)
+            and "cache_control" in message["content"][-1]
+        )
+    ]
+
+
+class TestCapabilities:
+    """Test the per-model capability table."""
+
+    def test_lookup(self):
+        assert get_prompt_cache_support("anthropic/claude-sonnet-4").breakpoints
+        assert get_prompt_cache_support("bedrock/us.anthropic.claude-3-5").breakpoints
+        assert not get_prompt_cache_support("openai/gpt-4.1-nano").breakpoints
+        assert not get_prompt_cache_support("gemini/gemini-2.5-flash").breakpoints
+        assert get_prompt_cache_support("ollama/llama3") is None
+
+
+class TestMarking:
+    """Test where breakpoints are added."""
+
+    def test_stable_prefix_is_marked(self):
+        messages = _conversation()
+
+        marked = mark_messages(messages)
+
+        # System prompt and last completed turn
+        assert _marked(marked) == [0, 4]
+        assert marked[4]["cache_control"] == CACHE_CONTROL
+        # The original messages are untouched
+        assert _marked(messages) == []
+        assert marked[1] is messages[1]
+
+    def test_tool_call_turn(self):
+        messages = _conversation()[:4]
+
+        # The assistant message only has tool calls: mark what it answered
+        assert _marked(mark_messages(messages)) == [0, 1]
+
+    def test_newest_message(self):
+        marked = mark_messages(_conversation(), mark_newest=True)
+
+        assert _marked(marked) == [0, 4, 5]
+        assert marked[5]["content"][-1]["cache_control"] == CACHE_CONTROL
+
+    def test_breakpoint_limit(self):
+        marked = mark_messages(_conversation(), max_breakpoints=2, mark_newest=True)
+
+        assert _marked(marked) == [0, 4]
+
+    def test_tools(self):
+        definitions = [Tool(get_weather).definition, {"type": "function"}]
+
+        marked = mark_tools(definitions)
+
+        assert marked[-1]["cache_control"] == CACHE_CONTROL
+        assert "cache_control" not in definitions[-1]
+        assert marked[0] is definitions[0]
+
+
+class TestLLMPromptCaching:
+    """Test breakpoints on LLM requests."""
+
+    def _call(self, make_model_response, model, **kwargs):
+        calls = []
+
+        def client(**params):
+            calls.append(params)
+            return make_model_response(
+                content="Sunny",
+                usage={
+                    "prompt_tokens": 2000,
+                    "completion_tokens": 10,
+                    "total_tokens": 2010,
+                    "prompt_tokens_details": {"cached_tokens": 1500},
+                },
+            )
+
+        llm = LLM(model=model, system_prompt="You are helpful", **kwargs)
+        llm.sync_client = client
+        response = llm(prompt="Weather?", tools=[Tool(get_weather)])
+        return llm, calls[0], response
+
+    def test_anthropic(self, make_model_response):
+        llm, params, response = self._call(
+            make_model_response, "anthropic/claude-sonnet-4"
+        )
+
+        # A one-shot call only marks the system prompt and the tools
+        assert _marked(params["messages"]) == [0]
+        assert params["tools"][-1]["cache_control"] == CACHE_CONTROL
+        assert _marked(llm.get_history()) == []
+        assert response.usage.cache_hit_rate == 0.75
+        assert llm.get_total_usage().cached_tokens == 1500
+
+    def test_automatic_caching_models(self, make_model_response):
+        _, params, _ = self._call(make_model_response, "openai/gpt-4.1-nano")
+
+        assert _marked(params["messages"]) == []
+        assert "cache_control" not in params["tools"][-1]
+
+    def test_disabled(self, make_model_response):
+        _, params, _ = self._call(
+            make_model_response, "anthropic/claude-sonnet-4", prompt_caching=False
+        )
+
+        assert _marked(params["messages"]) == []
+
+    def test_tool_loop_marks_newest_message(self, make_model_response):
+        calls = []
+        responses = [
+            make_model_response(
+                content=None,
+                tool_calls=[
+                    {
+                        "id": "1",
+                        "type": "function",
+                        "function": {
+                            "name": "get_weather",
+                            "arguments": '{"location": "Lisbon"}',
+                        },
+                    }
+                ],
+            ),
+            make_model_response(
+                content=None,
+                tool_calls=[
+                    {
+                        "id": "2",
+                        "type": "function",
+                        "function": {"name": "finish", "arguments": "{}"},
+                    }
+                ],
+            ),
+            make_model_response(content='{"answer": "Sunny"}'),
+        ]
+
+        def client(**params):
+            calls.append(params)
+            return responses.pop(0)
+
+        loop = ToolLoop(
+            model="anthropic/claude-sonnet-4",
+            tools=[Tool(get_weather)],
+            output_format=Answer,
+        )
+        loop.llm.sync_client = client
+        loop("Weather in Lisbon?")
+
+        # Each iteration writes the prefix the next one reads: the first
+        # one its prompt, the second one the result of get_weather
+        assert _marked(calls[0]["messages"]) == [0]
+        assert _marked(calls[1]["messages"]) == [2]
+        # The final call reads that prefix but writes no newer one
+        assert _marked(calls[2]["messages"]) == [2]
@@ -0,0 +1,155 @@
+"""Tests for the retry policy and circuit breaker."""
+
+import httpx
+import litellm
+import pytest
+
+from tinyloop.inference.litellm import LLM
+from tinyloop.inference.retry import (
+    CircuitBreaker,
+    CircuitOpenError,
+    RetryPolicy,
+    get_retry_after,
+)
+
+NO_WAIT = RetryPolicy(max_retries=3, initial_delay=0, jitter=0)
+
+
+def _server_error(headers=None):
+    return litellm.ServiceUnavailableError(
+        message="overloaded",
+        llm_provider="openai",
+        model="gpt-4o-mini",
+        response=httpx.Response(
+            503,
+            headers=headers,
+            request=httpx.Request("POST", "https://api.openai.com"),
+        ),
+    )
+
+
+def _bad_request():
+    return litellm.BadRequestError(
+        message="bad request", llm_provider="openai", model="gpt-4o-mini"
+    )
+
+
+class FlakyClient:
+    """Client that fails a number of times before returning a response."""
+
+    def __init__(self, errors, response):
+        self.errors = list(errors)
+        self.response = response
+        self.calls = 0
+
+    def __call__(self, **kwargs):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return self.response
+
+
+class TestRetryPolicy:
+    """Test backoff computation and error classification."""
+
+    def test_retryable_errors(self):
+        policy = RetryPolicy()
+        assert policy.is_retryable(_server_error())
+        assert not policy.is_retryable(_bad_request())
+        assert not policy.is_retryable(ValueError("boom"))
+
+    def test_exponential_backoff_without_jitter(self):
+        policy = RetryPolicy(initial_delay=1, multiplier=2, max_delay=5, jitter=0)
+        assert [policy.get_delay(i) for i in range(1, 5)] == [1, 2, 4, 5]
+
+    def test_jitter_stays_within_bounds(self):
+        policy = RetryPolicy(initial_delay=1, jitter=0.5)
+        for _ in range(50):
+            assert 0.5 <= policy.get_delay(1) <= 1.0
+
+    def test_retry_after_header_is_honored(self):
+        policy = RetryPolicy(initial_delay=1, jitter=0, max_retry_after=10)
+        assert policy.get_delay(1, _server_error({"Retry-After": "7"})) == 7
+        assert policy.get_delay(1, _server_error({"Retry-After": "120"})) == 10
+        assert get_retry_after(_server_error({"retry-after-ms": "250"})) == 0.25
+        assert get_retry_after(_server_error()) is None
+
+
+class TestCircuitBreaker:
+    """Test circuit breaker state transitions."""
+
+    def test_opens_after_threshold(self):
+        breaker = CircuitBreaker(model="m", failure_threshold=2, recovery_timeout=60)
+        breaker.record_failure()
+        breaker.before_call()
+        breaker.record_failure()
+        with pytest.raises(CircuitOpenError):
+            breaker.before_call()
+
+    def test_half_open_probe(self):
+        breaker = CircuitBreaker(model="m", failure_threshold=1, recovery_timeout=0)
+        breaker.record_failure()
+        breaker.before_call()  # probe allowed
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        breaker.record_success()
+        assert breaker.state == CircuitBreaker.CLOSED
+
+
+class TestLLMRetries:
+    """Test retries wired into LLM.invoke/ainvoke."""
+
+    def test_invoke_retries_without_duplicating_history(self, make_model_response):
+        llm = LLM(model="gpt-4o-mini", retry_policy=NO_WAIT)
+        client = FlakyClient([_server_error(), _server_error()], make_model_response())
+        llm.sync_client = client
+
+        response = llm.invoke(prompt="Hi")
+
+        assert response.response == "Hello!"
+        assert client.calls == 3
+        assert [m["role"] for m in llm.get_history()] == ["user", "assistant"]
+
+    def test_non_retryable_error_is_raised_and_history_restored(
+        self, make_model_response
+    ):
+        llm = LLM(model="gpt-4o-mini", retry_policy=NO_WAIT)
+        client = FlakyClient([_bad_request()], make_model_response())
+        llm.sync_client = client
+
+        with pytest.raises(litellm.BadRequestError):
+            llm.invoke(prompt="Hi")
+
+        assert client.calls == 1
+        assert llm.get_history() == []
+
+    def test_circuit_breaker_fails_fast(self, make_model_response):
+        breaker = CircuitBreaker(
+            model="gpt-4o-mini", failure_threshold=2, recovery_timeout=60
+        )
+        llm = LLM(model="gpt-4o-mini", circuit_breaker=breaker)
+        client = FlakyClient([_server_error()] * 5, make_model_response())
+        llm.sync_client = client
+
+        for _ in range(2):
+            with pytest.raises(litellm.ServiceUnavailableError):
+                llm.invoke(prompt="Hi")
+        with pytest.raises(CircuitOpenError):
+            llm.invoke(prompt="Hi")
+
+        assert client.calls == 2
+
+    @pytest.mark.asyncio
+    async def test_ainvoke_retries(self, make_model_response):
+        llm = LLM(model="gpt-4o-mini", retry_policy=NO_WAIT)
+        client = FlakyClient([_server_error()], make_model_response())
+
+        async def async_client(**kwargs):
+            return client(**kwargs)
+
+        llm.async_client = async_client
+
+        response = await llm.ainvoke(prompt="Hi")
+
+        assert response.response == "Hello!"
+        assert client.calls == 2
+        assert len(llm.get_history()) == 2
@@ -0,0 +1,182 @@
+"""Tests for session-keyed conversation stores."""
+
+import asyncio
+import threading
+
+import pytest
+
+from tinyloop.inference.litellm import LLM
+from tinyloop.inference.sessions import (
+    FileConversationStore,
+    InMemoryConversationStore,
+    SQLiteConversationStore,
+)
+
+USER = {"role": "user", "content": "Hi"}
+ASSISTANT = {"role": "assistant", "content": "Hello!"}
+
+
+@pytest.fixture(params=["memory", "sqlite", "file"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return InMemoryConversationStore()
+    if request.param == "sqlite":
+        return SQLiteConversationStore(str(tmp_path / "sessions.db"), cache_size=2)
+    return FileConversationStore(str(tmp_path / "sessions"), cache_size=2)
+
+
+class TestConversationStores:
+    """Test the behavior shared by all store backends."""
+
+    def test_append_and_load(self, store):
+        store.append("a", [USER])
+        store.append("a", [ASSISTANT])
+
+        assert store.load("a") == [USER, ASSISTANT]
+        assert store.load("unknown") == []
+        assert "a" in store
+        assert "unknown" not in store
+
+    def test_load_returns_a_copy(self, store):
+        store.append("a", [USER])
+        store.load("a").append(ASSISTANT)
+        assert store.load("a") == [USER]
+
+    def test_replace_and_delete(self, store):
+        store.append("a", [USER, ASSISTANT])
+        store.replace("a", [USER])
+        assert store.load("a") == [USER]
+
+        store.delete("a")
+        assert store.load("a") == []
+
+
+class TestPersistentStores:
+    """Test lazy loading of sessions evicted from the in-memory cache."""
+
+    @pytest.mark.parametrize(
+        "make_store",
+        [
+            lambda path: SQLiteConversationStore(str(path / "s.db"), cache_size=2),
+            lambda path: FileConversationStore(str(path / "s"), cache_size=2),
+        ],
+    )
+    def test_only_hot_sessions_are_cached(self, make_store, tmp_path):
+        store = make_store(tmp_path)
+        for i in range(10):
+            store.append(f"session-{i}", [USER])
+            store.load(f"session-{i}")
+
+        assert len(store._cache) == 2
+        # Evicted sessions are read back from storage
+        assert store.load("session-0") == [USER]
+
+    def test_sessions_survive_restart(self, tmp_path):
+        path = str(tmp_path / "sessions.db")
+        SQLiteConversationStore(path).append("a", [USER, ASSISTANT])
+        assert SQLiteConversationStore(path).load("a") == [USER, ASSISTANT]
+
+    def test_in_memory_store_evicts_least_recently_used(self):
+        store = InMemoryConversationStore(max_sessions=2)
+        store.append("a", [USER])
+        store.append("b", [USER])
+        store.load("a")
+        store.append("c", [USER])
+
+        assert "a" in store and "c" in store
+        assert "b" not in store
+
+
+class TestLLMSessions:
+    """Test LLM calls with a session_id."""
+
+    def test_sessions_are_isolated(self, make_model_response):
+        llm = LLM(model="gpt-4o-mini", system_prompt="Be nice")
+        requests = []
+
+        def client(**kwargs):
+            requests.append(list(kwargs["messages"]))
+            return make_model_response()
+
+        llm.sync_client = client
+
+        llm.invoke(prompt="Hi from A", session_id="a")
+        llm.invoke(prompt="Hi from B", session_id="b")
+        response = llm.invoke(prompt="Again from A", session_id="a")
+
+        assert [m["role"] for m in requests[-1]] == [
+            "system",
+            "user",
+            "assistant",
+            "user",
+        ]
+        assert response.message_history == llm.get_history(session_id="a")
+        assert len(llm.get_history(session_id="b")) == 3
+        # The instance history is untouched by session calls
+        assert llm.get_history() == [{"role": "system", "content": "Be nice"}]
+
+    @pytest.mark.asyncio
+    async def test_concurrent_sessions_on_shared_instance(self, make_model_response):
+        llm = LLM(model="gpt-4o-mini", temperature=0.5)
+
+        async def async_client(**kwargs):
+            await asyncio.sleep(0.01)
+            return make_model_response(content=kwargs["messages"][-1]["content"])
+
+        llm.async_client = async_client
+
+        await asyncio.gather(
+            *[
+                llm.ainvoke(prompt=f"message {i}", session_id=f"user-{i % 3}")
+                for i in range(9)
+            ]
+        )
+
+        for user in range(3):
+            history = llm.get_history(session_id=f"user-{user}")
+            assert len(history) == 6
+            for user_message, assistant_message in zip(history[::2], history[1::2]):
+                assert user_message["content"] == assistant_message["content"]
+
+    @pytest.mark.asyncio
+    async def test_async_calls_keep_storage_off_the_event_loop(
+        self, make_model_response, tmp_path
+    ):
+        threads = []
+
+        class RecordingStore(SQLiteConversationStore):
+            def _read(self, session_id):
+                threads.append(threading.current_thread())
+                return super()._read(session_id)
+
+            def _append(self, session_id, messages):
+                threads.append(threading.current_thread())
+                super()._append(session_id, messages)
+
+        store = RecordingStore(str(tmp_path / "sessions.db"), cache_size=0)
+        llm = LLM(model="gpt-4o-mini", conversation_store=store)
+
+        async def async_client(**kwargs):
+            return make_model_response(content="Hello!")
+
+        llm.async_client = async_client
+
+        await llm.ainvoke(prompt="Hi", session_id="a")
+        await llm.ainvoke(prompt="Again", session_id="a")
+
+        assert len(threads) == 4
+        assert threading.current_thread() not in threads
+        assert len(store.load("a")) == 4
+
+    def test_failed_call_is_not_persisted(self, tmp_path):
+        store = SQLiteConversationStore(str(tmp_path / "sessions.db"))
+        llm = LLM(model="gpt-4o-mini", conversation_store=store)
+
+        def client(**kwargs):
+            raise RuntimeError("boom")
+
+        llm.sync_client = client
+
+        with pytest.raises(RuntimeError):
+            llm.invoke(prompt="Hi", session_id="a")
+        assert "a" not in store
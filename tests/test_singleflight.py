@@ -0,0 +1,126 @@
+"""Tests for single-flight coalescing of identical requests."""
+
+import asyncio
+
+import pytest
+
+from tinyloop.inference.budget import Budget
+from tinyloop.inference.litellm import LLM
+from tinyloop.inference.singleflight import SingleFlight, make_request_key
+from tinyloop.utils.metrics import llm_metrics
+
+
+class TestSingleFlight:
+    """Test the SingleFlight primitive."""
+
+    def test_request_key_is_order_independent(self):
+        messages = [{"role": "user", "content": "Hi"}]
+        assert make_request_key(
+            {"model": "m", "messages": messages, "temperature": 0}
+        ) == make_request_key({"temperature": 0, "messages": messages, "model": "m"})
+        assert make_request_key({"model": "a"}) != make_request_key({"model": "b"})
+
+    @pytest.mark.asyncio
+    async def test_concurrent_calls_share_one_upstream_call(self):
+        flight = SingleFlight()
+        calls = []
+
+        async def upstream():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return "result"
+
+        results = await asyncio.gather(*[flight.do("key", upstream) for _ in range(5)])
+
+        assert len(calls) == 1
+        assert [result for result, _ in results] == ["result"] * 5
+        assert sum(shared for _, shared in results) == 4
+        assert flight.in_flight() == 0
+
+    @pytest.mark.asyncio
+    async def test_errors_are_propagated_to_all_callers(self):
+        flight = SingleFlight()
+
+        async def upstream():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("boom")
+
+        results = await asyncio.gather(
+            flight.do("key", upstream),
+            flight.do("key", upstream),
+            return_exceptions=True,
+        )
+
+        assert all(isinstance(result, RuntimeError) for result in results)
+
+
+class TestLLMCoalescing:
+    """Test coalescing wired into LLM.ainvoke."""
+
+    @staticmethod
+    def _slow_client(make_model_response, calls):
+        async def async_client(**kwargs):
+            calls.append(kwargs)
+            await asyncio.sleep(0.05)
+            return make_model_response(cost=0.5)
+
+        return async_client
+
+    @pytest.mark.asyncio
+    async def test_deterministic_requests_are_coalesced(self, make_model_response):
+        calls = []
+        llms = [LLM(model="gpt-4o-mini", temperature=0) for _ in range(3)]
+        for llm in llms:
+            llm.async_client = self._slow_client(make_model_response, calls)
+
+        responses = await asyncio.gather(*[llm.ainvoke(prompt="Hi") for llm in llms])
+
+        assert len(calls) == 1
+        assert all(response.response == "Hello!" for response in responses)
+        assert len({id(response.raw_response) for response in responses}) == 3
+        assert sorted(response.cost for response in responses) == [0, 0, 0.5]
+        assert sorted(r.usage.total_tokens for r in responses) == [0, 0, 15]
+        assert all(len(llm.get_history()) == 2 for llm in llms)
+
+    @pytest.mark.asyncio
+    async def test_followers_do_not_count_tokens_twice(self, make_model_response):
+        calls = []
+        budget = Budget(max_tokens=10_000)
+        llms = [LLM(model="gpt-4o-mini", temperature=0) for _ in range(3)]
+        for llm in llms:
+            llm.async_client = self._slow_client(make_model_response, calls)
+        tokens = llm_metrics.tokens.value("gpt-4o-mini", "LLM", "input")
+
+        await asyncio.gather(
+            *[llm.ainvoke(prompt="Hi", budget=budget, max_tokens=100) for llm in llms]
+        )
+
+        assert len(calls) == 1
+        assert budget.usage.total_tokens == 15
+        assert budget.cost == 0.5
+        assert llm_metrics.tokens.value("gpt-4o-mini", "LLM", "input") == tokens + 10
+
+    @pytest.mark.asyncio
+    async def test_sampling_requests_are_not_coalesced(self, make_model_response):
+        calls = []
+        llms = [LLM(model="gpt-4o-mini", temperature=0.7) for _ in range(3)]
+        for llm in llms:
+            llm.async_client = self._slow_client(make_model_response, calls)
+
+        await asyncio.gather(*[llm.ainvoke(prompt="Hi") for llm in llms])
+
+        assert len(calls) == 3
+
+    @pytest.mark.asyncio
+    async def test_explicit_opt_in(self, make_model_response):
+        calls = []
+        llms = [
+            LLM(model="gpt-4o-mini", temperature=0.7, coalesce_requests=True)
+            for _ in range(2)
+        ]
+        for llm in llms:
+            llm.async_client = self._slow_client(make_model_response, calls)
+
+        await asyncio.gather(*[llm.ainvoke(prompt="Hi") for llm in llms])
+
+        assert len(calls) == 1
@@ -5,13 +5,21 @@ These tests verify that the LLM can generate structured responses that conform
 to specified Pydantic models, including complex nested structures and various data types.
 """
 
+import json
 import os
 from typing import List, Optional
 
 import pytest
 from dotenv import load_dotenv
+from litellm.utils import type_to_response_format_param
 from pydantic import BaseModel, Field, ValidationError
 
+from tinyloop.features.structured_output import (
+    ResponseFormat,
+    get_response_format,
+    get_type_adapter,
+    repair_json,
+)
 from tinyloop.inference.litellm import LLM
 from tinyloop.types import LLMResponse
 
@@ -428,3 +436,210 @@ class TestStructuredOutput:
 
         except Exception as e:
             pytest.skip(f"Different temperatures test failed: {str(e)}")
+
+
+class TestResponseFormatCache:
+    """Test the per-class schema and validator caches."""
+
+    def test_schema_is_built_once(self):
+        response_format = get_response_format(Order)
+
+        assert get_response_format(Order) is response_format
+        assert response_format == type_to_response_format_param(Order)
+        assert get_type_adapter(Order) is get_type_adapter(Order)
+
+    def test_cached_schema_is_sent(self, make_model_response):
+        sent = []
+
+        def client(**kwargs):
+            sent.append(kwargs["response_format"])
+            return make_model_response(content='{"message": "hi", "count": 2}')
+
+        llm = LLM(model="openai/gpt-4.1-nano")
+        llm.sync_client = client
+
+        first = llm(prompt="Say hi", response_format=SimpleResponse)
+        second = llm(prompt="Say hi again", response_format=SimpleResponse)
+
+        assert isinstance(sent[0], ResponseFormat)
+        assert sent[0] is sent[1]
+        assert first.response == SimpleResponse(message="hi", count=2)
+        assert isinstance(second.response, SimpleResponse)
+
+    def test_invalid_output_raises(self, make_model_response):
+        llm = LLM(model="openai/gpt-4.1-nano")
+        llm.sync_client = lambda **kwargs: make_model_response(content='{"count": 1}')
+
+        with pytest.raises(ValidationError):
+            llm(prompt="Say hi", response_format=SimpleResponse)
+
+
+class TestRepairJSON:
+    """Test local repair of almost-valid JSON."""
+
+    @pytest.mark.parametrize(
+        "text, expected",
+        [
+            (
+                '```json\n{"message": "hi", "count": 1}\n```',
+                {"message": "hi", "count": 1},
+            ),
+            (
+                'Sure! {"message": "hi", "count": 1} Anything else?',
+                {"message": "hi", "count": 1},
+            ),
+            (
+                '{"items": [1, 2,], "nested": {"a": "x",},}',
+                {"items": [1, 2], "nested": {"a": "x"}},
+            ),
+            ('{"message": "a, b]", "count": 1,}', {"message": "a, b]", "count": 1}),
+            ('{"items": [1, 2], "message": "hi"', {"items": [1, 2], "message": "hi"}),
+            ('{"items": [{"ok": true}, \n', {"items": [{"ok": True}]}),
+        ],
+    )
+    def test_repairs(self, text, expected):
+        assert json.loads(repair_json(text)) == expected
+
+    @pytest.mark.parametrize(
+        "text",
+        ['{"message": "trunc', '{"b": "x', '{"ok": tru', '{"count": 1', '{"a":'],
+    )
+    def test_truncated_values_are_not_completed(self, text):
+        assert repair_json(text) is None
+
+    def test_no_json(self):
+        assert repair_json("I cannot answer that") is None
+
+
+class TestStructuredOutputRecovery:
+    """Test repair and re-ask of invalid structured outputs."""
+
+    def test_malformed_json_is_repaired_locally(self, make_model_response):
+        calls = []
+
+        def client(**kwargs):
+            calls.append(kwargs)
+            return make_model_response(
+                content='```json\n{"message": "hi", "count": 2,}'
+            )
+
+        llm = LLM(model="openai/gpt-4.1-nano", max_reasks=1)
+        llm.sync_client = client
+
+        response = llm(prompt="Say hi", response_format=SimpleResponse)
+
+        assert response.response == SimpleResponse(message="hi", count=2)
+        assert len(calls) == 1
+        assert llm.output_stats == {"repaired": 1, "reasked": 0}
+
+    def test_truncated_output_is_reasked(self, make_model_response):
+        truncated = make_model_response(content='{"count": 2, "message": "hi"')
+        truncated.choices[0].finish_reason = "length"
+        responses = iter(
+            [truncated, make_model_response(content='{"message": "hi", "count": 2}')]
+        )
+
+        llm = LLM(model="openai/gpt-4.1-nano", max_reasks=1)
+        llm.sync_client = lambda **kwargs: next(responses)
+
+        response = llm(prompt="Say hi", response_format=SimpleResponse)
+
+        assert response.response == SimpleResponse(message="hi", count=2)
+        assert llm.output_stats == {"repaired": 0, "reasked": 1}
+
+    def test_reask_sends_only_the_error(self, make_model_response):
+        responses = iter(
+            [
+                make_model_response(content='{"message": "hi", "count": "two"}'),
+                make_model_response(content='{"message": "hi", "count": 2}'),
+            ]
+        )
+        calls = []
+
+        def client(**kwargs):
+            calls.append(kwargs)
+            return next(responses)
+
+        llm = LLM(model="openai/gpt-4.1-nano", system_prompt="Be nice", max_reasks=1)
+        llm.sync_client = client
+
+        response = llm(prompt="Say hi", response_format=SimpleResponse)
+
+        assert response.response == SimpleResponse(message="hi", count=2)
+        reask = calls[1]["messages"]
+        assert len(reask) == 1
+        assert '"count": "two"' in reask[0]["content"]
+        assert "count: Input should be a valid integer" in reask[0]["content"]
+        assert calls[1]["response_format"] is calls[0]["response_format"]
+        assert llm.output_stats == {"repaired": 0, "reasked": 1}
+        assert llm.run_cost == [0.001, 0.001]
+        # The history keeps the corrected output only
+        assert [m["role"] for m in llm.get_history()] == [
+            "system",
+            "user",
+            "assistant",
+        ]
+        assert llm.get_history()[-1]["content"] == '{"message": "hi", "count": 2}'
+
+    def test_reasks_are_bounded(self, make_model_response):
+        calls = []
+
+        def client(**kwargs):
+            calls.append(kwargs)
+            return make_model_response(content='{"message": "hi"}')
+
+        llm = LLM(model="openai/gpt-4.1-nano", max_reasks=2)
+        llm.sync_client = client
+
+        with pytest.raises(ValidationError):
+            llm(prompt="Say hi", response_format=SimpleResponse)
+        assert len(calls) == 3
+
+    def test_failed_reask_leaves_history_untouched(self, make_model_response):
+        responses = [make_model_response(content='{"message": "hi"}')]
+
+        def client(**kwargs):
+            if responses:
+                return responses.pop()
+            raise ConnectionError("connection reset")
+
+        llm = LLM(model="openai/gpt-4.1-nano", max_reasks=1)
+        llm.sync_client = client
+
+        with pytest.raises(ConnectionError):
+            llm(prompt="hi", response_format=SimpleResponse)
+        assert llm.get_history() == []
+
+    @pytest.mark.asyncio
+    async def test_failed_validation_leaves_history_untouched(
+        self, make_model_response
+    ):
+        async def client(**kwargs):
+            return make_model_response(content='{"message": "hi"}')
+
+        llm = LLM(model="openai/gpt-4.1-nano", max_reasks=1)
+        llm.async_client = client
+
+        with pytest.raises(ValidationError):
+            await llm.acall(prompt="hi", response_format=SimpleResponse)
+        assert llm.get_history() == []
+
+    @pytest.mark.asyncio
+    async def test_async_reask(self, make_model_response):
+        responses = iter(
+            [
+                make_model_response(content="no JSON here"),
+                make_model_response(content='{"message": "hi", "count": 2}'),
+            ]
+        )
+
+        async def client(**kwargs):
+            return next(responses)
+
+        llm = LLM(model="openai/gpt-4.1-nano", max_reasks=1)
+        llm.async_client = client
+
+        response = await llm.acall(prompt="Say hi", response_format=SimpleResponse)
+
+        assert response.response.count == 2
+        assert llm.output_stats["reasked"] == 1
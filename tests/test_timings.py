@@ -0,0 +1,136 @@
+"""
+Tests for the per-phase latency breakdown of LLM calls.
+"""
+
+import time
+
+import pytest
+from litellm import ModelResponseStream
+
+from tinyloop.features.function_calling import Tool
+from tinyloop.inference.litellm import LLM
+from tinyloop.inference.timings import PhaseStats, PhaseTimer, phase_stats
+from tinyloop.types import LLMResponse
+
+MODEL = "openai/gpt-4.1-nano"
+
+
+def get_weather(location: str):
+    """Get the weather for a city."""
+    return f"Sunny in {location}"
+
+
+@pytest.fixture(autouse=True)
+def clean_phase_stats():
+    phase_stats.reset()
+    yield
+    phase_stats.reset()
+
+
+class TestPhaseTimer:
+    """Test splitting wall time into phases."""
+
+    def test_phases_add_up_to_total(self):
+        timer = PhaseTimer()
+        time.sleep(0.01)
+        timer.mark("prepare")
+        time.sleep(0.02)
+        timer.mark("network")
+        timer.mark("prepare")
+
+        timings = timer.finish()
+
+        assert set(timings) == {"prepare", "network", "total"}
+        assert timings["network"] >= 0.02
+        assert timings["prepare"] + timings["network"] == pytest.approx(
+            timings["total"]
+        )
+
+
+class TestPhaseStats:
+    """Test the process-wide percentiles."""
+
+    def test_percentiles_and_report(self):
+        stats = PhaseStats()
+        for seconds in range(1, 101):
+            stats.record("model", {"network": seconds / 100})
+
+        percentiles = stats.percentiles("model", "network", qs=(0.5, 0.99))
+
+        assert percentiles["p50"] == pytest.approx(0.5, abs=0.02)
+        assert percentiles["p99"] == pytest.approx(0.99, abs=0.02)
+        assert stats.percentiles("model", "parse") == {
+            "p50": None,
+            "p90": None,
+            "p99": None,
+        }
+        assert list(stats.report()) == ["model"]
+        stats.reset()
+        assert stats.report() == {}
+
+
+class TestLLMTimings:
+    """Test the timings attached to LLM responses."""
+
+    def test_sync_call(self, make_model_response):
+        def client(**kwargs):
+            time.sleep(0.02)
+            return make_model_response()
+
+        llm = LLM(model=MODEL)
+        llm.sync_client = client
+
+        response = llm(prompt="Hello", tools=[Tool(get_weather)])
+        timings = response.timings
+
+        assert {"prepare", "tools", "network", "parse", "tracing", "total"} <= set(
+            timings
+        )
+        assert timings["network"] >= 0.02
+        phases = sum(seconds for phase, seconds in timings.items() if phase != "total")
+        assert phases == pytest.approx(timings["total"])
+        assert phase_stats.percentiles(MODEL, "network")["p50"] == timings["network"]
+
+    def test_direct_invoke_is_recorded(self, make_model_response):
+        llm = LLM(model=MODEL)
+        llm.sync_client = lambda **kwargs: make_model_response()
+
+        response = llm.invoke(prompt="Hello")
+
+        assert "tracing" not in response.timings
+        assert phase_stats.percentiles(MODEL, "total")["p50"] == pytest.approx(
+            response.timings["total"]
+        )
+
+    def test_model_dump(self, make_model_response):
+        llm = LLM(model=MODEL)
+        llm.sync_client = lambda **kwargs: make_model_response()
+
+        response = llm(prompt="Hello")
+
+        assert response.model_dump()["timings"] == response.timings
+
+    @pytest.mark.asyncio
+    async def test_streaming_call(self):
+        async def stream():
+            for text in ["Hel", "lo", "!"]:
+                yield ModelResponseStream(
+                    id="chunk", choices=[{"delta": {"content": text}}]
+                )
+            # What the litellm cost callback prints
+            print("tloop_final_cost=0.000100")
+
+        async def async_client(**kwargs):
+            return stream()
+
+        llm = LLM(model=MODEL)
+        llm.async_client = async_client
+
+        updates = [item async for item in await llm.acall(prompt="Hi", stream=True)]
+        final = updates[-1]
+
+        assert isinstance(final, LLMResponse)
+        assert {"network", "ttft", "stream", "cost", "parse", "total"} <= set(
+            final.timings
+        )
+        assert phase_stats.percentiles(MODEL, "ttft")["p50"] == final.timings["ttft"]
@@ -0,0 +1,187 @@
+"""
+Tests for relevance-ranked tool selection.
+"""
+
+from pydantic import BaseModel
+
+from tinyloop.features.function_calling import Tool
+from tinyloop.features.tool_retrieval import ToolRetriever, tokenize
+from tinyloop.modules.tool_loop import ToolLoop
+
+
+def get_weather(location: str, unit: str = "celsius"):
+    """Get the current weather forecast for a city.
+
+    Args:
+        location: The city name
+        unit: Temperature unit {'celsius', 'fahrenheit'}
+    """
+    return f"Sunny in {location}"
+
+
+def convert_currency(amount: float, source: str, target: str):
+    """Convert an amount of money between currencies.
+
+    Args:
+        amount: Amount of money to convert
+        source: ISO code of the source currency
+        target: ISO code of the target currency
+    """
+    return amount
+
+
+def send_email(recipient: str, subject: str, body: str):
+    """Send an email message.
+
+    Args:
+        recipient: Email address of the recipient
+        subject: Subject line
+        body: Message text
+    """
+    return "sent"
+
+
+def search_flights(origin: str, destination: str, date: str):
+    """Search flights between two airports on a date."""
+    return []
+
+
+def _catalog():
+    return [
+        Tool(get_weather),
+        Tool(convert_currency),
+        Tool(send_email),
+        Tool(search_flights),
+    ]
+
+
+class TestTokenize:
+    """Test query and document tokenization."""
+
+    def test_splits_identifiers(self):
+        assert tokenize("getWeather search_flights") == [
+            "get",
+            "weather",
+            "search",
+            "flights",
+        ]
+
+    def test_drops_stopwords(self):
+        assert tokenize("What is the weather in Paris") == [
+            "what",
+            "weather",
+            "paris",
+        ]
+
+
+class TestToolRetriever:
+    """Test BM25 ranking and selection."""
+
+    def test_ranks_relevant_tool_first(self):
+        retriever = ToolRetriever(_catalog(), top_k=2)
+
+        ranked = retriever.search("How much is 20 dollars in euros? convert money")
+
+        assert ranked[0][0].name == "convert_currency"
+
+    def test_uses_parameter_docs(self):
+        retriever = ToolRetriever(_catalog())
+
+        ranked = retriever.search("celsius or fahrenheit")
+
+        assert [tool.name for tool, _ in ranked] == ["get_weather"]
+
+    def test_select_respects_top_k_and_pinned(self):
+        retriever = ToolRetriever(_catalog(), top_k=1, pinned=["send_email"])
+
+        selected = retriever.select("weather forecast for Lisbon")
+
+        assert [tool.name for tool in selected] == ["send_email", "get_weather"]
+
+    def test_select_includes_extra_tools(self):
+        finish = Tool(lambda: True, name="finish", description="Finish the task")
+        retriever = ToolRetriever(_catalog(), top_k=1)
+
+        selected = retriever.select("flights to Rome", include=[finish])
+
+        assert [tool.name for tool in selected] == ["finish", "search_flights"]
+
+    def test_embeddings_are_blended(self):
+        vectors = {
+            "get_weather": [1.0, 0.0],
+            "convert_currency": [0.0, 1.0],
+        }
+
+        def embed(texts):
+            return [
+                next(
+                    (vector for name, vector in vectors.items() if name in text),
+                    [0.7, 0.7],
+                )
+                for text in texts
+            ]
+
+        retriever = ToolRetriever(
+            _catalog()[:2], embed=embed, embedding_weight=1.0, top_k=1
+        )
+
+        # No shared terms, the embedding alone decides
+        assert retriever.search("get_weather")[0][0].name == "get_weather"
+
+
+class TestToolLoopRetrieval:
+    """Test tool selection inside ToolLoop."""
+
+    def test_only_relevant_tools_are_sent(self, make_model_response):
+        class Answer(BaseModel):
+            answer: str
+
+        sent_tools = []
+        responses = iter(
+            [
+                make_model_response(
+                    content=None,
+                    tool_calls=[
+                        {
+                            "id": "1",
+                            "type": "function",
+                            "function": {
+                                "name": "get_weather",
+                                "arguments": '{"location": "Lisbon"}',
+                            },
+                        }
+                    ],
+                ),
+                make_model_response(
+                    content=None,
+                    tool_calls=[
+                        {
+                            "id": "2",
+                            "type": "function",
+                            "function": {"name": "finish", "arguments": "{}"},
+                        }
+                    ],
+                ),
+                make_model_response(content='{"answer": "Sunny"}'),
+            ]
+        )
+
+        def client(**kwargs):
+            if kwargs.get("tools"):
+                sent_tools.append([t["function"]["name"] for t in kwargs["tools"]])
+            return next(responses)
+
+        catalog = _catalog()
+        loop = ToolLoop(
+            model="openai/gpt-4.1-nano",
+            tools=catalog,
+            output_format=Answer,
+            tool_retriever=ToolRetriever(catalog, top_k=1),
+        )
+        loop.llm.sync_client = client
+
+        loop("What is the weather forecast in Lisbon?")
+
+        assert sent_tools[0] == ["finish", "get_weather"]
+        # Tools already used stay available
+        assert sent_tools[1][:2] == ["finish", "get_weather"]
@@ -0,0 +1,108 @@
+"""
+Tests for the lightweight response types.
+"""
+
+import pytest
+from pydantic import ValidationError
+
+from tinyloop.inference.history import History
+from tinyloop.inference.litellm import LLM
+from tinyloop.types import (
+    LLMResponse,
+    LLMResponseModel,
+    LLMStreamingResponse,
+    ToolCall,
+    ToolCallDelta,
+    ToolCallModel,
+)
+
+
+class TestResponseTypes:
+    """Test slot-based types and their pydantic conversion."""
+
+    def test_no_instance_dict(self):
+        chunk = LLMStreamingResponse(id="1", response="Hel")
+
+        assert not hasattr(chunk, "__dict__")
+        with pytest.raises(AttributeError):
+            chunk.unknown = True
+
+    def test_keyword_only(self):
+        with pytest.raises(TypeError):
+            ToolCall("get_weather", {}, "1")
+
+    def test_delta_is_mutable(self):
+        delta = ToolCallDelta(function_arguments="")
+        delta.function_arguments += '{"a": 1}'
+
+        assert delta.function_arguments == '{"a": 1}'
+
+    def test_to_model(self):
+        response = LLMResponse(
+            response="Sunny",
+            tool_calls=[ToolCall(function_name="get_weather", args={}, id="1")],
+            cost=0.1,
+            hidden_fields={},
+        )
+
+        model = response.to_model()
+
+        assert isinstance(model, LLMResponseModel)
+        assert model.tool_calls == [
+            ToolCallModel(function_name="get_weather", args={}, id="1")
+        ]
+        assert response.model_dump()["tool_calls"][0]["function_name"] == (
+            "get_weather"
+        )
+
+    def test_to_model_validates(self):
+        tool_call = ToolCall(function_name=None, args={}, id="1")
+
+        with pytest.raises(ValidationError):
+            tool_call.to_model()
+
+
+class TestResponseProfiles:
+    """Test what responses keep depending on the response profile."""
+
+    def _llm(self, make_model_response, profile):
+        llm = LLM(model="openai/gpt-4.1-nano", response_profile=profile)
+        llm.sync_client = lambda **kwargs: make_model_response(content="Hi!")
+        return llm
+
+    def test_full(self, make_model_response):
+        response = self._llm(make_model_response, "full")(prompt="Hello")
+
+        assert response.raw_response is not None
+        assert response.message_history == [
+            {"role": "user", "content": "Hello"},
+            {"role": "assistant", "content": "Hi!"},
+        ]
+        assert response.usage.total_tokens == 15
+
+    def test_standard_history_is_a_view(self, make_model_response):
+        llm = self._llm(make_model_response, "standard")
+
+        first = llm(prompt="Hello")
+        llm(prompt="Again")
+
+        assert first.raw_response is not None
+        assert isinstance(first.message_history, History)
+        # The view is not affected by later turns
+        assert len(first.message_history) == 2
+        assert first.to_model().message_history[-1]["content"] == "Hi!"
+
+    def test_slim(self, make_model_response):
+        response = self._llm(make_model_response, "slim")(prompt="Hello")
+
+        assert response.response == "Hi!"
+        assert response.content == "Hi!"
+        assert response.raw_response is None
+        assert response.message_history is None
+        assert response.hidden_fields == {}
+        assert response.usage.input_tokens == 10
+        assert response.cost == 0.001
+
+    def test_unknown_profile(self):
+        with pytest.raises(ValueError, match="response_profile"):
+            LLM(model="openai/gpt-4.1-nano", response_profile="tiny")
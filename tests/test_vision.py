@@ -4,12 +4,20 @@ Tests for tinyloop.functionality.vision module.
 This module tests all image loading methods and utility functions in the vision module.
 """
 
+import base64
 import io
 
 import pytest
 from PIL import Image as PILImage
 
-from tinyloop.features.vision import Image, encode_image, is_image, is_url
+from tinyloop.features.vision import (
+    Image,
+    encode_image,
+    encode_many,
+    get_image_preset,
+    is_image,
+    is_url,
+)
 
 
 class TestImageClass:
@@ -79,7 +87,7 @@ class TestImageClass:
 
         with pytest.raises(
             ValueError,
-            match="Exactly one of from_url, from_pil, or from_file must be provided",
+            match="Exactly one of from_url, from_pil, from_file or from_bytes",
         ):
             Image(from_url=url, from_pil=pil_image)
 
@@ -87,7 +95,7 @@ class TestImageClass:
         """Test that providing no sources raises ValueError."""
         with pytest.raises(
             ValueError,
-            match="Exactly one of from_url, from_pil, or from_file must be provided",
+            match="Exactly one of from_url, from_pil, from_file or from_bytes",
         ):
             Image()
 
@@ -116,12 +124,23 @@ class TestImageClass:
         """Test string representation of Image with base64 data."""
         pil_image = PILImage.new("RGB", (100, 100), color="red")
         image = Image(from_pil=pil_image)
+        image.encode()
 
         str_repr = str(image)
         assert "Image(url=data:image/png;base64," in str_repr
         assert "mime_type='image/png'" in str_repr
         assert "<IMAGE_BASE_64_ENCODED(" in str_repr
 
+    def test_image_str_does_not_encode(self):
+        """Test that printing an image does not encode it."""
+        image = Image(from_pil=PILImage.new("RGB", (100, 50), color="red"))
+
+        assert str(image) == "Image(source=<PIL RGB 100x50>, mime_type='image/png')"
+        assert repr(Image(from_bytes=b"abc")) == (
+            "Image(source=<3 bytes>, mime_type='None')"
+        )
+        assert not image.is_encoded
+
     def test_image_repr_representation(self):
         """Test repr representation of Image."""
         url = "https://example.com/image.jpg"
@@ -432,3 +451,207 @@ class TestIntegration:
 
             # Verify MIME type
             assert image.mime_type == expected_mime
+
+
+class TestImageResizing:
+    """Test downscaling and recompression before upload."""
+
+    def test_no_policy_keeps_file_bytes(self, tmp_path):
+        """Test that files are sent byte-for-byte without a policy."""
+        image_path = tmp_path / "photo.png"
+        PILImage.new("RGB", (300, 200), color="red").save(image_path)
+
+        image = Image.from_file(str(image_path))
+
+        assert image.encoded_bytes == image_path.stat().st_size
+        assert image.bytes_saved == 0
+
+    def test_max_side_downscales_file(self, tmp_path):
+        """Test that large files are resized and re-encoded."""
+        image_path = tmp_path / "photo.png"
+        PILImage.effect_noise((1200, 800), 64).convert("RGB").save(image_path)
+
+        image = Image.from_file(str(image_path), max_side=300, format="auto")
+
+        assert image.mime_type == "image/jpeg"
+        decoded = PILImage.open(io.BytesIO(base64.b64decode(image.url.split(",")[1])))
+        assert decoded.size == (300, 200)
+        assert image.bytes_saved > 0
+        assert image.encoded_bytes + image.bytes_saved == image.original_bytes
+
+    def test_small_file_is_not_made_bigger(self, tmp_path):
+        """Test that re-encoding is skipped when it would not help."""
+        image_path = tmp_path / "tiny.png"
+        PILImage.new("RGB", (4, 4), color="red").save(image_path)
+
+        image = Image.from_file(str(image_path), max_side=1000, format="JPEG")
+
+        assert image.mime_type == "image/png"
+        assert image.encoded_bytes == image_path.stat().st_size
+
+    def test_auto_format_keeps_transparency(self):
+        """Test that images with alpha are encoded as PNG in auto mode."""
+        rgba = PILImage.new("RGBA", (100, 100), color=(255, 0, 0, 128))
+        assert Image.from_PIL(rgba, format="auto").mime_type == "image/png"
+
+        rgb = PILImage.new("RGB", (100, 100), color="red")
+        assert Image.from_PIL(rgb, format="auto").mime_type == "image/jpeg"
+
+    def test_webp_output(self):
+        """Test explicit WebP re-encoding."""
+        pil_image = PILImage.new("RGB", (100, 100), color="red")
+        image = Image.from_PIL(pil_image, format="WEBP", quality=70)
+        assert image.mime_type == "image/webp"
+
+    def test_model_presets(self):
+        """Test per-model presets and explicit overrides."""
+        assert get_image_preset("anthropic/claude-sonnet-4")["max_side"] == 1568
+        assert get_image_preset("openai/gpt-4.1")["max_side"] == 2048
+        assert get_image_preset("gemini/gemini-2.5-pro")["max_side"] == 3072
+        assert get_image_preset("unknown-model") == {}
+
+        pil_image = PILImage.new("RGB", (4000, 1000), color="red")
+        image = Image.from_PIL(pil_image, preset="claude-3-haiku", max_side=1000)
+        assert image.encode_options == {
+            "max_side": 1000,
+            "quality": 85,
+            "format": "auto",
+        }
+        decoded = PILImage.open(io.BytesIO(base64.b64decode(image.url.split(",")[1])))
+        assert decoded.size == (1000, 250)
+
+
+class TestLazyEncoding:
+    """Test that images are only encoded when the request is built."""
+
+    def test_construction_does_not_encode(self, tmp_path):
+        """Test that no data URI exists right after construction."""
+        image_path = tmp_path / "photo.png"
+        PILImage.new("RGB", (50, 50), color="red").save(image_path)
+
+        file_image = Image.from_file(str(image_path))
+        pil_image = Image.from_PIL(PILImage.new("RGB", (50, 50), color="blue"))
+
+        assert not file_image.is_encoded
+        assert not pil_image.is_encoded
+        assert file_image.mime_type == "image/png"
+        assert pil_image.mime_type == "image/png"
+        assert not file_image.is_encoded
+        assert not pil_image.is_encoded
+
+    def test_url_access_encodes_and_release_frees(self, tmp_path):
+        """Test encoding on first access and releasing the data URI."""
+        image_path = tmp_path / "photo.png"
+        PILImage.new("RGB", (50, 50), color="red").save(image_path)
+        image = Image.from_file(str(image_path))
+
+        url = image.url
+
+        assert image.is_encoded
+        assert url.startswith("data:image/png;base64,")
+
+        image.release()
+        assert not image.is_encoded
+        assert image.url == url
+
+    def test_release_keeps_remote_urls(self):
+        """Test that remote URLs are not dropped by release."""
+        image = Image.from_url("https://example.com/image.jpg")
+        image.release()
+        assert image.url == "https://example.com/image.jpg"
+
+    def test_from_bytes(self):
+        """Test creating an image from encoded bytes."""
+        buffer = io.BytesIO()
+        PILImage.new("RGB", (20, 20), color="red").save(buffer, format="JPEG")
+
+        image = Image.from_bytes(buffer.getvalue())
+
+        assert not image.is_encoded
+        assert image.mime_type == "image/jpeg"
+        assert image.encoded_bytes == len(buffer.getvalue())
+
+    def test_from_bytes_invalid_data(self):
+        """Test that undecodable bytes raise when encoded."""
+        image = Image.from_bytes(b"not an image")
+        with pytest.raises(ValueError, match="Could not determine the image type"):
+            image.encode()
+
+    def test_user_message_encodes_at_send_time(self):
+        """Test that building the user message encodes the image."""
+        from tinyloop.inference.litellm import LLM
+
+        image = Image.from_PIL(PILImage.new("RGB", (20, 20), color="red"))
+        message = LLM(model="openai/gpt-4.1-nano")._prepare_user_message(
+            "Describe", [image]
+        )
+
+        assert image.is_encoded
+        assert message["content"][1]["image_url"]["url"] == image.url
+
+
+class TestEncodeMany:
+    """Test parallel batch encoding."""
+
+    @pytest.fixture
+    def paths(self, tmp_path):
+        paths = []
+        for i in range(10):
+            path = tmp_path / f"image_{i}.png"
+            PILImage.new("RGB", (40 + i, 30), color=(i * 20, 0, 0)).save(path)
+            paths.append(str(path))
+        return paths
+
+    @pytest.mark.parametrize("executor", ["thread", "process"])
+    def test_results_match_encode_image_in_order(self, paths, executor):
+        """Test that results are yielded in input order."""
+        results = list(encode_many(paths, workers=3, executor=executor))
+        assert results == [encode_image(path) for path in paths]
+
+    def test_options_are_applied(self, paths):
+        """Test that the resize policy reaches every image."""
+        for data_uri, mime_type in encode_many(paths, workers=2, max_side=20):
+            decoded = PILImage.open(
+                io.BytesIO(base64.b64decode(data_uri.split(",")[1]))
+            )
+            assert max(decoded.size) == 20
+            assert mime_type == "image/png"
+
+    def test_existing_executor(self, paths):
+        """Test passing a caller-owned executor."""
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            results = list(encode_many(iter(paths), executor=pool))
+        assert len(results) == len(paths)
+
+    def test_errors_propagate(self, paths):
+        """Test that a failing image raises when its result is reached."""
+        results = encode_many([paths[0], "not a file"], workers=2)
+        assert next(results)[1] == "image/png"
+        with pytest.raises(ValueError, match="Unsupported file string"):
+            next(results)
+
+    def test_unknown_executor(self, paths):
+        """Test that an unknown executor name is rejected."""
+        with pytest.raises(ValueError, match="Unknown executor"):
+            list(encode_many(paths, executor="gpu"))
+
+
+class TestStreamingEncoding:
+    """Test the one-pass data URI builder."""
+
+    @pytest.mark.parametrize("size", [0, 1, 2, 3, 4, 3 * 256 * 1024 + 1])
+    def test_matches_b64encode(self, tmp_path, size):
+        """Test output identical to a plain b64encode across chunk boundaries."""
+        from tinyloop.features.vision import _build_data_uri
+
+        data = bytes(range(256)) * (size // 256 + 1)
+        data = data[:size]
+        expected = f"data:image/png;base64,{base64.b64encode(data).decode()}"
+
+        assert _build_data_uri(data, "image/png") == expected
+
+        image_path = tmp_path / "image.png"
+        image_path.write_bytes(data)
+        assert encode_image(str(image_path))[0] == expected
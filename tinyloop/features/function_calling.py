@@ -1,8 +1,12 @@
 """Clean function calling module for converting Python functions to JSON tool definitions."""
 
+import functools
 import inspect
 import re
+import weakref
+from types import UnionType
 from typing import (
+    Annotated,
     Any,
     Callable,
     Dict,
@@ -15,13 +19,40 @@ from typing import (
 )
 
 import mlflow
+from pydantic import (
+    BaseModel,
+    ConfigDict,
+    Field,
+    TypeAdapter,
+    ValidationError,
+    create_model,
+)
 
 from tinyloop.types import ToolCallResponse
+from tinyloop.utils.metrics import track_module
 from tinyloop.utils.observability import set_trace_custom
 
 mlflow.config.enable_async_logging(True)
 
 
+class ToolArgumentsError(ValueError):
+    """
+    Raised when a model calls a tool with invalid arguments.
+
+    `str(error)` is a compact description meant to be sent back to the model.
+    """
+
+    def __init__(self, tool_name: str, errors: List[Dict[str, Any]]):
+        self.tool_name = tool_name
+        self.errors = errors
+        details = "; ".join(
+            f"{'.'.join(str(part) for part in error['loc']) or 'arguments'}: "
+            f"{error['msg']}"
+            for error in errors
+        )
+        super().__init__(f"Invalid arguments for tool '{tool_name}': {details}")
+
+
 class Tool:
     """
     A tool wrapper that converts a Python function to JSON tool definition.
@@ -55,6 +86,65 @@ class Tool:
             func, self.name, self.description, self.hidden_params
         )
 
+    @functools.cached_property
+    def args_model(self) -> Optional[type[BaseModel]]:
+        """
+        Pydantic model validating the arguments, compiled on first use and
+        shared by every Tool wrapping the same function.
+        """
+        options = (self.name, tuple(self.hidden_params))
+        try:
+            models = _args_model_cache.setdefault(self.func, {})
+        except TypeError:
+            # Unhashable callable, or one that cannot be weakly referenced
+            return function_to_args_model(self.func, self.name, self.hidden_params)
+        if options not in models:
+            models[options] = function_to_args_model(
+                self.func, self.name, self.hidden_params
+            )
+        return models[options]
+
+    def validate_args(self, args: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Validate and coerce the arguments of a tool call made by a model.
+
+        Only the arguments that were given are returned, so the function's
+        own defaults still apply. Arguments not in the signature are passed
+        through unchanged to functions taking `**kwargs`.
+
+        Raises:
+            ToolArgumentsError: If the arguments do not match the signature
+        """
+        if self.args_model is None:
+            return args
+        try:
+            validated = self.args_model.model_validate(args)
+        except ValidationError as e:
+            raise ToolArgumentsError(
+                self.name, e.errors(include_url=False, include_input=False)
+            ) from None
+        extra = validated.model_extra or {}
+        hidden = [name for name in extra if name in self.hidden_params]
+        if hidden:
+            # Still not accepted from the model when **kwargs would take them
+            raise ToolArgumentsError(
+                self.name,
+                [
+                    {"loc": (name,), "msg": "Extra inputs are not permitted"}
+                    for name in hidden
+                ],
+            )
+        # Fields are aliased by parameter name (see function_to_args_model)
+        return {
+            **{
+                field.alias: getattr(validated, name)
+                for name, field in type(validated).model_fields.items()
+                if field.alias in args
+            },
+            **extra,
+        }
+
+    @track_module("Tool")
     @set_trace_custom(
         mlflow.entities.SpanType.TOOL, lambda self, func: f"{self.name}.{func.__name__}"
     )
@@ -63,6 +153,7 @@ class Tool:
         tool_result = self.func(*args, **kwargs)
         return tool_result
 
+    @track_module("Tool")
     @set_trace_custom(
         mlflow.entities.SpanType.TOOL, lambda self, func: f"{self.name}.{func.__name__}"
     )
@@ -84,6 +175,9 @@ def function_to_tool_json(
     """
     Convert a Python function to OpenAI function calling JSON format.
 
+    Definitions are cached per function and options, so building the same
+    tools again (e.g. one ToolLoop per request) is cheap.
+
     Args:
         func: The function to convert
         hidden_params: List of parameter names to omit from the JSON signature
@@ -91,6 +185,27 @@ def function_to_tool_json(
     Returns:
         Dictionary in OpenAI function calling format
     """
+    options = (name, description, tuple(hidden_params or []))
+    try:
+        definitions = _tool_json_cache.setdefault(func, {})
+    except TypeError:
+        # Unhashable callable, or one that cannot be weakly referenced
+        definitions = {}
+
+    definition = definitions.get(options)
+    if definition is None:
+        definition = _function_to_tool_json(func, name, description, hidden_params)
+        definitions[options] = definition
+    # Callers own their copy
+    return _copy_schema(definition)
+
+
+def _function_to_tool_json(
+    func: Callable,
+    name: Optional[str],
+    description: Optional[str] = None,
+    hidden_params: Optional[List[str]] = None,
+) -> Dict[str, Any]:
     hidden_params = hidden_params or []
 
     # Get function signature and docstring
@@ -101,23 +216,24 @@ def function_to_tool_json(
     doc_description, param_docs = _parse_docstring(doc)
     description = description or doc_description
 
-    # Get type hints
-    type_hints = get_type_hints(func)
+    # Get type hints, keeping Annotated metadata
+    type_hints = get_type_hints(func, include_extras=True)
 
     # Build parameters
     properties = {}
     required = []
+    defs = {}
 
     for param_name, param in sig.parameters.items():
-        if param_name in hidden_params:
+        if param_name in hidden_params or param.kind in (
+            inspect.Parameter.VAR_POSITIONAL,
+            inspect.Parameter.VAR_KEYWORD,
+        ):
             continue
 
-        # Get parameter type
+        # Build property definition from the parameter type
         param_type = type_hints.get(param_name, param.annotation)
-        json_type, enum_values = _python_type_to_json_schema(param_type)
-
-        # Build property definition
-        prop_def = {"type": json_type}
+        prop_def = _python_type_to_json_schema(param_type, defs)
 
         # Add description from docstring and extract enum values
         if param_name in param_docs:
@@ -130,36 +246,104 @@ def function_to_tool_json(
                 # Parse comma-separated values, handling quotes
                 enum_items = [item.strip().strip("'\"") for item in enum_str.split(",")]
                 if enum_items and all(item for item in enum_items):
-                    enum_values = enum_items
+                    prop_def["enum"] = enum_items
                     # Remove the enum part from the description
                     desc = re.sub(r"\s*\{[^}]+\}\s*", " ", desc).strip()
 
             prop_def["description"] = desc
 
-        # Add enum if present
-        if enum_values:
-            prop_def["enum"] = enum_values
-
         properties[param_name] = prop_def
 
         # Add to required if no default value
         if param.default == inspect.Parameter.empty:
             required.append(param_name)
 
+    parameters = {
+        "type": "object",
+        "properties": properties,
+        "required": required,
+    }
+    if defs:
+        parameters["$defs"] = defs
+
     return {
         "type": "function",
         "function": {
             "name": name or func.__name__,
             "description": description,
-            "parameters": {
-                "type": "object",
-                "properties": properties,
-                "required": required,
-            },
+            "parameters": parameters,
         },
     }
 
 
+# Definitions built by function_to_tool_json per function, then per options.
+# Weakly keyed, so the entries of closures and lambdas go away with them
+_tool_json_cache: weakref.WeakKeyDictionary[Callable, Dict[tuple, Dict[str, Any]]] = (
+    weakref.WeakKeyDictionary()
+)
+# Schemas of parameter types, shared by every function using them
+_type_schema_cache: Dict[Any, tuple] = {}
+# Argument validators built for Tool.args_model, keyed like _tool_json_cache
+_args_model_cache: weakref.WeakKeyDictionary[
+    Callable, Dict[tuple, Optional[type[BaseModel]]]
+] = weakref.WeakKeyDictionary()
+
+
+def function_to_args_model(
+    func: Callable,
+    name: Optional[str] = None,
+    hidden_params: Optional[List[str]] = None,
+) -> Optional[type[BaseModel]]:
+    """
+    Build a pydantic model validating the arguments a model may pass to a
+    function. Hidden and variadic parameters are not part of it; unknown
+    arguments are only accepted if the function takes `**kwargs`. Fields are
+    aliased by parameter name, see `Tool.validate_args` to map them back.
+
+    Returns:
+        The model, or None if the signature cannot be validated
+    """
+    hidden_params = hidden_params or []
+    try:
+        type_hints = get_type_hints(func, include_extras=True)
+    except Exception:
+        type_hints = {}
+
+    try:
+        parameters = inspect.signature(func).parameters
+    except (TypeError, ValueError):
+        return None
+
+    fields = {}
+    extra = "forbid"
+    for param_name, param in parameters.items():
+        if param.kind is inspect.Parameter.VAR_KEYWORD:
+            extra = "allow"
+        if param_name in hidden_params or param.kind in (
+            inspect.Parameter.VAR_POSITIONAL,
+            inspect.Parameter.VAR_KEYWORD,
+        ):
+            continue
+        annotation = type_hints.get(param_name, Any)
+        default = ... if param.default is inspect.Parameter.empty else param.default
+        # Parameters such as `_private`, `model_config` or `json` are not valid
+        # pydantic field names: each field gets an internal name, and is
+        # read from (and reported under) the parameter name
+        fields[f"arg_{len(fields)}"] = (
+            annotation,
+            Field(default, alias=param_name),
+        )
+
+    try:
+        return create_model(
+            f"{name or func.__name__}_args",
+            __config__=ConfigDict(extra=extra, arbitrary_types_allowed=True),
+            **fields,
+        )
+    except Exception:
+        return None
+
+
 def _parse_docstring(docstring: str) -> tuple[str, Dict[str, str]]:
     """
     Parse function docstring to extract description and parameter documentation.
@@ -208,15 +392,15 @@ def _parse_docstring(docstring: str) -> tuple[str, Dict[str, str]]:
             if param_match:
                 current_param = param_match.group(1)
                 param_type_desc = param_match.group(2)
-                # For NumPy style, the whole line after the colon is the description
-                # Extract description (everything after the basic type, but preserve enum info)
-                desc_match = re.search(r"^[^{]*(\{[^}]*\})?\s*(.*)$", param_type_desc)
-                if desc_match:
-                    enum_part = desc_match.group(1) or ""
-                    desc_part = desc_match.group(2) or ""
-                    full_desc = (enum_part + " " + desc_part).strip()
-                    param_docs[current_param] = full_desc
+                if re.match(r"\w+\s+:", line):
+                    # NumPy style ("name : type {enum}"): the description is
+                    # on the next lines, only keep the enum info of the type
+                    desc_match = re.search(r"(\{[^}]*\})\s*(.*)$", param_type_desc)
+                    param_docs[current_param] = (
+                        " ".join(desc_match.groups()).strip() if desc_match else ""
+                    )
                 else:
+                    # Google style ("name: description {enum}")
                     param_docs[current_param] = param_type_desc.strip()
             elif current_param and line:
                 # Continuation of parameter description
@@ -238,42 +422,78 @@ def _parse_docstring(docstring: str) -> tuple[str, Dict[str, str]]:
     return description, param_docs
 
 
-def _python_type_to_json_schema(python_type: Any) -> tuple[str, Optional[List[str]]]:
+def _python_type_to_json_schema(
+    python_type: Any, defs: Dict[str, Any]
+) -> Dict[str, Any]:
     """
-    Convert Python type annotation to JSON Schema type and enum values.
+    Convert a Python type annotation to a JSON Schema.
 
-    Returns:
-        Tuple of (json_type, enum_values)
+    Nested models and enums are added to `defs` and referenced with `$ref`.
+    Unannotated parameters and types pydantic cannot describe become strings.
     """
     # Handle None/empty annotation
     if python_type == inspect.Parameter.empty or python_type is None:
-        return "string", None
-
-    # Handle Union types (including Optional)
-    origin = get_origin(python_type)
-    if origin is Union:
-        args = get_args(python_type)
-        # Filter out NoneType for Optional handling
-        non_none_args = [arg for arg in args if arg is not type(None)]
+        return {"type": "string"}
+
+    # Optional[X] is described as X, the parameter simply is not required
+    if get_origin(python_type) in (Union, UnionType):
+        non_none_args = [arg for arg in get_args(python_type) if arg is not type(None)]
         if len(non_none_args) == 1:
-            return _python_type_to_json_schema(non_none_args[0])
-        # For multiple non-None types, default to string
-        return "string", None
-
-    # Handle basic types
-    if python_type is str or python_type == "str":
-        return "string", None
-    elif python_type is int or python_type == "int":
-        return "integer", None
-    elif python_type is float or python_type == "float":
-        return "number", None
-    elif python_type is bool or python_type == "bool":
-        return "boolean", None
-    elif python_type is list or origin is list:
-        return "array", None
-    elif python_type is dict or origin is dict:
-        return "object", None
-
-    # Handle string type hints with enum-like information in docstring
-    # This is a simple heuristic - could be enhanced
-    return "string", None
+            return _python_type_to_json_schema(non_none_args[0], defs)
+
+    try:
+        cached = _type_schema_cache.get(python_type)
+    except TypeError:
+        # Unhashable annotation metadata
+        cached = None
+    if cached is None:
+        try:
+            schema = TypeAdapter(python_type).json_schema(
+                ref_template="#/$defs/{model}"
+            )
+        except Exception:
+            return {"type": "string"}
+        schema = _strip_titles(schema)
+        cached = (schema, schema.pop("$defs", {}))
+        try:
+            _type_schema_cache[python_type] = cached
+        except TypeError:
+            pass
+
+    schema = _copy_schema(cached[0])
+    defs.update(_copy_schema(cached[1]))
+
+    # Plain strings in Annotated metadata are used as descriptions
+    if get_origin(python_type) is Annotated and "description" not in schema:
+        notes = [note for note in python_type.__metadata__ if isinstance(note, str)]
+        if notes:
+            schema["description"] = " ".join(notes)
+    return schema
+
+
+def _copy_schema(schema: Any) -> Any:
+    """Copy a JSON schema, much faster than copy.deepcopy for plain data."""
+    if isinstance(schema, dict):
+        return {key: _copy_schema(value) for key, value in schema.items()}
+    if isinstance(schema, list):
+        return [_copy_schema(item) for item in schema]
+    return schema
+
+
+def _strip_titles(schema: Any) -> Any:
+    """Remove the auto-generated titles pydantic adds to every schema."""
+    if isinstance(schema, list):
+        return [_strip_titles(item) for item in schema]
+    if not isinstance(schema, dict):
+        return schema
+    stripped = {}
+    for key, value in schema.items():
+        if key == "title" and isinstance(value, str):
+            continue
+        if key in ("properties", "$defs"):
+            stripped[key] = {name: _strip_titles(sub) for name, sub in value.items()}
+        elif key in ("default", "const", "enum", "examples"):
+            stripped[key] = value
+        else:
+            stripped[key] = _strip_titles(value)
+    return stripped
@@ -0,0 +1,177 @@
+"""Content-addressed cache of encoded images (base64 data URIs)."""
+
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from PIL import Image as PILImage
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+class ImageCache:
+    """
+    LRU cache of encoded images under a memory budget, with an optional
+    on-disk tier.
+
+    Args:
+        max_bytes: Memory budget for the cached data URIs
+        disk_dir: Directory for the on-disk tier (disabled if None)
+
+    Example:
+        cache = ImageCache(max_bytes=64 * 1024 * 1024, disk_dir="/tmp/images")
+        set_image_cache(cache)
+        cache.stats()  # {"hits": ..., "misses": ..., "hit_rate": ..., ...}
+    """
+
+    def __init__(
+        self, max_bytes: int = DEFAULT_MAX_BYTES, disk_dir: Optional[str] = None
+    ):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+        self._entries: "OrderedDict[str, Tuple[str, str]]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[Tuple[str, str]]:
+        """Get the cached (data_uri, mime_type) for a key."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+
+        entry = self._read_disk(key)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._put_memory(key, entry)
+            return entry
+
+    def put(self, key: str, data_uri: str, mime_type: str) -> None:
+        """Cache the encoded image for a key."""
+        entry = (data_uri, mime_type)
+        with self._lock:
+            self._put_memory(key, entry)
+        self._write_disk(key, entry)
+
+    def clear(self) -> None:
+        """Drop the in-memory entries and reset the statistics."""
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+            self.hits = self.disk_hits = self.misses = self.evictions = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Get hit-rate statistics."""
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._size,
+            }
+
+    def _put_memory(self, key: str, entry: Tuple[str, str]) -> None:
+        size = len(entry[0])
+        if size > self.max_bytes:
+            return
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._size -= len(previous[0])
+        self._entries[key] = entry
+        self._size += size
+        while self._size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._size -= len(evicted[0])
+            self.evictions += 1
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}.uri")
+
+    def _read_disk(self, key: str) -> Optional[Tuple[str, str]]:
+        if not self.disk_dir:
+            return None
+        try:
+            with open(self._disk_path(key), "r", encoding="ascii") as file:
+                data_uri = file.read()
+        except FileNotFoundError:
+            return None
+        mime_type = data_uri.split(";")[0].split(":")[1]
+        return data_uri, mime_type
+
+    def _write_disk(self, key: str, entry: Tuple[str, str]) -> None:
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="ascii") as file:
+                file.write(entry[0])
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Failed to write image cache entry to disk: {e}")
+
+
+def file_cache_key(file_path: str, **options) -> str:
+    """Cache key for a file: path, modification time and size."""
+    stat = os.stat(file_path)
+    return _hash_key(
+        "file",
+        os.path.abspath(file_path),
+        stat.st_mtime_ns,
+        stat.st_size,
+        sorted(options.items()),
+    )
+
+
+def pil_cache_key(image: PILImage.Image, **options) -> str:
+    """Cache key for a PIL image: a hash of its pixels, mode and size."""
+    pixels = hashlib.blake2b(image.tobytes(), digest_size=20).hexdigest()
+    return _hash_key(
+        "pil", image.mode, image.size, image.format, pixels, sorted(options.items())
+    )
+
+
+def bytes_cache_key(data: bytes, **options) -> str:
+    """Cache key for encoded image bytes: a hash of their content."""
+    digest = hashlib.blake2b(data, digest_size=20).hexdigest()
+    return _hash_key("bytes", digest, sorted(options.items()))
+
+
+def _hash_key(*parts: Any) -> str:
+    return hashlib.sha256(repr(parts).encode("utf-8")).hexdigest()
+
+
+# Cache shared by the encoders in tinyloop.features.vision
+_image_cache: Optional[ImageCache] = ImageCache()
+
+
+def get_image_cache() -> Optional[ImageCache]:
+    """Get the image cache used by the vision encoders (None if disabled)."""
+    return _image_cache
+
+
+def set_image_cache(cache: Optional[ImageCache]) -> None:
+    """Replace the image cache used by the vision encoders, None disables it."""
+    global _image_cache
+    _image_cache = cache
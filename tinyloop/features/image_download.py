@@ -0,0 +1,219 @@
+"""
+Pooled image downloading for the vision encoders.
+
+Downloads reuse one connection pool (a requests.Session for sync code, an
+httpx.AsyncClient per live event loop for async code), are bounded by timeouts
+and a size cap, and are base64-encoded chunk by chunk as they arrive so the raw
+and the encoded copy of an image are never both held in memory.
+"""
+
+import asyncio
+import base64
+import mimetypes
+import threading
+import weakref
+from typing import Any, List, Optional, Tuple
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_MAX_BYTES = 20 * 1024 * 1024
+_CHUNK_SIZE = 64 * 1024
+
+
+class ImageTooLargeError(ValueError):
+    """Raised when a downloaded image exceeds the size cap."""
+
+    def __init__(self, url: str, max_bytes: int):
+        self.url = url
+        self.max_bytes = max_bytes
+        super().__init__(f"Image at {url} exceeds the {max_bytes} bytes limit")
+
+
+class _Base64Encoder:
+    """Incremental base64 encoder fed with arbitrarily sized chunks."""
+
+    def __init__(self, url: str, max_bytes: Optional[int]):
+        self.url = url
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._parts: List[str] = []
+        self._remainder = b""
+
+    def update(self, chunk: bytes) -> None:
+        self.size += len(chunk)
+        if self.max_bytes is not None and self.size > self.max_bytes:
+            raise ImageTooLargeError(self.url, self.max_bytes)
+        data = self._remainder + chunk
+        # Only whole 3-byte groups encode without padding
+        cut = len(data) - len(data) % 3
+        self._parts.append(base64.b64encode(data[:cut]).decode("ascii"))
+        self._remainder = data[cut:]
+
+    def finish(self) -> str:
+        self._parts.append(base64.b64encode(self._remainder).decode("ascii"))
+        self._remainder = b""
+        return "".join(self._parts)
+
+
+class ImageDownloader:
+    """
+    Downloads images over shared connection pools.
+
+    Args:
+        timeout: Timeout in seconds for connecting and for each read
+        max_bytes: Largest image accepted (no limit if None)
+        max_concurrency: Async downloads running at the same time
+        max_connections: Size of the connection pools
+
+    Example:
+        downloader = ImageDownloader(timeout=5, max_concurrency=4)
+        set_image_downloader(downloader)
+        data_uris = await aencode_images(urls, download_images=True)
+
+        # Or close the pools of the current loop when done
+        async with ImageDownloader() as downloader:
+            data_uri, mime_type = await downloader.afetch(url)
+    """
+
+    def __init__(
+        self,
+        timeout: float = 10.0,
+        max_bytes: Optional[int] = DEFAULT_MAX_BYTES,
+        max_concurrency: int = 8,
+        max_connections: int = 16,
+    ):
+        self.timeout = timeout
+        self.max_bytes = max_bytes
+        self.max_concurrency = max_concurrency
+        self.max_connections = max_connections
+
+        self._session: Optional[requests.Session] = None
+        # httpx clients and semaphores can only be used from their own loop
+        self._async_clients: weakref.WeakKeyDictionary[
+            asyncio.AbstractEventLoop, Tuple[httpx.AsyncClient, asyncio.Semaphore]
+        ] = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    @property
+    def session(self) -> requests.Session:
+        with self._lock:
+            if self._session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=self.max_connections,
+                    pool_maxsize=self.max_connections,
+                )
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                self._session = session
+            return self._session
+
+    def _async_client(self) -> Tuple[httpx.AsyncClient, asyncio.Semaphore]:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            self._drop_closed_loops()
+            entry = self._async_clients.get(loop)
+            if entry is None or entry[0].is_closed:
+                client = httpx.AsyncClient(
+                    timeout=self.timeout,
+                    follow_redirects=True,
+                    limits=httpx.Limits(max_connections=self.max_connections),
+                )
+                entry = (client, asyncio.Semaphore(self.max_concurrency))
+                self._async_clients[loop] = entry
+            return entry
+
+    def _drop_closed_loops(self) -> None:
+        # Open connections and waiting semaphores reference their loop, which
+        # then stays alive as a key: the pools of closed loops can no longer
+        # be closed, only dropped (their sockets close when collected)
+        for loop in [loop for loop in self._async_clients if loop.is_closed()]:
+            del self._async_clients[loop]
+
+    def fetch(self, url: str) -> Tuple[str, str]:
+        """Download an image to a base64 data URI with MIME type."""
+        with self.session.get(url, stream=True, timeout=self.timeout) as response:
+            response.raise_for_status()
+            mime_type = _mime_type(url, response.headers)
+            self._check_length(url, response.headers)
+            encoder = _Base64Encoder(url, self.max_bytes)
+            for chunk in response.iter_content(_CHUNK_SIZE):
+                encoder.update(chunk)
+        return f"data:{mime_type};base64,{encoder.finish()}", mime_type
+
+    async def afetch(self, url: str) -> Tuple[str, str]:
+        """Download an image without blocking the event loop."""
+        client, semaphore = self._async_client()
+        async with semaphore:
+            async with client.stream("GET", url) as response:
+                response.raise_for_status()
+                mime_type = _mime_type(url, response.headers)
+                self._check_length(url, response.headers)
+                encoder = _Base64Encoder(url, self.max_bytes)
+                async for chunk in response.aiter_bytes(_CHUNK_SIZE):
+                    encoder.update(chunk)
+        return f"data:{mime_type};base64,{encoder.finish()}", mime_type
+
+    async def afetch_many(self, urls: List[str]) -> List[Tuple[str, str]]:
+        """Download many images concurrently, results in the order of `urls`."""
+        return list(await asyncio.gather(*(self.afetch(url) for url in urls)))
+
+    def close(self) -> None:
+        """Close the sync connection pool."""
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+
+    async def aclose(self) -> None:
+        """Close the connection pools, including the async one of this loop."""
+        self.close()
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            self._drop_closed_loops()
+            entry = self._async_clients.pop(loop, None)
+        if entry is not None:
+            await entry[0].aclose()
+
+    async def __aenter__(self) -> "ImageDownloader":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
+
+    def _check_length(self, url: str, headers: Any) -> None:
+        # Reject early when the server announces the size, the stream is
+        # still checked in case it does not
+        length = headers.get("content-length")
+        if self.max_bytes is not None and length and length.isdigit():
+            if int(length) > self.max_bytes:
+                raise ImageTooLargeError(url, self.max_bytes)
+
+
+def _mime_type(url: str, headers: Any) -> str:
+    content_type = headers.get("content-type", "").split(";")[0].strip()
+    # Use the content type from the response headers if available
+    if content_type:
+        return content_type
+    # Try to guess MIME type from URL
+    mime_type, _ = mimetypes.guess_type(url)
+    if mime_type is None:
+        raise ValueError(f"Could not determine MIME type for URL: {url}")
+    return mime_type
+
+
+# Downloader shared by the encoders in tinyloop.features.vision
+_image_downloader = ImageDownloader()
+
+
+def get_image_downloader() -> ImageDownloader:
+    """Get the downloader used by the vision encoders."""
+    return _image_downloader
+
+
+def set_image_downloader(downloader: ImageDownloader) -> None:
+    """Replace the downloader used by the vision encoders."""
+    global _image_downloader
+    _image_downloader = downloader
@@ -0,0 +1,229 @@
+"""
+Image deduplication and pruning across a conversation history.
+
+With an image policy, user messages keep a short reference to each image
+instead of its base64 data URI; identical images share one entry in an
+ImageStore. References are expanded when a request is sent, at which point
+repeated images are only sent once and old images can be dropped.
+
+References only live in memory: messages persisted to a session store are
+expanded first, so any instance can load them.
+
+The store can also keep the `Image` itself instead of its data URI: the
+image is then re-encoded each time the reference is expanded and `release()`
+drops the data URIs again once the request is built.
+"""
+
+import hashlib
+import threading
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional, Union
+
+if TYPE_CHECKING:
+    from tinyloop.features.vision import Image
+
+IMAGE_REF_PREFIX = "tinyloop-image://"
+
+
+class ImageStore:
+    """
+    Content-addressed store of the data URIs referenced by a history.
+
+    Args:
+        max_bytes: Size above which `over_limit` is set, telling the owner
+            of the store to `retain` only the images its history still
+            references (no limit if None). Only stored data URIs count,
+            images kept by source do not
+    """
+
+    def __init__(self, max_bytes: Optional[int] = 256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._images: Dict[str, Union[str, "Image"]] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def put(self, url: str, image: Optional["Image"] = None) -> str:
+        """
+        Store a data URI and get its reference (remote URLs are kept as is).
+
+        Args:
+            image: The image `url` was encoded from, stored instead of the
+                data URI if it can be encoded again from its source
+        """
+        if not url.startswith("data:"):
+            return url
+        digest = hashlib.blake2b(url.encode("ascii"), digest_size=16).hexdigest()
+        ref = f"{IMAGE_REF_PREFIX}{digest}"
+        with self._lock:
+            if ref not in self._images:
+                if image is not None and image.has_source:
+                    self._images[ref] = image
+                else:
+                    self._images[ref] = url
+                    self._bytes += len(url)
+        return ref
+
+    def get(self, url: str) -> str:
+        """Expand a reference to its data URI (other URLs are returned as is)."""
+        if not url.startswith(IMAGE_REF_PREFIX):
+            return url
+        with self._lock:
+            image = self._images.get(url)
+        if image is None:
+            raise KeyError(f"Unknown image reference: {url}")
+        if not isinstance(image, str):
+            return image.encode()[0]
+        return image
+
+    def release(self) -> None:
+        """Drop the data URIs of the images kept by source."""
+        with self._lock:
+            images = [
+                image for image in self._images.values() if not isinstance(image, str)
+            ]
+        for image in images:
+            image.release()
+
+    def expand(self, messages: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Replace the references in messages with their data URIs, e.g.
+        before persisting them. Messages without references are passed
+        through untouched.
+        """
+        result = []
+        for message in messages:
+            content = message.get("content")
+            if isinstance(content, list) and any(
+                _is_image(part)
+                and part["image_url"]["url"].startswith(IMAGE_REF_PREFIX)
+                for part in content
+            ):
+                parts = [
+                    {
+                        **part,
+                        "image_url": {
+                            **part["image_url"],
+                            "url": self.get(part["image_url"]["url"]),
+                        },
+                    }
+                    if _is_image(part)
+                    else part
+                    for part in content
+                ]
+                message = {**message, "content": parts}
+            result.append(message)
+        return result
+
+    def retain(self, messages: Iterable[Dict[str, Any]]) -> int:
+        """
+        Drop the images not referenced by `messages`.
+
+        Returns:
+            The number of bytes freed
+        """
+        live = {
+            part["image_url"]["url"]
+            for message in messages
+            if isinstance(message.get("content"), list)
+            for part in message["content"]
+            if _is_image(part)
+        }
+        freed = 0
+        with self._lock:
+            for ref in [ref for ref in self._images if ref not in live]:
+                image = self._images.pop(ref)
+                if isinstance(image, str):
+                    freed += len(image)
+            self._bytes -= freed
+        return freed
+
+    def copy(self) -> "ImageStore":
+        """Get a store with the same images (data URIs and images are shared)."""
+        store = ImageStore(self.max_bytes)
+        with self._lock:
+            store._images = dict(self._images)
+            store._bytes = self._bytes
+        return store
+
+    def __len__(self) -> int:
+        return len(self._images)
+
+    @property
+    def bytes(self) -> int:
+        """Total size of the stored data URIs."""
+        return self._bytes
+
+    @property
+    def over_limit(self) -> bool:
+        return self.max_bytes is not None and self._bytes > self.max_bytes
+
+
+@dataclass
+class ImageHistoryPolicy:
+    """
+    How images in the history are sent.
+
+    Args:
+        dedupe: Send each identical image only once per request, later
+            copies are replaced with `duplicate_placeholder`
+        max_image_turns: Only send images from the last N user turns
+            (all turns if None)
+        placeholder: Text replacing images older than `max_image_turns`,
+            None to drop them silently
+        duplicate_placeholder: Text replacing repeated images, None to drop
+            them silently
+    """
+
+    dedupe: bool = True
+    max_image_turns: Optional[int] = None
+    placeholder: Optional[str] = "[image removed from history]"
+    duplicate_placeholder: Optional[str] = "[same image as above]"
+
+    def apply(
+        self, messages: List[Dict[str, Any]], store: ImageStore
+    ) -> List[Dict[str, Any]]:
+        """
+        Build the messages to send: expand references, drop repeated and
+        old images. Messages without images are passed through untouched.
+        """
+        user_turns = sum(1 for message in messages if message.get("role") == "user")
+        turn = 0
+        sent = set()
+        result = []
+        for message in messages:
+            if message.get("role") == "user":
+                turn += 1
+            content = message.get("content")
+            if not isinstance(content, list) or not any(
+                _is_image(part) for part in content
+            ):
+                result.append(message)
+                continue
+
+            too_old = (
+                self.max_image_turns is not None
+                and user_turns - turn >= self.max_image_turns
+            )
+            parts = []
+            for part in content:
+                if not _is_image(part):
+                    parts.append(part)
+                    continue
+                if too_old:
+                    replacement = self.placeholder
+                else:
+                    url = part["image_url"]["url"]
+                    if not (self.dedupe and url in sent):
+                        sent.add(url)
+                        image_url = {**part["image_url"], "url": store.get(url)}
+                        parts.append({**part, "image_url": image_url})
+                        continue
+                    replacement = self.duplicate_placeholder
+                if replacement is not None:
+                    parts.append({"type": "text", "text": replacement})
+            result.append({**message, "content": parts})
+        return result
+
+
+def _is_image(part: Any) -> bool:
+    return isinstance(part, dict) and part.get("type") == "image_url"
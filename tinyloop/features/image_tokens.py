@@ -0,0 +1,105 @@
+"""
+Local estimation of how many input tokens an image costs per provider.
+
+Estimates only need the image dimensions, which are read from the file
+header. They follow the providers' published formulas and are meant for
+budgeting and routing, not billing.
+"""
+
+import math
+from typing import Optional, Tuple
+
+# OpenAI models that bill images by 32px patches instead of 512px tiles,
+# with their token multiplier
+OPENAI_PATCH_MULTIPLIERS = {
+    "gpt-4.1-mini": 1.62,
+    "gpt-4.1-nano": 2.46,
+    "o4-mini": 1.72,
+}
+
+_OPENAI_MAX_PATCHES = 1536
+_ANTHROPIC_MAX_SIDE = 1568
+_ANTHROPIC_MAX_PIXELS = 1_200_000
+
+
+def get_image_provider(model: str) -> str:
+    """Get which provider formula applies to a model ("openai" if unknown)."""
+    model = model.lower()
+    if "claude" in model or "anthropic" in model:
+        return "anthropic"
+    if "gemini" in model:
+        return "gemini"
+    return "openai"
+
+
+def estimate_image_tokens(
+    width: int, height: int, model: str, detail: Optional[str] = None
+) -> int:
+    """
+    Estimate the input tokens of an image as received by a model.
+
+    Args:
+        width: Image width in pixels, as sent
+        height: Image height in pixels, as sent
+        model: Model name, e.g. "openai/gpt-4.1" or "claude-sonnet-4"
+        detail: OpenAI detail level ("low", "high" or "auto")
+    """
+    provider = get_image_provider(model)
+    if provider == "anthropic":
+        return _anthropic_tokens(width, height)
+    if provider == "gemini":
+        return _gemini_tokens(width, height)
+
+    model_name = model.lower().split("/")[-1]
+    for prefix, multiplier in OPENAI_PATCH_MULTIPLIERS.items():
+        if model_name.startswith(prefix):
+            return math.ceil(_openai_patches(width, height) * multiplier)
+    return _openai_tile_tokens(width, height, detail)
+
+
+def fit_within(size: Tuple[int, int], max_side: Optional[int]) -> Tuple[int, int]:
+    """Get the size after downscaling so the longest side is at most max_side."""
+    width, height = size
+    if not max_side or max(width, height) <= max_side:
+        return width, height
+    scale = max_side / max(width, height)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def _openai_tile_tokens(width: int, height: int, detail: Optional[str]) -> int:
+    if detail == "low":
+        return 85
+    # Fit in a 2048px square, then scale the shortest side down to 768px
+    width, height = fit_within((width, height), 2048)
+    if min(width, height) > 768:
+        scale = 768 / min(width, height)
+        width, height = width * scale, height * scale
+    tiles = math.ceil(width / 512) * math.ceil(height / 512)
+    return 85 + 170 * tiles
+
+
+def _openai_patches(width: int, height: int) -> int:
+    patches = math.ceil(width / 32) * math.ceil(height / 32)
+    if patches > _OPENAI_MAX_PATCHES:
+        scale = math.sqrt(32 * 32 * _OPENAI_MAX_PATCHES / (width * height))
+        # Shrink a bit more so a whole number of patches fits each side,
+        # keeping at least one patch on the short side of very thin images
+        scale *= min(
+            max(1, math.floor(width * scale / 32)) / (width * scale / 32),
+            max(1, math.floor(height * scale / 32)) / (height * scale / 32),
+        )
+        patches = math.ceil(width * scale / 32) * math.ceil(height * scale / 32)
+    return min(patches, _OPENAI_MAX_PATCHES)
+
+
+def _anthropic_tokens(width: int, height: int) -> int:
+    # Larger images are downscaled server-side, which caps the cost
+    width, height = fit_within((width, height), _ANTHROPIC_MAX_SIDE)
+    pixels = min(width * height, _ANTHROPIC_MAX_PIXELS)
+    return math.ceil(pixels / 750)
+
+
+def _gemini_tokens(width: int, height: int) -> int:
+    if width <= 384 and height <= 384:
+        return 258
+    return math.ceil(width / 768) * math.ceil(height / 768) * 258
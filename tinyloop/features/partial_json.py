@@ -0,0 +1,238 @@
+"""
+Incremental parsing of streamed JSON into partial values and models.
+
+The parser keeps a small scanner state between chunks, so adding a chunk
+only scans the new characters. The current value is obtained by closing the
+open strings and containers and dropping what cannot be completed yet (a
+key without its value, a number still being written), then parsing the whole
+text: streams should only ask for it when `is_due()`, which spaces the parses
+out so their total cost stays close to linear in the length of the output.
+"""
+
+import json
+from typing import Any, List, Optional, Type, get_args, get_origin
+
+from pydantic import BaseModel
+
+_LITERALS = ("true", "false", "null")
+
+# Characters added before a new value is due: an eighth of the text already
+# parsed, capped so updates stay frequent on long outputs
+PARSE_RATIO = 8
+MAX_PARSE_STEP = 1024
+
+
+class _Frame:
+    """An open object or array."""
+
+    __slots__ = ("kind", "state", "key_start")
+
+    def __init__(self, kind: str):
+        self.kind = kind
+        # Objects: "key", "colon", "value", "comma"; arrays: "value", "comma"
+        self.state = "key" if kind == "{" else "value"
+        # Where the key of the member being written starts
+        self.key_start = None
+
+
+class PartialJSONParser:
+    """
+    Parses a JSON document as it streams in.
+
+    Example:
+        parser = PartialJSONParser()
+        parser.feed('{"title": "Quarterly rep')
+        parser.value  # {"title": "Quarterly rep"}
+
+    When streaming, `scan` each chunk and only read `value` when `is_due()`.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self._parsed_length = 0
+        self._stack: List[_Frame] = []
+        self._in_string = False
+        self._string_start = None
+        self._string_is_key = False
+        self._escape = False
+        self._token_start = None
+        self._started = False
+
+    def feed(self, chunk: str) -> Any:
+        """Add a chunk of text and get the value parsed so far."""
+        self.scan(chunk)
+        return self.value
+
+    def scan(self, chunk: str) -> None:
+        """Add a chunk of text, without parsing the value."""
+        start = len(self.text)
+        self.text += chunk
+        for index in range(start, len(self.text)):
+            self._scan(self.text[index], index)
+
+    def is_due(self) -> bool:
+        """Whether enough text was added since the last parse for a new value."""
+        step = min(max(self._parsed_length // PARSE_RATIO, 1), MAX_PARSE_STEP)
+        return len(self.text) - self._parsed_length >= step
+
+    @property
+    def value(self) -> Any:
+        """The value parsed so far (None until something can be parsed)."""
+        self._parsed_length = len(self.text)
+        completed = self._complete()
+        if completed is None:
+            return None
+        try:
+            return json.loads(completed)
+        except json.JSONDecodeError:
+            return None
+
+    def _scan(self, char: str, index: int) -> None:
+        if self._in_string:
+            if self._escape:
+                self._escape = False
+            elif char == "\\":
+                self._escape = True
+            elif char == '"':
+                self._in_string = False
+                self._after_value(is_key=self._string_is_key)
+            return
+
+        if self._token_start is not None:
+            if char.isalnum() or char in "+-.":
+                return
+            self._token_start = None
+            self._after_value()
+
+        frame = self._stack[-1] if self._stack else None
+        if char == '"':
+            self._in_string = True
+            self._string_start = index
+            self._string_is_key = frame is not None and frame.state == "key"
+            if self._string_is_key:
+                frame.key_start = index
+            self._started = True
+        elif char in "{[":
+            self._stack.append(_Frame(char))
+            self._started = True
+        elif char in "}]":
+            if self._stack:
+                self._stack.pop()
+            self._after_value()
+        elif char == ":":
+            if frame is not None and frame.state == "colon":
+                frame.state = "value"
+        elif char == ",":
+            if frame is not None:
+                frame.state = "key" if frame.kind == "{" else "value"
+        elif not char.isspace():
+            # Number or literal
+            self._token_start = index
+            self._started = True
+
+    def _after_value(self, is_key: bool = False) -> None:
+        if not self._stack:
+            return
+        frame = self._stack[-1]
+        if is_key:
+            frame.state = "colon"
+        else:
+            frame.state = "comma"
+            frame.key_start = None
+
+    def _complete(self) -> Optional[str]:
+        """Close the document, dropping what cannot be completed."""
+        if not self._started:
+            return None
+        text = self.text
+        frames = [(frame.kind, frame.state, frame.key_start) for frame in self._stack]
+
+        if self._in_string:
+            if self._string_is_key:
+                text = text[: self._string_start]
+                frames[-1] = (frames[-1][0], "key", None)
+            else:
+                text = _close_string(text)
+                if frames:
+                    frames[-1] = (frames[-1][0], "comma", None)
+        elif self._token_start is not None:
+            token = text[self._token_start :]
+            completed = _complete_token(token)
+            if completed is None:
+                text = text[: self._token_start]
+            else:
+                text = text[: self._token_start] + completed
+                if frames:
+                    frames[-1] = (frames[-1][0], "comma", None)
+
+        if not frames:
+            return text
+
+        # An object member still waiting for its value is dropped
+        kind, state, key_start = frames[-1]
+        if kind == "{" and state in ("colon", "value") and key_start is not None:
+            text = text[:key_start]
+        text = text.rstrip()
+        if text.endswith(","):
+            text = text[:-1]
+
+        closers = "".join("}" if kind == "{" else "]" for kind, _, _ in frames)
+        return text + closers[::-1]
+
+
+def _close_string(text: str) -> str:
+    # Drop a trailing escape that is not complete yet
+    backslashes = len(text) - len(text.rstrip("\\"))
+    if backslashes % 2:
+        text = text[:-1]
+    unicode_escape = text.rfind("\\u")
+    if unicode_escape != -1 and len(text) - unicode_escape < 6:
+        preceding = len(text[:unicode_escape]) - len(text[:unicode_escape].rstrip("\\"))
+        if preceding % 2 == 0:
+            text = text[:unicode_escape]
+    return text + '"'
+
+
+def _complete_token(token: str) -> Optional[str]:
+    for literal in _LITERALS:
+        if literal.startswith(token):
+            return literal
+    try:
+        json.loads(token)
+    except json.JSONDecodeError:
+        # "-", "1.", "1e" and the like: wait for more digits
+        return None
+    return token
+
+
+def partial_model(model: Type[BaseModel], data: Any) -> Optional[BaseModel]:
+    """
+    Build a model instance from partial data without validating it.
+
+    Nested models are built recursively and missing fields are None (or
+    their default), so a partial instance can be rendered field by field.
+    """
+    if not isinstance(data, dict):
+        return None
+    values = {}
+    for name, field in model.model_fields.items():
+        key = field.alias or name
+        if key in data:
+            values[name] = _partial_value(field.annotation, data[key])
+        elif field.is_required():
+            values[name] = None
+    return model.model_construct(**values)
+
+
+def _partial_value(annotation: Any, value: Any) -> Any:
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return partial_model(annotation, value) if isinstance(value, dict) else value
+    args = get_args(annotation)
+    if get_origin(annotation) is list and args and isinstance(value, list):
+        return [_partial_value(args[0], item) for item in value]
+    if args and isinstance(value, dict):
+        # Optional[Model] and other unions: use the first model type
+        for arg in args:
+            if isinstance(arg, type) and issubclass(arg, BaseModel):
+                return partial_model(arg, value)
+    return value
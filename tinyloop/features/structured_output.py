@@ -0,0 +1,151 @@
+"""
+Per-class caches and local repair for structured outputs.
+
+Building the provider schema of a pydantic class and resolving its validator
+is done once per class instead of once per call. Almost-valid JSON (code
+fences, surrounding text, trailing commas, missing closing braces) is
+repaired locally instead of asking the model again.
+"""
+
+import json
+import re
+from typing import Any, Dict, List, Optional, Type
+
+from litellm.utils import type_to_response_format_param
+from pydantic import BaseModel, TypeAdapter, ValidationError
+
+_CODE_FENCE = re.compile(r"```[a-zA-Z]*\s*\n?(.*?)(?:```|$)", re.DOTALL)
+
+# Endings of a complete value, after which missing closing braces can be added
+_COMPLETE_VALUE = re.compile(r'(?:["}\]]|\btrue|\bfalse|\bnull)\Z')
+
+_CLOSING = {"{": "}", "[": "]"}
+
+# Sent instead of the conversation when a structured output fails validation
+REASK_PROMPT = (
+    "Your previous output does not match the required JSON schema.\n\n"
+    "Output:\n{output}\n\n"
+    "Errors: {errors}\n\n"
+    "Reply with the corrected JSON only."
+)
+
+
+class ResponseFormat(dict):
+    """
+    Provider-ready `response_format` param, built once per output class.
+
+    It is shared by every call using the class and must not be modified.
+    """
+
+    __slots__ = ("output_type", "serialized")
+
+    def __init__(self, output_type: Type[BaseModel]):
+        super().__init__(type_to_response_format_param(output_type))
+        self.output_type = output_type
+        self.serialized = json.dumps(self, sort_keys=True)
+
+
+_response_format_cache: Dict[type, ResponseFormat] = {}
+
+_type_adapter_cache: Dict[Any, TypeAdapter] = {}
+
+
+def is_output_model(response_format: Any) -> bool:
+    """Check if a response_format is a pydantic class."""
+    return isinstance(response_format, type) and issubclass(response_format, BaseModel)
+
+
+def get_response_format(output_type: Type[BaseModel]) -> ResponseFormat:
+    """Get the cached provider schema of an output class."""
+    response_format = _response_format_cache.get(output_type)
+    if response_format is None:
+        response_format = ResponseFormat(output_type)
+        _response_format_cache[output_type] = response_format
+    return response_format
+
+
+def get_type_adapter(output_type: Any) -> TypeAdapter:
+    """Get the cached validator of an output type."""
+    adapter = _type_adapter_cache.get(output_type)
+    if adapter is None:
+        adapter = TypeAdapter(output_type)
+        _type_adapter_cache[output_type] = adapter
+    return adapter
+
+
+def validate_output(text: str, output_type: Any) -> Any:
+    """Validate a JSON response against an output type."""
+    return get_type_adapter(output_type).validate_json(text)
+
+
+def repair_json(text: str) -> Optional[str]:
+    """
+    Repair almost-valid JSON returned by a model.
+
+    Strips code fences and text around the JSON document, removes trailing
+    commas and adds missing closing braces and brackets. Truncated strings,
+    numbers and literals are not completed: guessing their end would turn a
+    cut-off output into a plausible but wrong value.
+
+    Returns:
+        The repaired JSON, or None if no JSON document was found or it
+        ends inside a value
+    """
+    fenced = _CODE_FENCE.search(text)
+    if fenced:
+        text = fenced.group(1)
+    starts = [index for index in (text.find("{"), text.find("[")) if index != -1]
+    if not starts:
+        return None
+
+    out: List[str] = []
+    open_brackets: List[str] = []
+    in_string = escape = False
+    for char in text[min(starts) :]:
+        out.append(char)
+        if in_string:
+            if escape:
+                escape = False
+            elif char == "\\":
+                escape = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "{[":
+            open_brackets.append(char)
+        elif char in "}]":
+            out.pop()
+            while out and out[-1].isspace():
+                out.pop()
+            if out and out[-1] == ",":
+                out.pop()
+            out.append(char)
+            if open_brackets:
+                open_brackets.pop()
+            if not open_brackets:
+                # Anything after the document is prose
+                break
+    repaired = "".join(out)
+
+    if in_string:
+        return None
+    if open_brackets:
+        repaired = repaired.rstrip().removesuffix(",").rstrip()
+        if not _COMPLETE_VALUE.search(repaired):
+            return None
+        repaired += "".join(_CLOSING[bracket] for bracket in reversed(open_brackets))
+    return repaired
+
+
+def is_json_error(error: ValidationError) -> bool:
+    """Check if a validation error comes from malformed JSON."""
+    return any(item["type"] == "json_invalid" for item in error.errors())
+
+
+def format_validation_error(error: ValidationError) -> str:
+    """Describe a validation error compactly, to be sent back to the model."""
+    return "; ".join(
+        f"{'.'.join(str(part) for part in item['loc']) or 'output'}: {item['msg']}"
+        for item in error.errors()
+    )
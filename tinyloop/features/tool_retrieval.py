@@ -0,0 +1,191 @@
+"""
+Relevance-ranked tool selection for large tool catalogs.
+
+A ToolRetriever indexes the name, description and parameter docs of each
+tool (BM25, optionally blended with embeddings) so only the tools relevant
+to the current step are sent to the model.
+"""
+
+import math
+import re
+from collections import Counter
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from tinyloop.features.function_calling import Tool
+
+# Takes a batch of texts, returns one embedding vector per text
+EmbedFunction = Callable[[List[str]], List[Sequence[float]]]
+
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has in is it of on or that the this to "
+    "use was when with".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lowercase terms, breaking snake_case and camelCase."""
+    text = re.sub(r"([a-z0-9])([A-Z])", r"\1 \2", text)
+    return [
+        term
+        for term in re.findall(r"[a-z0-9]+", text.lower())
+        if term not in _STOPWORDS
+    ]
+
+
+def tool_document(tool: Tool) -> str:
+    """Get the text a tool is indexed by: name, description and parameter docs."""
+    function = tool.definition["function"]
+    parts = [function["name"], function.get("description") or ""]
+    for name, schema in function["parameters"]["properties"].items():
+        parts.append(name)
+        parts.append(schema.get("description", ""))
+        parts.extend(str(value) for value in schema.get("enum", []))
+    return " ".join(parts)
+
+
+class ToolRetriever:
+    """
+    Local index selecting the top-k tools relevant to a query.
+
+    Args:
+        tools: Tools to index
+        top_k: Number of retrieved tools sent per step
+        pinned: Tools (or tool names) always included, on top of `top_k`
+        embed: Optional function embedding a batch of texts; its cosine
+            similarity is blended with the BM25 score
+        embedding_weight: Weight (0-1) of the embedding similarity
+        k1: BM25 term frequency saturation
+        b: BM25 length normalization
+
+    Example:
+        retriever = ToolRetriever(catalog, top_k=5, pinned=["search_docs"])
+        loop = ToolLoop(model, tools=catalog, output_format=Answer,
+                        tool_retriever=retriever)
+    """
+
+    def __init__(
+        self,
+        tools: List[Tool],
+        top_k: int = 8,
+        pinned: Optional[Iterable[Union[Tool, str]]] = None,
+        embed: Optional[EmbedFunction] = None,
+        embedding_weight: float = 0.5,
+        k1: float = 1.5,
+        b: float = 0.75,
+    ):
+        self.tools = list(tools)
+        self.top_k = top_k
+        self.pinned = [
+            item if isinstance(item, str) else item.name for item in pinned or []
+        ]
+        self.embed = embed
+        self.embedding_weight = embedding_weight
+        self.k1 = k1
+        self.b = b
+        self._build_index()
+
+    def _build_index(self) -> None:
+        documents = [tool_document(tool) for tool in self.tools]
+        self._term_counts = [Counter(tokenize(document)) for document in documents]
+        self._lengths = [sum(counts.values()) for counts in self._term_counts]
+        self._average_length = (
+            sum(self._lengths) / len(self._lengths) if self._lengths else 0.0
+        )
+
+        document_frequency = Counter()
+        for counts in self._term_counts:
+            document_frequency.update(counts.keys())
+        total = len(self.tools)
+        self._idf = {
+            term: math.log(1 + (total - frequency + 0.5) / (frequency + 0.5))
+            for term, frequency in document_frequency.items()
+        }
+
+        self._embeddings = (
+            [_normalize(vector) for vector in self.embed(documents)]
+            if self.embed and documents
+            else None
+        )
+
+    def add(self, tools: Iterable[Tool]) -> None:
+        """Add tools to the index."""
+        self.tools.extend(tools)
+        self._build_index()
+
+    def search(
+        self, query: str, top_k: Optional[int] = None
+    ) -> List[Tuple[Tool, float]]:
+        """
+        Rank tools by relevance to a query.
+
+        Returns:
+            Up to `top_k` (tool, score) pairs, best first; tools with no
+            relevance at all are left out
+        """
+        top_k = self.top_k if top_k is None else top_k
+        scores = self._bm25_scores(tokenize(query))
+
+        if self._embeddings is not None:
+            best = max(scores) if scores else 0.0
+            query_vector = _normalize(self.embed([query])[0])
+            similarities = [
+                sum(a * b for a, b in zip(query_vector, vector))
+                for vector in self._embeddings
+            ]
+            weight = self.embedding_weight
+            scores = [
+                (1 - weight) * (score / best if best else 0.0) + weight * similarity
+                for score, similarity in zip(scores, similarities)
+            ]
+
+        ranked = sorted(
+            ((tool, score) for tool, score in zip(self.tools, scores) if score > 0),
+            key=lambda pair: pair[1],
+            reverse=True,
+        )
+        return ranked[:top_k]
+
+    def select(
+        self, query: str, include: Iterable[Union[Tool, str]] = ()
+    ) -> List[Tool]:
+        """
+        Get the tools to send for a query: pinned and `include`d tools first,
+        then the `top_k` most relevant others.
+        """
+        by_name = {tool.name: tool for tool in self.tools}
+        selected: Dict[str, Tool] = {}
+        for item in [*self.pinned, *include]:
+            tool = by_name.get(item) if isinstance(item, str) else item
+            if tool is not None:
+                selected.setdefault(tool.name, tool)
+
+        retrieved = 0
+        for tool, _ in self.search(query, top_k=len(self.tools)):
+            if retrieved >= self.top_k:
+                break
+            if tool.name not in selected:
+                selected[tool.name] = tool
+                retrieved += 1
+        return list(selected.values())
+
+    def _bm25_scores(self, query_terms: List[str]) -> List[float]:
+        scores = []
+        for counts, length in zip(self._term_counts, self._lengths):
+            score = 0.0
+            for term in query_terms:
+                frequency = counts.get(term)
+                if not frequency:
+                    continue
+                norm = self.k1 * (
+                    1 - self.b + self.b * length / (self._average_length or 1)
+                )
+                score += (
+                    self._idf[term] * frequency * (self.k1 + 1) / (frequency + norm)
+                )
+            scores.append(score)
+        return scores
+
+
+def _normalize(vector: Sequence[float]) -> List[float]:
+    norm = math.sqrt(sum(value * value for value in vector))
+    return [value / norm for value in vector] if norm else list(vector)
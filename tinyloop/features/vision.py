@@ -1,13 +1,55 @@
+import asyncio
 import base64
+import binascii
+import functools
 import io
 import mimetypes
+import mmap
 import os
-from typing import Any, Union
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Iterable, Iterator, Optional, Union
 from urllib.parse import urlparse
 
-import requests
 from PIL import Image as PILImage
 
+from tinyloop.features.image_cache import (
+    bytes_cache_key,
+    file_cache_key,
+    get_image_cache,
+    pil_cache_key,
+)
+from tinyloop.features.image_download import get_image_downloader
+from tinyloop.features.image_tokens import estimate_image_tokens, fit_within
+
+# Bytes encoded per step when building data URIs (a multiple of 3)
+_ENCODE_CHUNK_SIZE = 3 * 256 * 1024
+
+# Resize/recompression presets matching what providers keep server-side
+IMAGE_PRESETS: dict[str, dict[str, Any]] = {
+    "openai": {"max_side": 2048, "quality": 85, "format": "auto"},
+    "anthropic": {"max_side": 1568, "quality": 85, "format": "auto"},
+    "gemini": {"max_side": 3072, "quality": 85, "format": "auto"},
+}
+
+
+def get_image_preset(model: str) -> dict[str, Any]:
+    """Get the image preset for a model name or provider (empty if unknown)."""
+    model = model.lower()
+    if model in IMAGE_PRESETS:
+        return dict(IMAGE_PRESETS[model])
+    if "claude" in model or "anthropic" in model:
+        return dict(IMAGE_PRESETS["anthropic"])
+    if "gemini" in model:
+        return dict(IMAGE_PRESETS["gemini"])
+    if (
+        "gpt" in model
+        or "openai" in model
+        or model.split("/")[-1][:2] in ("o1", "o3", "o4")
+    ):
+        return dict(IMAGE_PRESETS["openai"])
+    return {}
+
 
 class Image:
     def __init__(
@@ -16,30 +58,75 @@ class Image:
         from_url: str = None,
         from_pil: PILImage.Image = None,
         from_file: str = None,
+        from_bytes: bytes = None,
+        max_side: Optional[int] = None,
+        quality: Optional[int] = None,
+        format: Optional[str] = None,
+        preset: Optional[str] = None,
+        detail: Optional[str] = None,
     ):
         """
         Initialize Image with different input sources.
 
+        Only a reference to the source is kept: the base64 data URI is built
+        on first access to `url` (normally when the request is sent) and can
+        be dropped again with `release()`.
+
         Args:
             from_url: Initialize from URL (keyword-only)
             from_pil: Initialize from PIL Image (keyword-only)
             from_file: Initialize from file path (keyword-only)
+            from_bytes: Initialize from encoded image bytes (keyword-only)
+            max_side: Downscale so the longest side is at most this many pixels
+            quality: JPEG/WebP quality used when re-encoding
+            format: Output format ("JPEG", "PNG", "WEBP"), or "auto" to pick
+                JPEG for opaque images and PNG for images with transparency
+            preset: Model name or provider whose preset (see IMAGE_PRESETS)
+                provides the defaults for max_side, quality and format
+            detail: OpenAI detail level ("low", "high" or "auto") sent with
+                the image
         """
-        sources = [from_url, from_pil, from_file]
+        sources = [from_url, from_pil, from_file, from_bytes]
         provided_sources = sum(x is not None for x in sources)
 
         if provided_sources != 1:
             raise ValueError(
-                "Exactly one of from_url, from_pil, or from_file must be provided"
+                "Exactly one of from_url, from_pil, from_file or from_bytes "
+                "must be provided"
             )
 
+        options = get_image_preset(preset) if preset else {}
+        explicit = {"max_side": max_side, "quality": quality, "format": format}
+        options.update({k: v for k, v in explicit.items() if v is not None})
+        self.encode_options = options
+        self.detail = detail
+        self.original_bytes = None
+        self._source = None
+        self._url = None
+        self._mime_type = None
+        self._encoded_bytes = None
+
         if from_url is not None:
-            self.url = from_url
-            self.mime_type = self._guess_mime_type_from_url(from_url)
+            self._url = from_url
+            self._mime_type = self._guess_mime_type_from_url(from_url)
         elif from_pil is not None:
-            self.url, self.mime_type = self._encode_pil_image(from_pil)
+            self._source = from_pil
+            self._mime_type = _mime_type_for_format(
+                _resolve_format(from_pil, options.get("format"))
+            )
+            self.original_bytes = _pil_pixel_bytes(from_pil)
         elif from_file is not None:
-            self.url, self.mime_type = self._encode_image_from_file(from_file)
+            # Fail early on missing files and unknown types, without reading
+            self.original_bytes = os.path.getsize(from_file)
+            mime_type, _ = mimetypes.guess_type(from_file)
+            if mime_type is None:
+                raise ValueError(f"Could not determine MIME type for file: {from_file}")
+            self._source = from_file
+            # Re-encoding may change the type, it is known once encoded
+            self._mime_type = None if options else mime_type
+        elif from_bytes is not None:
+            self._source = bytes(from_bytes)
+            self.original_bytes = len(from_bytes)
 
     @classmethod
     def from_url(cls, image_url: str):
@@ -47,14 +134,134 @@ class Image:
         return cls(from_url=image_url)
 
     @classmethod
-    def from_PIL(cls, image: PILImage.Image):
+    def from_PIL(cls, image: PILImage.Image, **options):
         """Create Image instance from PIL Image."""
-        return cls(from_pil=image)
+        return cls(from_pil=image, **options)
 
     @classmethod
-    def from_file(cls, file_path: str):
+    def from_file(cls, file_path: str, **options):
         """Create Image instance from file path."""
-        return cls(from_file=file_path)
+        return cls(from_file=file_path, **options)
+
+    @classmethod
+    def from_bytes(cls, data: bytes, **options):
+        """Create Image instance from encoded image bytes."""
+        return cls(from_bytes=data, **options)
+
+    @property
+    def url(self) -> str:
+        """URL or base64 data URI of the image, encoded on first access."""
+        if self._url is None:
+            self.encode()
+        return self._url
+
+    @url.setter
+    def url(self, value: str) -> None:
+        self._url = value
+
+    @property
+    def mime_type(self) -> str:
+        """MIME type of the image as sent to the provider."""
+        if self._mime_type is None:
+            self.encode()
+        return self._mime_type
+
+    @mime_type.setter
+    def mime_type(self, value: str) -> None:
+        self._mime_type = value
+
+    @property
+    def has_source(self) -> bool:
+        """Whether the image can be encoded again after `release()` (not URLs)."""
+        return self._source is not None
+
+    @property
+    def is_encoded(self) -> bool:
+        """Whether the data URI is currently held in memory."""
+        return self._url is not None
+
+    def encode(self) -> tuple[str, str]:
+        """Encode the image source to a data URI (no-op if already encoded)."""
+        if self._url is None:
+            source = self._source
+            if isinstance(source, PILImage.Image):
+                url, mime_type = self._encode_pil_image(source, **self.encode_options)
+            elif isinstance(source, bytes):
+                url, mime_type = _encode_image_from_bytes(source, **self.encode_options)
+            else:
+                url, mime_type = self._encode_image_from_file(
+                    source, **self.encode_options
+                )
+            self._url, self._mime_type = url, mime_type
+            self._encoded_bytes = _data_uri_payload_bytes(url)
+        return self._url, self._mime_type
+
+    def release(self) -> None:
+        """
+        Drop the encoded data URI, keeping only the reference to the source.
+        """
+        if self._source is not None:
+            self._url = None
+
+    @property
+    def encoded_bytes(self) -> Optional[int]:
+        """Size of the image payload sent to the provider (None for URLs)."""
+        if self._source is None:
+            return _data_uri_payload_bytes(self._url)
+        if self._encoded_bytes is None:
+            self.encode()
+        return self._encoded_bytes
+
+    @property
+    def size(self) -> Optional[tuple[int, int]]:
+        """
+        Size (width, height) of the source image, read from the file header
+        without decoding the pixels. None for remote URLs.
+        """
+        source = self._source
+        if isinstance(source, PILImage.Image):
+            return source.size
+        if isinstance(source, bytes):
+            with PILImage.open(io.BytesIO(source)) as image:
+                return image.size
+        if source is not None:
+            with PILImage.open(source) as image:
+                return image.size
+        return image_url_size(self._url)
+
+    @property
+    def sent_size(self) -> Optional[tuple[int, int]]:
+        """Size of the image as sent, after downscaling to max_side."""
+        size = self.size
+        if size is None:
+            return None
+        return fit_within(size, self.encode_options.get("max_side"))
+
+    def estimate_tokens(self, model: str, detail: Optional[str] = None) -> int:
+        """
+        Estimate the input tokens this image costs on a model.
+
+        Args:
+            model: Model name, e.g. "openai/gpt-4.1" or "claude-sonnet-4"
+            detail: OpenAI detail level, defaults to the image's own
+
+        Raises:
+            ValueError: If the size of the image is unknown (remote URLs)
+        """
+        size = self.sent_size
+        if size is None:
+            raise ValueError(f"Cannot estimate tokens of remote image: {self._url}")
+        return estimate_image_tokens(*size, model, detail=detail or self.detail)
+
+    @property
+    def bytes_saved(self) -> int:
+        """
+        Bytes saved by resizing/recompressing, relative to the source file
+        (or to the raw pixel buffer for PIL images).
+        """
+        if self.original_bytes is None or self.encoded_bytes is None:
+            return 0
+        return max(self.original_bytes - self.encoded_bytes, 0)
 
     def format(self) -> list[dict[str, Any]]:
         """Format image for API consumption with URL and MIME type."""
@@ -85,53 +292,31 @@ class Image:
         else:
             return "image/jpeg"  # Default fallback
 
-    def _encode_image_from_file(self, file_path: str) -> tuple[str, str]:
+    def _encode_image_from_file(self, file_path: str, **options) -> tuple[str, str]:
         """Encode a file from a file path to a base64 data URI with MIME type."""
-        with open(file_path, "rb") as file:
-            file_data = file.read()
-
-        # Use mimetypes to guess directly from the file path
-        mime_type, _ = mimetypes.guess_type(file_path)
-        if mime_type is None:
-            raise ValueError(f"Could not determine MIME type for file: {file_path}")
-
-        encoded_data = base64.b64encode(file_data).decode("utf-8")
-        data_url = f"data:{mime_type};base64,{encoded_data}"
-        return data_url, mime_type
+        return _encode_image_from_file(file_path, **options)
 
     def _encode_pil_image(
-        self, image: PILImage.Image, format: str = None
+        self, image: PILImage.Image, format: str = None, **options
     ) -> tuple[str, str]:
         """Encode a PIL Image object to a base64 data URI with MIME type."""
-        buffered = io.BytesIO()
-        file_format = format or image.format or "PNG"
-        image.save(buffered, format=file_format)
-
-        # Get the correct MIME type using the image format
-        file_extension = file_format.lower()
-        mime_type, _ = mimetypes.guess_type(f"file.{file_extension}")
-        if mime_type is None:
-            # Fallback MIME types for common formats
-            format_to_mime = {
-                "png": "image/png",
-                "jpg": "image/jpeg",
-                "jpeg": "image/jpeg",
-                "gif": "image/gif",
-                "bmp": "image/bmp",
-                "webp": "image/webp",
-            }
-            mime_type = format_to_mime.get(file_extension, "image/png")
-
-        encoded_data = base64.b64encode(buffered.getvalue()).decode("utf-8")
-        data_url = f"data:{mime_type};base64,{encoded_data}"
-        return data_url, mime_type
+        return _encode_pil_image(image, format, **options)
 
     def __str__(self):
-        """String representation of the Image."""
-        if "base64" in self.url:
-            len_base64 = len(self.url.split("base64,")[1])
-            return f"Image(url=data:{self.mime_type};base64,<IMAGE_BASE_64_ENCODED({len_base64})>, mime_type='{self.mime_type}')"
-        return f"Image(url='{self.url}', mime_type='{self.mime_type}')"
+        """String representation of the Image (never encodes it)."""
+        if not self.is_encoded:
+            source = self._source
+            if isinstance(source, PILImage.Image):
+                source = f"<PIL {source.mode} {source.width}x{source.height}>"
+            elif isinstance(source, bytes):
+                source = f"<{len(source)} bytes>"
+            else:
+                source = f"'{source}'"
+            return f"Image(source={source}, mime_type='{self._mime_type}')"
+        if "base64" in self._url:
+            len_base64 = len(self._url.split("base64,")[1])
+            return f"Image(url=data:{self._mime_type};base64,<IMAGE_BASE_64_ENCODED({len_base64})>, mime_type='{self._mime_type}')"
+        return f"Image(url='{self._url}', mime_type='{self._mime_type}')"
 
     def __repr__(self):
         """Detailed representation of the Image."""
@@ -147,6 +332,25 @@ def is_url(string: str) -> bool:
         return False
 
 
+def image_url_size(url: str) -> Optional[tuple[int, int]]:
+    """
+    Size (width, height) of a base64 data URI image, read from its header.
+    None for remote URLs or unreadable data.
+    """
+    if not url.startswith("data:") or "base64," not in url:
+        return None
+    start = url.index("base64,") + len("base64,")
+    # The header is normally in the first few KB; decode everything if not
+    for end in (start + 64 * 1024, len(url)):
+        try:
+            payload = base64.b64decode(url[start:end])
+            with PILImage.open(io.BytesIO(payload)) as image:
+                return image.size
+        except (OSError, ValueError, PILImage.DecompressionBombError):
+            continue
+    return None
+
+
 def is_image(obj) -> bool:
     """Check if the object is an image or a valid media file reference."""
     if isinstance(obj, PILImage.Image):
@@ -162,7 +366,9 @@ def is_image(obj) -> bool:
 
 
 def encode_image(
-    image: Union[str, bytes, PILImage.Image, dict], download_images: bool = False
+    image: Union[str, bytes, PILImage.Image, dict],
+    download_images: bool = False,
+    **options,
 ) -> tuple[str, str]:
     """
     Encode an image or file to a base64 data URI with MIME type detection.
@@ -170,6 +376,8 @@ def encode_image(
     Args:
         image: The image or file to encode. Can be a PIL Image, file path, URL, or data URI.
         download_images: Whether to download images from URLs.
+        **options: Resize/recompression policy (max_side, quality, format)
+            applied to files, PIL images and raw bytes.
 
     Returns:
         tuple: (data_uri, mime_type) The data URI of the file and its MIME type.
@@ -188,7 +396,7 @@ def encode_image(
             return image, mime_type
         elif os.path.isfile(image):
             # File path
-            return _encode_image_from_file(image)
+            return _encode_image_from_file(image, **options)
         elif is_url(image):
             # URL
             if download_images:
@@ -201,17 +409,110 @@ def encode_image(
             raise ValueError(f"Unsupported file string: {image}")
     elif isinstance(image, PILImage.Image):
         # PIL Image
-        return _encode_pil_image(image)
+        return _encode_pil_image(image, **options)
     elif isinstance(image, bytes):
         # Raw bytes
         img = PILImage.open(io.BytesIO(image))
-        return _encode_pil_image(img)
+        return _encode_pil_image(img, **options)
     elif isinstance(image, Image):
         return image.url, image.mime_type
     else:
         raise ValueError(f"Unsupported image type: {type(image)}")
 
 
+async def aencode_image(
+    image: Union[str, bytes, PILImage.Image, dict],
+    download_images: bool = False,
+    **options,
+) -> tuple[str, str]:
+    """
+    Async version of `encode_image` that does not block the event loop.
+
+    URLs are downloaded over the shared async connection pool, everything
+    else is encoded in a worker thread.
+    """
+    if download_images and isinstance(image, str) and is_url(image):
+        return await get_image_downloader().afetch(image)
+    return await asyncio.to_thread(encode_image, image, download_images, **options)
+
+
+async def aencode_images(
+    images: list[Union[str, bytes, PILImage.Image, dict]],
+    download_images: bool = False,
+    **options,
+) -> list[tuple[str, str]]:
+    """
+    Encode many images concurrently, results in the order of `images`.
+
+    Downloads are bounded by the downloader's `max_concurrency`.
+    """
+    return list(
+        await asyncio.gather(
+            *(aencode_image(image, download_images, **options) for image in images)
+        )
+    )
+
+
+def encode_many(
+    images: Iterable[Union[str, bytes, PILImage.Image, dict]],
+    workers: Optional[int] = None,
+    executor: Union[str, Executor] = "thread",
+    download_images: bool = False,
+    **options,
+) -> Iterator[tuple[str, str]]:
+    """
+    Encode many images in parallel, yielding results in input order.
+
+    Each result is yielded as soon as it and every image before it are
+    ready, and only a bounded number of images is in flight at a time, so
+    arbitrarily long inputs can be streamed.
+
+    Args:
+        images: Images accepted by `encode_image`
+        workers: Number of workers (CPU count if None)
+        executor: "thread", "process" (to use every core for decoding and
+            resizing) or an existing concurrent.futures Executor
+        download_images: Whether to download images from URLs
+        **options: Resize/recompression policy (max_side, quality, format)
+
+    Example:
+        for data_uri, mime_type in encode_many(paths, workers=8, executor="process"):
+            ...
+    """
+    workers = workers or os.cpu_count() or 1
+    encode = functools.partial(encode_image, download_images=download_images, **options)
+
+    if isinstance(executor, Executor):
+        yield from _ordered_map(executor, encode, images, workers * 2)
+        return
+    if executor == "thread":
+        pool = ThreadPoolExecutor(max_workers=workers)
+    elif executor == "process":
+        pool = ProcessPoolExecutor(max_workers=workers)
+    else:
+        raise ValueError(f"Unknown executor: {executor}")
+    with pool:
+        yield from _ordered_map(pool, encode, images, workers * 2)
+
+
+def _ordered_map(
+    pool: Executor, func: Callable, items: Iterable, window: int
+) -> Iterator[Any]:
+    """Like Executor.map, but with at most `window` items submitted at once."""
+    pending = deque()
+    try:
+        for item in items:
+            pending.append(pool.submit(func, item))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        # Stopped early or failed: do not run what nobody will read
+        for future in pending:
+            future.cancel()
+
+
 def _guess_mime_type_from_url(url: str) -> str:
     """Guess MIME type from URL."""
     if url.startswith("data:"):
@@ -225,47 +526,182 @@ def _guess_mime_type_from_url(url: str) -> str:
         return "image/jpeg"  # Default fallback
 
 
-def _encode_image_from_file(file_path: str) -> tuple[str, str]:
+def _encode_image_from_file(
+    file_path: str,
+    max_side: Optional[int] = None,
+    quality: Optional[int] = None,
+    format: Optional[str] = None,
+) -> tuple[str, str]:
     """Encode a file from a file path to a base64 data URI with MIME type."""
-    with open(file_path, "rb") as file:
-        file_data = file.read()
+    cache = get_image_cache()
+    cache_key = (
+        file_cache_key(file_path, max_side=max_side, quality=quality, format=format)
+        if cache
+        else None
+    )
+    if cache_key:
+        cached = cache.get(cache_key)
+        if cached:
+            return cached
 
     # Use mimetypes to guess directly from the file path
     mime_type, _ = mimetypes.guess_type(file_path)
     if mime_type is None:
         raise ValueError(f"Could not determine MIME type for file: {file_path}")
 
-    encoded_data = base64.b64encode(file_data).decode("utf-8")
-    data_url = f"data:{mime_type};base64,{encoded_data}"
+    if max_side or quality or format:
+        with open(file_path, "rb") as file:
+            file_data = file.read()
+        file_data, mime_type = _recompress(
+            file_data, mime_type, max_side, quality, format
+        )
+        data_url = _build_data_uri(file_data, mime_type)
+    else:
+        data_url = _build_data_uri_from_file(file_path, mime_type)
+    if cache_key:
+        cache.put(cache_key, data_url, mime_type)
     return data_url, mime_type
 
 
-def _encode_image_from_url(image_url: str) -> tuple[str, str]:
-    """Encode a file from a URL to a base64 data URI with MIME type."""
-    response = requests.get(image_url)
-    response.raise_for_status()
-    content_type = response.headers.get("Content-Type", "")
+def _build_data_uri(data: Any, mime_type: str) -> str:
+    """
+    Build a data URI in one pass into a preallocated buffer.
 
-    # Use the content type from the response headers if available
-    if content_type:
-        mime_type = content_type
-    else:
-        # Try to guess MIME type from URL
-        mime_type, _ = mimetypes.guess_type(image_url)
-        if mime_type is None:
-            raise ValueError(f"Could not determine MIME type for URL: {image_url}")
+    `data` can be any buffer (bytes, mmap, ...); it is encoded in chunks so
+    only the buffer and the final string exist at the same time.
+    """
+    prefix = f"data:{mime_type};base64,".encode("ascii")
+    with memoryview(data) as view:
+        size = view.nbytes
+        buffer = bytearray(len(prefix) + 4 * ((size + 2) // 3))
+        buffer[: len(prefix)] = prefix
+        position = len(prefix)
+        # Chunks are a multiple of 3 bytes so no padding appears mid-stream
+        for start in range(0, size, _ENCODE_CHUNK_SIZE):
+            encoded = binascii.b2a_base64(
+                view[start : start + _ENCODE_CHUNK_SIZE], newline=False
+            )
+            buffer[position : position + len(encoded)] = encoded
+            position += len(encoded)
+    return buffer.decode("ascii")
+
+
+def _build_data_uri_from_file(file_path: str, mime_type: str) -> str:
+    """Build a data URI from a memory-mapped file, without reading it whole."""
+    with open(file_path, "rb") as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            # Empty files cannot be mapped
+            return _build_data_uri(b"", mime_type)
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return _build_data_uri(mapped, mime_type)
+
+
+def _encode_image_from_bytes(
+    file_data: bytes,
+    max_side: Optional[int] = None,
+    quality: Optional[int] = None,
+    format: Optional[str] = None,
+) -> tuple[str, str]:
+    """Encode image file bytes to a base64 data URI with MIME type."""
+    cache = get_image_cache()
+    cache_key = (
+        bytes_cache_key(file_data, max_side=max_side, quality=quality, format=format)
+        if cache
+        else None
+    )
+    if cache_key:
+        cached = cache.get(cache_key)
+        if cached:
+            return cached
 
-    encoded_data = base64.b64encode(response.content).decode("utf-8")
-    data_url = f"data:{mime_type};base64,{encoded_data}"
+    try:
+        image_format = PILImage.open(io.BytesIO(file_data)).format
+    except OSError:
+        raise ValueError("Could not determine the image type of the given bytes")
+    mime_type = _mime_type_for_format(image_format or "PNG")
+
+    if max_side or quality or format:
+        file_data, mime_type = _recompress(
+            file_data, mime_type, max_side, quality, format
+        )
+
+    data_url = _build_data_uri(file_data, mime_type)
+    if cache_key:
+        cache.put(cache_key, data_url, mime_type)
     return data_url, mime_type
 
 
-def _encode_pil_image(image: PILImage.Image, format: str = None) -> tuple[str, str]:
-    """Encode a PIL Image object to a base64 data URI with MIME type."""
+def _recompress(
+    file_data: bytes,
+    mime_type: str,
+    max_side: Optional[int],
+    quality: Optional[int],
+    format: Optional[str],
+) -> tuple[bytes, str]:
+    """
+    Resize and re-encode image file bytes, keeping the original bytes when
+    that does not make the payload smaller.
+    """
+    try:
+        image = PILImage.open(io.BytesIO(file_data))
+        image.load()
+    except (OSError, PILImage.DecompressionBombError):
+        # Not something PIL can process, send it as is
+        return file_data, mime_type
+
+    needs_resize = bool(max_side) and max(image.size) > max_side
+    data, new_mime_type = _encode_pil_bytes(image, format, max_side, quality)
+    if not needs_resize and len(data) >= len(file_data):
+        return file_data, mime_type
+    return data, new_mime_type
+
+
+def _resolve_format(image: PILImage.Image, format: Optional[str]) -> str:
+    """Get the PIL format to save an image with."""
+    if format and format.lower() == "auto":
+        has_alpha = image.mode in ("RGBA", "LA", "PA") or (
+            image.mode == "P" and "transparency" in image.info
+        )
+        return "PNG" if has_alpha else "JPEG"
+    return (format or image.format or "PNG").upper()
+
+
+def _encode_pil_bytes(
+    image: PILImage.Image,
+    format: Optional[str] = None,
+    max_side: Optional[int] = None,
+    quality: Optional[int] = None,
+) -> tuple[bytes, str]:
+    """Resize and save a PIL image, returning the file bytes and MIME type."""
+    file_format = _resolve_format(image, format)
+
+    if max_side and max(image.size) > max_side:
+        scale = max_side / max(image.size)
+        new_size = (
+            max(1, round(image.size[0] * scale)),
+            max(1, round(image.size[1] * scale)),
+        )
+        image = image.resize(new_size, PILImage.Resampling.LANCZOS)
+
+    save_kwargs = {}
+    if file_format in ("JPEG", "WEBP"):
+        if file_format == "JPEG" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        save_kwargs["quality"] = quality or 85
+    if file_format in ("JPEG", "PNG"):
+        save_kwargs["optimize"] = True
+
     buffered = io.BytesIO()
-    file_format = format or image.format or "PNG"
-    image.save(buffered, format=file_format)
+    if max_side or quality or format:
+        image.save(buffered, format=file_format, **save_kwargs)
+    else:
+        # No policy: keep the historical full-resolution, default-settings save
+        image.save(buffered, format=file_format)
+    return buffered.getvalue(), _mime_type_for_format(file_format)
+
 
+def _mime_type_for_format(file_format: str) -> str:
+    """Get the MIME type of a PIL image format."""
     # Get the correct MIME type using the image format
     file_extension = file_format.lower()
     mime_type, _ = mimetypes.guess_type(f"file.{file_extension}")
@@ -280,7 +716,49 @@ def _encode_pil_image(image: PILImage.Image, format: str = None) -> tuple[str, s
             "webp": "image/webp",
         }
         mime_type = format_to_mime.get(file_extension, "image/png")
+    return mime_type
 
-    encoded_data = base64.b64encode(buffered.getvalue()).decode("utf-8")
-    data_url = f"data:{mime_type};base64,{encoded_data}"
+
+def _pil_pixel_bytes(image: PILImage.Image) -> int:
+    """Size of the raw pixel buffer of a PIL image."""
+    return image.size[0] * image.size[1] * len(image.getbands())
+
+
+def _data_uri_payload_bytes(url: str) -> Optional[int]:
+    """Size of the decoded payload of a base64 data URI (None for URLs)."""
+    if not url.startswith("data:") or "base64," not in url:
+        return None
+    encoded_length = len(url) - url.index("base64,") - len("base64,")
+    padding = len(url) - len(url.rstrip("="))
+    return encoded_length * 3 // 4 - padding
+
+
+def _encode_image_from_url(image_url: str) -> tuple[str, str]:
+    """Encode a file from a URL to a base64 data URI with MIME type."""
+    return get_image_downloader().fetch(image_url)
+
+
+def _encode_pil_image(
+    image: PILImage.Image,
+    format: str = None,
+    max_side: Optional[int] = None,
+    quality: Optional[int] = None,
+) -> tuple[str, str]:
+    """Encode a PIL Image object to a base64 data URI with MIME type."""
+    cache = get_image_cache()
+    cache_key = (
+        pil_cache_key(image, format=format, max_side=max_side, quality=quality)
+        if cache
+        else None
+    )
+    if cache_key:
+        cached = cache.get(cache_key)
+        if cached:
+            return cached
+
+    file_data, mime_type = _encode_pil_bytes(image, format, max_side, quality)
+
+    data_url = _build_data_uri(file_data, mime_type)
+    if cache_key:
+        cache.put(cache_key, data_url, mime_type)
     return data_url, mime_type
@@ -2,9 +2,12 @@
 Base LLM inference model.
 """
 
+import copy
 import logging
 from abc import ABC, abstractmethod
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Union
+
+from tinyloop.inference.history import History
 
 logger = logging.getLogger(__name__)
 
@@ -37,8 +40,9 @@ class BaseInferenceModel(ABC):
         self.model = model
         self.temperature = temperature
         self.use_cache = use_cache
-        self.message_history = message_history or []
+        self.message_history = History(message_history)
         self.use_instructor = use_instructor
+        self.system_prompt = system_prompt
         if system_prompt:
             self.message_history.append({"role": "system", "content": system_prompt})
 
@@ -106,14 +110,26 @@ class BaseInferenceModel(ABC):
         """
         Get the message history.
         """
-        return self.message_history
+        return self.message_history.to_list()
 
-    def set_history(self, history: List[Dict[str, Any]]) -> None:
+    def set_history(self, history: Union[List[Dict[str, Any]], History]) -> None:
         """
         Set the message history.
         """
+        if not isinstance(history, History):
+            history = History(history)
         self.message_history = history
 
+    def fork(self) -> "BaseInferenceModel":
+        """
+        Create a copy of the model whose history branches off the current one.
+
+        The messages so far are shared with the fork, not copied.
+        """
+        forked = copy.copy(self)
+        forked.message_history = self.message_history.fork()
+        return forked
+
     def add_message(self, message: Dict[str, Any]) -> None:
         """
         Add a message to the message history.
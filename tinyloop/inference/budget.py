@@ -0,0 +1,388 @@
+"""
+Token usage accounting and spend budgets for LLM calls.
+"""
+
+import functools
+import json
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import litellm
+
+from tinyloop.features.image_tokens import estimate_image_tokens
+from tinyloop.features.vision import image_url_size
+
+# Assumed size of images whose dimensions are unknown (remote URLs), large
+# enough for the estimate to err on the side of the budget
+UNKNOWN_IMAGE_SIZE = (2048, 2048)
+
+
+@dataclass(slots=True)
+class TokenUsage:
+    """
+    Tokens used by one or more calls.
+
+    `cached_tokens` are the part of `input_tokens` read from the provider's
+    prompt cache, `cache_write_tokens` the part written to it and
+    `reasoning_tokens` the part of `output_tokens` spent on reasoning.
+    """
+
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cached_tokens: int = 0
+    reasoning_tokens: int = 0
+    cache_write_tokens: int = 0
+
+    @property
+    def total_tokens(self) -> int:
+        return self.input_tokens + self.output_tokens
+
+    @property
+    def cache_hit_rate(self) -> float:
+        """Share of input tokens read from the prompt cache."""
+        return self.cached_tokens / self.input_tokens if self.input_tokens else 0.0
+
+    @classmethod
+    def from_litellm(cls, usage: Any) -> "TokenUsage":
+        """Read the usage reported in a litellm response (or stream chunk)."""
+        if usage is None:
+            return cls()
+        cached = _get(_get(usage, "prompt_tokens_details"), "cached_tokens") or _get(
+            usage, "cache_read_input_tokens"
+        )
+        reasoning = _get(_get(usage, "completion_tokens_details"), "reasoning_tokens")
+        written = _get(usage, "cache_creation_input_tokens")
+        return cls(
+            input_tokens=_get(usage, "prompt_tokens") or 0,
+            output_tokens=_get(usage, "completion_tokens") or 0,
+            cached_tokens=cached or 0,
+            reasoning_tokens=reasoning or 0,
+            cache_write_tokens=written or 0,
+        )
+
+    @classmethod
+    def sum(cls, usages: Iterable["TokenUsage"]) -> "TokenUsage":
+        total = cls()
+        for usage in usages:
+            total.add(usage)
+        return total
+
+    def add(self, other: "TokenUsage") -> None:
+        """Add another usage to this one, in place."""
+        self.input_tokens += other.input_tokens
+        self.output_tokens += other.output_tokens
+        self.cached_tokens += other.cached_tokens
+        self.reasoning_tokens += other.reasoning_tokens
+        self.cache_write_tokens += other.cache_write_tokens
+
+    def __add__(self, other: "TokenUsage") -> "TokenUsage":
+        return TokenUsage.sum((self, other))
+
+
+def _get(obj: Any, name: str) -> Any:
+    if obj is None:
+        return None
+    if isinstance(obj, dict):
+        return obj.get(name)
+    return getattr(obj, name, None)
+
+
+def estimate_input_tokens(
+    model: str,
+    messages: List[Dict[str, Any]],
+    tools: Optional[List[Dict[str, Any]]] = None,
+) -> int:
+    """
+    Estimate the input tokens of a request before sending it.
+
+    Text and tool definitions are counted with the model's tokenizer,
+    images with the provider formulas of `estimate_image_tokens`.
+    """
+    text_messages = []
+    image_tokens = 0
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, list):
+            parts = []
+            for part in content:
+                if isinstance(part, dict) and part.get("type") == "image_url":
+                    image_tokens += _estimate_image_part_tokens(part, model)
+                else:
+                    parts.append(part)
+            message = {**message, "content": parts}
+        text_messages.append(message)
+    try:
+        text_tokens = litellm.token_counter(
+            model=model, messages=text_messages, tools=tools or None
+        )
+    except Exception:
+        # Unknown tokenizer: about 4 characters per token
+        text_tokens = len(json.dumps([text_messages, tools], default=str)) // 4
+    return text_tokens + image_tokens
+
+
+def _estimate_image_part_tokens(part: Dict[str, Any], model: str) -> int:
+    image_url = part["image_url"]
+    url = image_url if isinstance(image_url, str) else image_url.get("url", "")
+    detail = None if isinstance(image_url, str) else image_url.get("detail")
+    size = image_url_size(url) or UNKNOWN_IMAGE_SIZE
+    return estimate_image_tokens(*size, model, detail=detail)
+
+
+@functools.lru_cache(maxsize=256)
+def get_token_costs(model: str) -> Optional[Tuple[float, float]]:
+    """Get the dollar cost of one input and one output token (None if unknown)."""
+    try:
+        input_cost, _ = litellm.cost_per_token(
+            model=model, prompt_tokens=1, completion_tokens=0
+        )
+        _, output_cost = litellm.cost_per_token(
+            model=model, prompt_tokens=0, completion_tokens=1
+        )
+    except Exception:
+        return None
+    return input_cost, output_cost
+
+
+@functools.lru_cache(maxsize=256)
+def get_max_output_tokens(model: str) -> Optional[int]:
+    """Get the longest completion a model can return (None if unknown)."""
+    try:
+        return litellm.get_model_info(model).get("max_output_tokens")
+    except Exception:
+        return None
+
+
+class BudgetExceededError(Exception):
+    """Raised when a call is rejected because its budget is spent."""
+
+    def __init__(self, budget: "Budget", reason: str):
+        self.budget = budget
+        super().__init__(f"Budget exceeded: {reason}")
+
+
+@dataclass
+class Budget:
+    """
+    Token and dollar limits shared by every call the budget is given to.
+
+    Before anything is sent, the input tokens and cost of each call are
+    estimated: the call is rejected with `BudgetExceededError` if its input
+    does not leave room for any output, and its completion length is capped
+    to the tokens and dollars left after the input. The input and the
+    longest completion the call may return are then reserved until its
+    usage is recorded (or released if it fails), so calls running
+    concurrently cannot overspend the budget together. Use one budget per
+    run (`llm(..., budget=)`, `loop(..., budget=)`), per instance
+    (`LLM(budget=)`, `ToolLoop(budget=)`) or share one across a whole batch.
+
+    Args:
+        max_tokens: Limit of input plus output tokens
+        max_cost: Limit of cost, in dollars
+    """
+
+    max_tokens: Optional[int] = None
+    max_cost: Optional[float] = None
+    usage: TokenUsage = field(default_factory=TokenUsage, init=False)
+    cost: float = field(default=0.0, init=False)
+    calls: int = field(default=0, init=False)
+    # Held for the calls in flight, see `reserve`
+    reserved_tokens: int = field(default=0, init=False)
+    reserved_cost: float = field(default=0.0, init=False)
+    _lock: threading.RLock = field(
+        default_factory=threading.RLock, init=False, repr=False
+    )
+
+    @property
+    def remaining_tokens(self) -> Optional[int]:
+        if self.max_tokens is None:
+            return None
+        used = self.usage.total_tokens + self.reserved_tokens
+        return max(self.max_tokens - used, 0)
+
+    @property
+    def remaining_cost(self) -> Optional[float]:
+        if self.max_cost is None:
+            return None
+        return max(self.max_cost - self.cost - self.reserved_cost, 0.0)
+
+    def before_call(
+        self,
+        input_tokens: int = 0,
+        input_cost: float = 0.0,
+        output_token_cost: float = 0.0,
+    ) -> None:
+        """
+        Raise `BudgetExceededError` if a call with this estimated input
+        would not leave room for at least one output token, counting what
+        the calls in flight reserved.
+        """
+        with self._lock:
+            used = self.usage.total_tokens + self.reserved_tokens
+            if self.max_tokens is not None and used + input_tokens >= self.max_tokens:
+                reason = f"{used} of {self.max_tokens} tokens used"
+                if self.reserved_tokens:
+                    reason += f" ({self.reserved_tokens} by calls in progress)"
+                if input_tokens:
+                    reason += f", the next call needs about {input_tokens} more"
+                raise BudgetExceededError(self, reason)
+            spent = self.cost + self.reserved_cost
+            if self.max_cost is not None and (
+                spent + input_cost + output_token_cost > self.max_cost
+                or spent >= self.max_cost
+            ):
+                reason = f"${spent:.6f} of ${self.max_cost:.6f} spent"
+                if self.reserved_cost:
+                    reason += f" (${self.reserved_cost:.6f} by calls in progress)"
+                if input_cost:
+                    reason += f", the next call needs about ${input_cost:.6f} more"
+                raise BudgetExceededError(self, reason)
+
+    def limit_output_tokens(
+        self,
+        max_tokens: Optional[int],
+        input_tokens: int = 0,
+        input_cost: float = 0.0,
+        output_token_cost: float = 0.0,
+    ) -> Optional[int]:
+        """
+        Cap a call's completion length to the tokens and dollars left after
+        its estimated input.
+        """
+        limits = [] if max_tokens is None else [max_tokens]
+        remaining = self.remaining_tokens
+        if remaining is not None:
+            limits.append(max(remaining - input_tokens, 0))
+        remaining_cost = self.remaining_cost
+        if remaining_cost is not None and output_token_cost:
+            left = remaining_cost - input_cost
+            limits.append(max(int(left / output_token_cost), 0))
+        return min(limits) if limits else None
+
+    def reserve(
+        self,
+        max_tokens: Optional[int],
+        input_tokens: int = 0,
+        input_cost: float = 0.0,
+        output_token_cost: float = 0.0,
+        output_limit: Optional[int] = None,
+    ) -> Tuple[Optional[int], "Reservation"]:
+        """
+        Check a call, cap its completion length and reserve its input and
+        longest completion, all at once.
+
+        Args:
+            output_limit: Longest completion the model can return, reserved
+                when the completion length is not capped lower
+
+        Returns:
+            The capped completion length and the reservation, to be passed
+            to `record` or `release`
+        """
+        with self._lock:
+            self.before_call(input_tokens, input_cost, output_token_cost)
+            max_tokens = self.limit_output_tokens(
+                max_tokens, input_tokens, input_cost, output_token_cost
+            )
+            outputs = [n for n in (max_tokens, output_limit) if n is not None]
+            output_tokens = min(outputs) if outputs else 0
+            reservation = Reservation(
+                tokens=input_tokens + output_tokens,
+                cost=input_cost + output_tokens * output_token_cost,
+            )
+            self.reserved_tokens += reservation.tokens
+            self.reserved_cost += reservation.cost
+            return max_tokens, reservation
+
+    def release(self, reservation: "Reservation") -> None:
+        """Give back what a call that failed had reserved."""
+        with self._lock:
+            self.reserved_tokens -= reservation.tokens
+            self.reserved_cost -= reservation.cost
+
+    def record(
+        self,
+        usage: TokenUsage,
+        cost: float,
+        reservation: Optional["Reservation"] = None,
+    ) -> None:
+        """Record the spend of a call, replacing its reservation if any."""
+        with self._lock:
+            if reservation is not None:
+                self.release(reservation)
+            self.usage.add(usage)
+            self.cost += cost
+            self.calls += 1
+
+    def reset(self) -> None:
+        with self._lock:
+            self.usage = TokenUsage()
+            self.cost = 0.0
+            self.calls = 0
+
+
+@dataclass(slots=True)
+class Reservation:
+    """Tokens and dollars held on a budget for a call in flight."""
+
+    tokens: int = 0
+    cost: float = 0.0
+
+
+class CallBudgets:
+    """
+    The budgets one call is charged to, with what is reserved on each for
+    its request in flight.
+    """
+
+    def __init__(self, budgets: Iterable[Budget] = ()):
+        self.budgets = list(budgets)
+        self._reservations: List[Optional[Reservation]] = [None] * len(self.budgets)
+
+    def __iter__(self):
+        return iter(self.budgets)
+
+    def __len__(self) -> int:
+        return len(self.budgets)
+
+    def reserve(
+        self,
+        max_tokens: Optional[int],
+        input_tokens: int = 0,
+        input_cost: float = 0.0,
+        output_token_cost: float = 0.0,
+        output_limit: Optional[int] = None,
+    ) -> Optional[int]:
+        """
+        Reserve a request on every budget (see `Budget.reserve`).
+
+        Returns:
+            The completion length, capped by all the budgets
+        """
+        try:
+            for index, budget in enumerate(self.budgets):
+                max_tokens, self._reservations[index] = budget.reserve(
+                    max_tokens,
+                    input_tokens,
+                    input_cost,
+                    output_token_cost,
+                    output_limit,
+                )
+        except BudgetExceededError:
+            self.release()
+            raise
+        return max_tokens
+
+    def record(self, usage: TokenUsage, cost: float) -> None:
+        """Record the spend of the request, replacing its reservations."""
+        for index, budget in enumerate(self.budgets):
+            budget.record(usage, cost, self._reservations[index])
+            self._reservations[index] = None
+
+    def release(self) -> None:
+        """Give back the reservations of a request that failed."""
+        for index, budget in enumerate(self.budgets):
+            if self._reservations[index] is not None:
+                budget.release(self._reservations[index])
+                self._reservations[index] = None
@@ -0,0 +1,200 @@
+"""
+Hedged requests for tail-latency reduction.
+
+A hedged call starts the primary request and, if it has not answered within a
+percentile of the recent latency for that model, fires a duplicate request
+(optionally to a secondary model or deployment). The first successful result
+wins and the other request is cancelled.
+"""
+
+import asyncio
+import logging
+import threading
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class LatencyHistogram:
+    """
+    Rolling window of the most recent latencies observed for a model.
+
+    Args:
+        window: Number of recent samples kept to compute percentiles
+    """
+
+    def __init__(self, window: int = 500):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Get the q-th percentile (0-1) of recent latencies, None if empty."""
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        index = min(int(q * len(samples)), len(samples) - 1)
+        return samples[index]
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+
+# Histograms are keyed by (model, kind), kind being "latency" or "ttft"
+_latency_histograms: Dict[Tuple[str, str], LatencyHistogram] = {}
+_latency_histograms_lock = threading.Lock()
+
+
+def get_latency_histogram(model: str, kind: str = "latency") -> LatencyHistogram:
+    """Get the shared latency histogram for a model, creating it if needed."""
+    key = (model, kind)
+    with _latency_histograms_lock:
+        histogram = _latency_histograms.get(key)
+        if histogram is None:
+            histogram = LatencyHistogram()
+            _latency_histograms[key] = histogram
+        return histogram
+
+
+@dataclass
+class HedgePolicy:
+    """
+    When and where to send a hedged duplicate request.
+
+    Args:
+        percentile: Latency percentile (0-1) after which the hedge is fired
+        min_samples: Samples needed before the histogram drives the delay
+        default_delay: Delay in seconds used until enough samples exist
+        min_delay: Lower bound for the hedge delay
+        max_delay: Upper bound for the hedge delay
+        hedge_model: Model for the duplicate request (same model if None)
+        hedge_params: Extra completion params for the duplicate request, e.g.
+            `api_base` to target another deployment
+    """
+
+    percentile: float = 0.95
+    min_samples: int = 20
+    default_delay: float = 2.0
+    min_delay: float = 0.05
+    max_delay: float = 30.0
+    hedge_model: Optional[str] = None
+    hedge_params: Dict[str, Any] = field(default_factory=dict)
+
+    def get_delay(self, histogram: LatencyHistogram) -> float:
+        """Get how long to wait for the primary before hedging."""
+        if len(histogram) < self.min_samples:
+            return self.default_delay
+        delay = histogram.percentile(self.percentile)
+        return min(max(delay, self.min_delay), self.max_delay)
+
+
+@dataclass
+class HedgeOutcome:
+    """Result of a hedged call."""
+
+    result: Any
+    hedged: bool = False
+    hedge_won: bool = False
+    # Results that completed but lost the race (their cost is wasted)
+    discarded: List[Any] = field(default_factory=list)
+
+
+class PrefetchedStream:
+    """Async iterator that replays an already received first chunk."""
+
+    _EMPTY = object()
+
+    def __init__(self, first_chunk: Any, stream: Any):
+        self.first_chunk = first_chunk
+        self.stream = stream
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        if self.first_chunk is self._EMPTY:
+            return
+        yield self.first_chunk
+        async for chunk in self.stream:
+            yield chunk
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+async def prefetch_first_chunk(stream: Any) -> PrefetchedStream:
+    """Wait for the first chunk of a stream so time-to-first-token can be raced."""
+    iterator = stream.__aiter__()
+    try:
+        first_chunk = await iterator.__anext__()
+    except StopAsyncIteration:
+        first_chunk = PrefetchedStream._EMPTY
+    return PrefetchedStream(first_chunk, iterator)
+
+
+async def _close(result: Any) -> None:
+    closer = getattr(result, "aclose", None)
+    if closer is None:
+        return
+    try:
+        await closer()
+    except Exception:
+        pass
+
+
+async def hedged_call(
+    primary: Callable[[], Awaitable[Any]],
+    hedge: Callable[[], Awaitable[Any]],
+    delay: float,
+) -> HedgeOutcome:
+    """
+    Race `primary` against a `hedge` fired after `delay` seconds.
+
+    The first successful result wins and the other call is cancelled. If one
+    of the calls fails, the other one is still awaited; the primary error is
+    raised only when both fail.
+    """
+    primary_task = asyncio.ensure_future(primary())
+    try:
+        done, _ = await asyncio.wait({primary_task}, timeout=delay)
+    except asyncio.CancelledError:
+        primary_task.cancel()
+        raise
+    if done:
+        return HedgeOutcome(result=primary_task.result())
+
+    logger.info(f"No response after {delay:.3f}s, firing hedged request")
+    hedge_task = asyncio.ensure_future(hedge())
+    pending = {primary_task, hedge_task}
+    winner = None
+    try:
+        while pending and winner is None:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            # Prefer the primary when both finished at the same time
+            for task in sorted(done, key=lambda t: t is not primary_task):
+                if task.exception() is None:
+                    winner = task
+                    break
+    finally:
+        for task in pending:
+            task.cancel()
+
+    if winner is None:
+        raise primary_task.exception()
+
+    outcome = HedgeOutcome(
+        result=winner.result(), hedged=True, hedge_won=winner is hedge_task
+    )
+    loser = hedge_task if winner is primary_task else primary_task
+    if loser.done() and not loser.cancelled() and loser.exception() is None:
+        outcome.discarded.append(loser.result())
+        await _close(loser.result())
+    return outcome
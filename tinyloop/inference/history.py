@@ -0,0 +1,125 @@
+"""
+Copy-on-write message history with O(1) forks.
+"""
+
+from collections.abc import Sequence
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Union
+
+
+class _Segment:
+    """Immutable run of messages chained to the segments before it."""
+
+    __slots__ = ("parent", "messages", "length")
+
+    def __init__(self, parent: Optional["_Segment"], messages: List[Dict[str, Any]]):
+        self.parent = parent
+        # Never mutated once the segment exists
+        self.messages = messages
+        self.length = (parent.length if parent else 0) + len(messages)
+
+
+class History(Sequence):
+    """
+    Message history made of a shared immutable prefix plus an append tail.
+
+    Forking freezes the current tail into the shared prefix without copying
+    any message, so many branches can grow from the same conversation while
+    the prefix (including large base64 images) is stored only once.
+
+    Example:
+        history = History([{"role": "user", "content": "Hi"}])
+        branch = history.fork()
+        branch.append({"role": "user", "content": "Tell me more"})
+        history.to_list()  # unaffected by the branch
+    """
+
+    __slots__ = ("_prefix", "_tail")
+
+    def __init__(self, messages: Optional[Iterable[Dict[str, Any]]] = None):
+        self._prefix: Optional[_Segment] = None
+        self._tail: List[Dict[str, Any]] = list(messages or [])
+
+    @classmethod
+    def _from_prefix(cls, prefix: Optional[_Segment]) -> "History":
+        history = cls()
+        history._prefix = prefix
+        return history
+
+    def fork(self) -> "History":
+        """
+        Create a branch that shares the current messages with this history.
+        """
+        if self._tail:
+            # Hand the tail list over to the shared prefix, no copy involved
+            self._prefix = _Segment(self._prefix, self._tail)
+            self._tail = []
+        return self._from_prefix(self._prefix)
+
+    def append(self, message: Dict[str, Any]) -> None:
+        self._tail.append(message)
+
+    def extend(self, messages: Iterable[Dict[str, Any]]) -> None:
+        self._tail.extend(messages)
+
+    def truncate(self, length: int) -> None:
+        """
+        Drop the messages after the first `length` ones.
+        """
+        prefix_length = self._prefix.length if self._prefix else 0
+        if length >= prefix_length:
+            del self._tail[length - prefix_length :]
+        else:
+            # Cutting into the shared prefix: keep our own copy of what remains
+            self._tail = self.to_list()[:length]
+            self._prefix = None
+
+    def to_list(self) -> List[Dict[str, Any]]:
+        """
+        Get the messages as the list of dicts litellm expects.
+
+        Messages are not copied, only the references to them.
+        """
+        segments = []
+        segment = self._prefix
+        while segment is not None:
+            segments.append(segment.messages)
+            segment = segment.parent
+
+        messages = []
+        for segment_messages in reversed(segments):
+            messages.extend(segment_messages)
+        messages.extend(self._tail)
+        return messages
+
+    def __len__(self) -> int:
+        return (self._prefix.length if self._prefix else 0) + len(self._tail)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return iter(self.to_list())
+
+    def __getitem__(self, index: Union[int, slice]) -> Any:
+        if isinstance(index, int):
+            prefix_length = self._prefix.length if self._prefix else 0
+            if index < 0:
+                index += len(self)
+            if prefix_length <= index < len(self):
+                return self._tail[index - prefix_length]
+        return self.to_list()[index]
+
+    def __delitem__(self, index: slice) -> None:
+        if not isinstance(index, slice) or index.stop is not None or index.step:
+            raise TypeError("History only supports deleting a trailing slice")
+        start = index.start or 0
+        if start < 0:
+            start += len(self)
+        self.truncate(max(start, 0))
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, History):
+            other = other.to_list()
+        if isinstance(other, list):
+            return self.to_list() == other
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"History({len(self)} messages)"
@@ -1,24 +1,77 @@
 import asyncio
+import copy
+import functools
+import inspect
+import itertools
 import json
 import logging
 import sys
-from typing import Any, Dict, List, Optional
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple, Union
 
 import litellm
 import mlflow
 from langfuse import observe
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
 
 from tinyloop.features.function_calling import Tool
+from tinyloop.features.image_history import ImageHistoryPolicy, ImageStore
+from tinyloop.features.partial_json import PartialJSONParser, partial_model
+from tinyloop.features.structured_output import (
+    REASK_PROMPT,
+    ResponseFormat,
+    format_validation_error,
+    get_response_format,
+    is_json_error,
+    is_output_model,
+    repair_json,
+    validate_output,
+)
 from tinyloop.features.vision import Image
 from tinyloop.inference.base import BaseInferenceModel
+from tinyloop.inference.budget import (
+    Budget,
+    CallBudgets,
+    TokenUsage,
+    estimate_input_tokens,
+    get_max_output_tokens,
+    get_token_costs,
+)
+from tinyloop.inference.hedging import (
+    HedgePolicy,
+    LatencyHistogram,
+    get_latency_histogram,
+    hedged_call,
+    prefetch_first_chunk,
+)
+from tinyloop.inference.history import History
+from tinyloop.inference.prompt_cache import (
+    PromptCacheSupport,
+    get_prompt_cache_support,
+    mark_messages,
+    mark_tools,
+)
+from tinyloop.inference.retry import (
+    CircuitBreaker,
+    RetryPolicy,
+    acall_with_retry,
+    call_with_retry,
+    get_circuit_breaker,
+)
+from tinyloop.inference.sessions import ConversationStore, InMemoryConversationStore
+from tinyloop.inference.singleflight import make_request_key, single_flight
+from tinyloop.inference.timings import PhaseTimer, call_started, phase_stats
 from tinyloop.types import LLMResponse, LLMStreamingResponse, ToolCall, ToolCallDelta
+from tinyloop.utils.metrics import current_module, llm_metrics
 from tinyloop.utils.mlflow import mlflow_trace
 
 logger = logging.getLogger(__name__)
 
 mlflow.config.enable_async_logging(True)
 
+# What an LLMResponse keeps, see LLM(response_profile=...)
+RESPONSE_PROFILES = ("full", "standard", "slim")
+
 
 class CostTracker:
     """Tracks costs from litellm callbacks by capturing stdout."""
@@ -91,6 +144,75 @@ async def track_cost_callback(kwargs, completion_response, start_time, end_time)
 litellm.success_callback = [track_cost_callback]
 
 
+def timed_call(func):
+    """
+    Time the tracing decorators around an LLM call; must be the outermost
+    decorator.
+    """
+    if inspect.iscoroutinefunction(func):
+
+        @functools.wraps(func)
+        async def async_wrapper(self, *args, **kwargs):
+            start = time.perf_counter()
+            token = call_started.set(start)
+            labels = (self.model, current_module.get()[0])
+            llm_metrics.in_flight.inc(*labels)
+            try:
+                response = await func(self, *args, **kwargs)
+            except Exception:
+                llm_metrics.requests.inc(*labels, "error")
+                llm_metrics.in_flight.dec(*labels)
+                raise
+            finally:
+                call_started.reset(token)
+            if isinstance(response, AsyncIterator):
+                # Streams (wrapped by the tracing decorators) stay in flight
+                # until they finish or are closed
+                return _track_stream(response, labels)
+            llm_metrics.in_flight.dec(*labels)
+            self._record_timings(response, start)
+            return response
+
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        start = time.perf_counter()
+        token = call_started.set(start)
+        labels = (self.model, current_module.get()[0])
+        llm_metrics.in_flight.inc(*labels)
+        try:
+            response = func(self, *args, **kwargs)
+        except Exception:
+            llm_metrics.requests.inc(*labels, "error")
+            raise
+        finally:
+            call_started.reset(token)
+            llm_metrics.in_flight.dec(*labels)
+        self._record_timings(response, start)
+        return response
+
+    return wrapper
+
+
+async def _track_stream(stream, labels: Tuple[str, str]):
+    """
+    Yield from a streamed call, counting it in flight until the stream
+    finishes, fails or is closed.
+    """
+    try:
+        async for item in stream:
+            yield item
+    except Exception:
+        llm_metrics.requests.inc(*labels, "error")
+        raise
+    finally:
+        llm_metrics.in_flight.dec(*labels)
+        aclose = getattr(stream, "aclose", None)
+        if aclose is not None:
+            await aclose()
+
+
 class LLM(BaseInferenceModel):
     """
     LLM inference model using litellm.
@@ -103,6 +225,17 @@ class LLM(BaseInferenceModel):
         use_cache: bool = False,
         system_prompt: Optional[str] = None,
         message_history: Optional[List[Dict[str, Any]]] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        circuit_breaker: Union[bool, CircuitBreaker] = False,
+        hedge_policy: Optional[HedgePolicy] = None,
+        coalesce_requests: Optional[bool] = None,
+        conversation_store: Optional[ConversationStore] = None,
+        image_policy: Optional[ImageHistoryPolicy] = None,
+        max_reasks: int = 0,
+        response_profile: str = "full",
+        budget: Optional[Budget] = None,
+        prompt_caching: Optional[bool] = None,
+        release_images: bool = False,
     ):
         """
         Initialize the inference model.
@@ -111,7 +244,45 @@ class LLM(BaseInferenceModel):
             model: Model name or path
             temperature: Temperature for sampling
             use_cache: Whether to use_cache the model
+            retry_policy: Backoff policy for transient errors (no retries if None)
+            circuit_breaker: True to use the breaker shared by all instances of
+                this model, or a CircuitBreaker instance
+            hedge_policy: Fire a duplicate request when async calls are slower
+                than usual (disabled if None)
+            coalesce_requests: Share one upstream call between identical
+                concurrent async requests. Defaults to on when temperature is 0
+            conversation_store: Store used for calls made with a `session_id`
+                (in-memory if None)
+            image_policy: Store images in the history once, by reference, and
+                control how repeated and old images are sent (images are
+                embedded in every message as is if None)
+            max_reasks: Times a structured output that fails validation (even
+                after local repair) is sent back to the model with the
+                validation error, before raising
+            response_profile: What responses keep. "full": everything;
+                "standard": no copy of the history, `message_history` is a
+                view built into a list only when read; "slim": only the
+                content, parsed output, tool calls, usage and cost
+            budget: Token and dollar limits for all the calls of this
+                instance (calls also accept their own `budget`)
+            prompt_caching: Mark the stable prefix (system prompt, tools,
+                last completed turn) with provider prompt-caching breakpoints.
+                Calls made with `cache_newest=True` (the iterations of a
+                ToolLoop, whose next request extends them) also mark the
+                newest message. Defaults to on for models that need them (see
+                PROMPT_CACHE_CAPABILITIES); models that cache automatically
+                never get breakpoints
+            release_images: Keep images in the history as references to
+                their source (file, PIL image or bytes) instead of their
+                data URIs: they are encoded again for each request and
+                released as soon as the request is built
         """
+        if response_profile not in RESPONSE_PROFILES:
+            raise ValueError(
+                f"Unknown response_profile {response_profile!r}, expected one "
+                f"of {', '.join(RESPONSE_PROFILES)}"
+            )
+
         super().__init__(
             model=model,
             temperature=temperature,
@@ -123,7 +294,27 @@ class LLM(BaseInferenceModel):
         self.sync_client = litellm.completion
         self.async_client = litellm.acompletion
         self.run_cost = []
-
+        self.run_usage: List[TokenUsage] = []
+        self.budget = budget
+        self.retry_policy = retry_policy
+        if circuit_breaker is True:
+            self.circuit_breaker = get_circuit_breaker(model)
+        else:
+            self.circuit_breaker = circuit_breaker or None
+        self.hedge_policy = hedge_policy
+        self.hedge_cost = []
+        self.hedge_stats = {"fired": 0, "won": 0}
+        self.coalesce_requests = coalesce_requests
+        self.conversation_store = conversation_store or InMemoryConversationStore()
+        self.image_policy = image_policy
+        self.image_store = ImageStore()
+        self.release_images = release_images
+        self.max_reasks = max_reasks
+        self.response_profile = response_profile
+        self.prompt_cache = self._resolve_prompt_cache(model, prompt_caching)
+        self.output_stats = {"repaired": 0, "reasked": 0}
+
+    @timed_call
     @observe(name="litellm.completion", as_type="generation")
     @mlflow.trace(span_type=mlflow.entities.SpanType.LLM)
     def __call__(
@@ -135,6 +326,7 @@ class LLM(BaseInferenceModel):
     ) -> LLMResponse:
         return self.invoke(prompt=prompt, messages=messages, stream=stream, **kwargs)
 
+    @timed_call
     @observe(name="litellm.completion", as_type="generation")
     @mlflow_trace(mlflow.entities.SpanType.LLM)
     async def acall(
@@ -156,86 +348,64 @@ class LLM(BaseInferenceModel):
         messages: Optional[List[Dict[str, Any]]] = None,
         tools: Optional[List[Tool]] = None,
         stream: bool = False,
+        session_id: Optional[str] = None,
+        budget: Optional[Budget] = None,
+        cache_newest: bool = False,
         **kwargs,
     ) -> LLMResponse:
         if stream:
             raise ValueError("Stream is not supported for sync mode")
-        if messages is None:
-            messages = self.message_history
-            if not prompt:
-                raise ValueError("Prompt is required when messages is None")
-            messages.append(self._prepare_user_message(prompt, images))
-
-        raw_response = self.sync_client(
-            model=self.model,
-            messages=messages,
-            temperature=self.temperature,
-            caching=self.use_cache,
-            stream=stream,
-            tools=[tool.definition for tool in tools] if tools else None,
-            **kwargs,
-        )
+        timer = self._start_timer()
+        budgets = self._check_budgets(budget)
+        history, history_length = self._start_turn(prompt, images, messages, session_id)
 
-        if raw_response.choices:
-            content = raw_response.choices[0].message.content
-            response = (
-                self._parse_structured_output(
-                    content,
-                    kwargs.get("response_format"),
-                )
-                if kwargs.get("response_format")
-                else content
+        try:
+            request_messages = self._request_messages(
+                history, messages, tools, cache_newest
             )
-            cost = raw_response._hidden_params["response_cost"] or 0
-            hidden_fields = raw_response._hidden_params
-
-            tool_calls = self._parse_tool_calls(
-                raw_response.choices[0].message.tool_calls
+            timer.mark("prepare")
+            request_tools = self._request_tools(tools)
+            timer.mark("tools")
+            request_kwargs = self._request_kwargs(
+                kwargs, budgets, request_messages, request_tools, stream
             )
-            if tool_calls:
-                # Add a well-formed assistant message that contains tool_calls
-                # OpenAI expects `content` to be a string (use empty string when using tool_calls)
-                self.add_message(
-                    {
-                        "role": "assistant",
-                        "content": response or "",
-                        "tool_calls": [
-                            {
-                                "id": tc.id,
-                                "type": "function",
-                                "function": {
-                                    "name": tc.function_name,
-                                    "arguments": json.dumps(tc.args),
-                                },
-                            }
-                            for tc in tool_calls
-                        ],
-                    }
-                )
-
-            if content:
-                self.add_message(
-                    {
-                        "role": "assistant",
-                        "content": content,
-                    }
-                )
-        else:
-            response = None
-            cost = 0
-            hidden_fields = {}
-            tool_calls = None
-
-        self.run_cost.append(cost)
+            timer.mark("prepare")
+            raw_response = self._completion(
+                model=self.model,
+                messages=request_messages,
+                temperature=self.temperature,
+                caching=self.use_cache,
+                stream=stream,
+                tools=request_tools,
+                **request_kwargs,
+            )
+            timer.mark("network")
 
-        return LLMResponse(
-            response=response,
-            raw_response=raw_response,
-            cost=cost,
-            hidden_fields=hidden_fields,
-            tool_calls=tool_calls,
-            message_history=self.get_history(),
-        )
+            for reasks in itertools.count():
+                try:
+                    response = self._parse_response(
+                        raw_response, kwargs.get("response_format")
+                    )
+                    break
+                except ValidationError as error:
+                    if reasks >= self.max_reasks:
+                        raise
+                    self._record_reask(raw_response, budgets)
+                    timer.mark("parse")
+                    raw_response = self._completion(
+                        **self._reask_params(raw_response, error, kwargs, budgets)
+                    )
+                    timer.mark("network")
+
+            final_response = self._finish_turn(raw_response, response, history, budgets)
+            self._save_turn(session_id, history, history_length)
+        except Exception:
+            # Leave the history as it was so the call can be safely repeated
+            del history[history_length:]
+            budgets.release()
+            raise
+        timer.mark("parse")
+        return self._finish_timer(final_response, timer)
 
     async def ainvoke(
         self,
@@ -244,143 +414,721 @@ class LLM(BaseInferenceModel):
         messages: Optional[List[Dict[str, Any]]] = None,
         tools: Optional[List[Tool]] = None,
         stream: bool = False,
+        session_id: Optional[str] = None,
+        budget: Optional[Budget] = None,
+        cache_newest: bool = False,
         **kwargs,
     ) -> LLMResponse:
+        timer = self._start_timer()
+        budgets = self._check_budgets(budget)
+        stored = None
+        if session_id is not None:
+            stored = await self.conversation_store.aload(session_id)
+        history, history_length = self._start_turn(
+            prompt, images, messages, session_id, stored
+        )
+
+        try:
+            request_messages = self._request_messages(
+                history, messages, tools, cache_newest
+            )
+            timer.mark("prepare")
+            request_tools = self._request_tools(tools)
+            timer.mark("tools")
+            request_kwargs = self._request_kwargs(
+                kwargs, budgets, request_messages, request_tools, stream
+            )
+            timer.mark("prepare")
+            raw_response = await self._acompletion(
+                model=self.model,
+                messages=request_messages,
+                temperature=self.temperature,
+                caching=self.use_cache,
+                stream=stream,
+                tools=request_tools,
+                **request_kwargs,
+            )
+            timer.mark("network")
+            if stream:
+                return self._parse_streaming_response(
+                    raw_response,
+                    history,
+                    history_length,
+                    session_id,
+                    response_format=kwargs.get("response_format"),
+                    budgets=budgets,
+                    timer=timer,
+                )
+
+            for reasks in itertools.count():
+                try:
+                    response = self._parse_response(
+                        raw_response, kwargs.get("response_format")
+                    )
+                    break
+                except ValidationError as error:
+                    if reasks >= self.max_reasks:
+                        raise
+                    self._record_reask(raw_response, budgets)
+                    timer.mark("parse")
+                    raw_response = await self._acompletion(
+                        **self._reask_params(raw_response, error, kwargs, budgets)
+                    )
+                    timer.mark("network")
+
+            final_response = self._finish_turn(raw_response, response, history, budgets)
+            await self._asave_turn(session_id, history, history_length)
+        except Exception:
+            # Leave the history as it was so the call can be safely repeated
+            del history[history_length:]
+            budgets.release()
+            raise
+        timer.mark("parse")
+        return self._finish_timer(final_response, timer)
+
+    def _start_timer(self) -> PhaseTimer:
+        """
+        Start timing the phases of a call. Under the tracing wrapper, the
+        time since the wrapper was entered counts as tracing.
+        """
+        entered = call_started.get()
+        if entered is None:
+            return PhaseTimer()
+        # Calls made further down (e.g. by tools) are not under this wrapper
+        call_started.set(None)
+        timer = PhaseTimer(start=entered)
+        timer.mark("tracing")
+        return timer
+
+    def _finish_timer(self, response: LLMResponse, timer: PhaseTimer) -> LLMResponse:
+        """
+        Attach the timings to a response. Outside of the tracing wrapper
+        they are recorded right away, since nothing is left to time.
+        """
+        response.timings = timer.finish()
+        if "tracing" not in response.timings:
+            self._record_call(response.timings)
+        return response
+
+    def _record_timings(self, response: Any, start: float) -> None:
+        """
+        Add the time spent in the tracing decorators after the call to its
+        timings and record them in the process-wide phase stats.
+        """
+        if not isinstance(response, LLMResponse) or not response.timings:
+            # Streamed responses record their own timings when the stream ends
+            return
+        timings = response.timings
+        total = time.perf_counter() - start
+        timings["tracing"] = timings.get("tracing", 0.0) + total - timings["total"]
+        timings["total"] = total
+        self._record_call(timings)
+
+    def _record_call(self, timings: Dict[str, float]) -> None:
+        """
+        Record the timings of a finished call in the phase stats and metrics.
+        """
+        phase_stats.record(self.model, timings)
+        labels = (self.model, current_module.get()[0])
+        llm_metrics.requests.inc(*labels, "ok")
+        llm_metrics.latency.observe(*labels, value=timings["total"])
+        if "ttft" in timings:
+            llm_metrics.ttft.observe(
+                *labels,
+                value=sum(
+                    timings.get(phase, 0.0)
+                    for phase in ("tracing", "prepare", "tools", "network", "ttft")
+                ),
+            )
+
+    def _check_budgets(self, budget: Optional[Budget]) -> CallBudgets:
+        """
+        Get the budgets a call is charged to, raising `BudgetExceededError`
+        if one of them is spent.
+        """
+        budgets = [b for b in (self.budget, budget) if b is not None]
+        for b in budgets:
+            b.before_call()
+        return CallBudgets(budgets)
+
+    def _request_kwargs(
+        self,
+        kwargs: Dict[str, Any],
+        budgets: Optional[CallBudgets] = None,
+        messages: Optional[List[Dict[str, Any]]] = None,
+        tools: Optional[List[Dict[str, Any]]] = None,
+        stream: bool = False,
+    ) -> Dict[str, Any]:
+        """
+        Get the extra completion params, with a pydantic response_format
+        replaced by its cached provider schema.
+
+        With budgets, the input of the request is estimated first: the call
+        is rejected with `BudgetExceededError` if it does not fit, otherwise
+        the completion length is capped to what is left after the input and
+        reserved on the budgets, and streams are asked to report their usage.
+        """
+        response_format = kwargs.get("response_format")
+        if is_output_model(response_format):
+            kwargs = {**kwargs, "response_format": get_response_format(response_format)}
+        if not budgets:
+            return kwargs
+
+        input_tokens = (
+            estimate_input_tokens(self.model, messages, tools) if messages else 0
+        )
+        input_token_cost, output_token_cost = get_token_costs(self.model) or (0, 0)
+        input_cost = input_tokens * input_token_cost
+        max_tokens = budgets.reserve(
+            kwargs.get("max_tokens"),
+            input_tokens,
+            input_cost,
+            output_token_cost,
+            get_max_output_tokens(self.model),
+        )
+        if max_tokens is not None:
+            kwargs = {**kwargs, "max_tokens": max_tokens}
+        if stream and "stream_options" not in kwargs:
+            kwargs = {**kwargs, "stream_options": {"include_usage": True}}
+        return kwargs
+
+    def _request_messages(
+        self,
+        history: History,
+        messages: Optional[List[Dict[str, Any]]],
+        tools: Optional[List[Tool]] = None,
+        cache_newest: bool = False,
+    ) -> List[Dict[str, Any]]:
+        """
+        Get the messages to send, with the image policy and the prompt cache
+        breakpoints applied.
+        """
+        if messages is None:
+            messages = history.to_list()
+        if self.image_policy is not None:
+            messages = self.image_policy.apply(messages, self.image_store)
+        elif self.release_images:
+            messages = self.image_store.expand(messages)
+        if self.release_images:
+            # The request now holds the only copies of the data URIs
+            self.image_store.release()
+        if self.prompt_cache is not None:
+            # The tool definitions take one of the breakpoints
+            max_breakpoints = self.prompt_cache.max_breakpoints - (1 if tools else 0)
+            messages = mark_messages(messages, max_breakpoints, cache_newest)
+        return messages
+
+    def _request_tools(
+        self, tools: Optional[List[Tool]]
+    ) -> Optional[List[Dict[str, Any]]]:
+        """
+        Get the tool definitions to send.
+        """
+        if not tools:
+            return None
+        definitions = [tool.definition for tool in tools]
+        if self.prompt_cache is not None:
+            definitions = mark_tools(definitions)
+        return definitions
+
+    @staticmethod
+    def _resolve_prompt_cache(
+        model: str, prompt_caching: Optional[bool]
+    ) -> Optional[PromptCacheSupport]:
+        """
+        Get how to add prompt cache breakpoints, None when none are added.
+        """
+        if prompt_caching is False:
+            return None
+        support = get_prompt_cache_support(model)
+        if support is not None and not support.breakpoints:
+            return None
+        if support is None:
+            return PromptCacheSupport(breakpoints=True) if prompt_caching else None
+        return support
+
+    def _start_turn(
+        self,
+        prompt: Optional[str],
+        images: Optional[List[Image]],
+        messages: Optional[List[Dict[str, Any]]],
+        session_id: Optional[str],
+        stored: Optional[List[Dict[str, Any]]] = None,
+    ) -> Tuple[History, int]:
+        """
+        Get the history a call appends to and add the user message to it.
+        The messages of a session are loaded from the store unless `stored`
+        already holds them.
+
+        Returns:
+            Tuple of (history, number of messages already persisted in it)
+        """
+        if session_id is None:
+            history = self.message_history
+            history_length = len(history)
+        else:
+            if stored is None:
+                stored = self.conversation_store.load(session_id)
+            history = History(stored)
+            history_length = len(history)
+            if not history and self.system_prompt:
+                # New session: the system prompt is persisted with the first turn
+                history.append({"role": "system", "content": self.system_prompt})
+                history_length = 0
+
         if messages is None:
-            messages = self.message_history
             if not prompt:
                 raise ValueError("Prompt is required when messages is None")
-            messages.append(self._prepare_user_message(prompt, images))
-
-        raw_response = await self.async_client(
-            model=self.model,
-            messages=messages,
-            temperature=self.temperature,
-            caching=self.use_cache,
-            stream=stream,
-            tools=[tool.definition for tool in tools] if tools else None,
-            **kwargs,
+            # Session histories are persisted, so their images stay inline
+            history.append(
+                self._prepare_user_message(
+                    prompt, images, by_reference=session_id is None
+                )
+            )
+            if session_id is None:
+                self._prune_images()
+        return history, history_length
+
+    def _prune_images(self) -> None:
+        """
+        Drop the stored images the history no longer references, once the
+        image store is over its size limit.
+        """
+        if self.image_store.over_limit:
+            self.image_store.retain(self.message_history)
+
+    def _parse_response(self, raw_response: Any, response_format: Any) -> Any:
+        """
+        Get the response of a completion, parsed when using a response_format.
+        """
+        if not raw_response.choices:
+            return None
+        choice = raw_response.choices[0]
+        if response_format:
+            return self._parse_structured_output(
+                choice.message.content, response_format, choice.finish_reason
+            )
+        content = choice.message.content
+        return content
+
+    def _record_reask(self, raw_response: Any, budgets: CallBudgets) -> None:
+        """
+        Account for a response whose structured output is being re-asked.
+        """
+        self.output_stats["reasked"] += 1
+        self._record_spend(
+            TokenUsage.from_litellm(getattr(raw_response, "usage", None)),
+            raw_response._hidden_params.get("response_cost") or 0,
+            budgets,
         )
 
-        if stream:
-            return self._parse_streaming_response(raw_response)
+    def _record_spend(
+        self, usage: TokenUsage, cost: float, budgets: CallBudgets
+    ) -> None:
+        """
+        Record the usage and cost of a call on this instance and its budgets.
+        """
+        self.run_cost.append(cost)
+        self.run_usage.append(usage)
+        budgets.record(usage, cost)
+
+        labels = (self.model, current_module.get()[0])
+        for kind in ("input", "output", "cached", "cache_write", "reasoning"):
+            tokens = getattr(usage, f"{kind}_tokens")
+            if tokens:
+                llm_metrics.tokens.inc(*labels, kind, amount=tokens)
+        if cost:
+            llm_metrics.cost.inc(*labels, amount=cost)
+
+    def _reask_params(
+        self,
+        raw_response: Any,
+        error: ValidationError,
+        kwargs: Dict[str, Any],
+        budgets: CallBudgets,
+    ) -> Dict[str, Any]:
+        """
+        Build a request asking the model to fix an invalid structured output.
+
+        Only the invalid output and the validation error are sent, not the
+        conversation.
+        """
+        prompt = REASK_PROMPT.format(
+            output=raw_response.choices[0].message.content,
+            errors=format_validation_error(error),
+        )
+        messages = [{"role": "user", "content": prompt}]
+        return {
+            "model": self.model,
+            "messages": messages,
+            "temperature": self.temperature,
+            "caching": self.use_cache,
+            **self._request_kwargs(kwargs, budgets, messages),
+        }
 
+    def _finish_turn(
+        self,
+        raw_response: Any,
+        response: Any,
+        history: History,
+        budgets: CallBudgets,
+    ) -> LLMResponse:
+        """
+        Add the assistant messages of a parsed response to the history and
+        record its spend. The caller persists the turn when using a session.
+        """
         if raw_response.choices:
             content = raw_response.choices[0].message.content
-            response = (
-                self._parse_structured_output(
-                    content,
-                    kwargs.get("response_format"),
-                )
-                if kwargs.get("response_format")
-                else content
-            )
             cost = raw_response._hidden_params["response_cost"] or 0
             hidden_fields = raw_response._hidden_params
 
             tool_calls = self._parse_tool_calls(
                 raw_response.choices[0].message.tool_calls
             )
-
-            if tool_calls:
-                # Add a well-formed assistant message that contains tool_calls
-                # OpenAI expects `content` to be a string (use empty string when using tool_calls)
-                self.add_message(
-                    {
-                        "role": "assistant",
-                        "content": response or "",
-                        "tool_calls": [
-                            {
-                                "id": tc.id,
-                                "type": "function",
-                                "function": {
-                                    "name": tc.function_name,
-                                    "arguments": json.dumps(tc.args),
-                                },
-                            }
-                            for tc in tool_calls
-                        ],
-                    }
-                )
-
-            if content and not tool_calls:
-                self.add_message(
-                    {
-                        "role": "assistant",
-                        "content": content,
-                    }
-                )
+            history.extend(self._prepare_assistant_messages(content, tool_calls))
         else:
-            response = None
+            content = None
             cost = 0
             hidden_fields = {}
             tool_calls = None
 
-        self.run_cost.append(cost)
+        usage = TokenUsage.from_litellm(getattr(raw_response, "usage", None))
+        self._record_spend(usage, cost, budgets)
+        if self.use_cache:
+            llm_metrics.cache_requests.inc(
+                self.model,
+                current_module.get()[0],
+                "hit" if hidden_fields.get("cache_hit") else "miss",
+            )
 
-        return LLMResponse(
+        return self._build_response(
             response=response,
+            content=content,
             raw_response=raw_response,
+            usage=usage,
             cost=cost,
             hidden_fields=hidden_fields,
             tool_calls=tool_calls,
-            message_history=self.get_history(),
+            history=history,
         )
 
-    def get_history(self) -> List[Dict[str, Any]]:
+    def _build_response(
+        self,
+        history: History,
+        raw_response: Any = None,
+        hidden_fields: Optional[Dict[str, Any]] = None,
+        **fields,
+    ) -> LLMResponse:
         """
-        Get the message history.
+        Build an LLMResponse keeping the fields of the response profile.
         """
-        return self.message_history
+        if self.response_profile == "slim":
+            return LLMResponse(hidden_fields={}, **fields)
+        if self.response_profile == "standard":
+            # A fork shares the messages, nothing is copied until it is read
+            message_history = history.fork()
+        else:
+            message_history = history.to_list()
+        return LLMResponse(
+            raw_response=raw_response,
+            message_history=message_history,
+            hidden_fields=hidden_fields or {},
+            **fields,
+        )
+
+    def _save_turn(
+        self,
+        session_id: Optional[str],
+        history: History,
+        history_length: int,
+    ) -> None:
+        """
+        Persist the messages added during a turn to the session store.
+        """
+        if session_id is not None:
+            self.conversation_store.append(
+                session_id, self.image_store.expand(history[history_length:])
+            )
+
+    async def _asave_turn(
+        self,
+        session_id: Optional[str],
+        history: History,
+        history_length: int,
+    ) -> None:
+        """
+        Async version of `_save_turn`, keeping storage I/O off the event loop.
+        """
+        if session_id is not None:
+            await self.conversation_store.aappend(
+                session_id, self.image_store.expand(history[history_length:])
+            )
 
-    def set_history(self, history: List[Dict[str, Any]]) -> None:
+    def _prepare_assistant_messages(
+        self, content: Optional[str], tool_calls: Optional[List[ToolCall]]
+    ) -> List[Dict[str, Any]]:
+        """
+        Build the assistant messages to add to the history for a response.
+        """
+        if tool_calls:
+            # Add a well-formed assistant message that contains tool_calls
+            # OpenAI expects `content` to be a string (use empty string when using tool_calls)
+            return [
+                {
+                    "role": "assistant",
+                    "content": content or "",
+                    "tool_calls": [
+                        {
+                            "id": tc.id,
+                            "type": "function",
+                            "function": {
+                                "name": tc.function_name,
+                                "arguments": json.dumps(tc.args),
+                            },
+                        }
+                        for tc in tool_calls
+                    ],
+                }
+            ]
+        if content:
+            return [self._prepare_assistant_message(content)]
+        return []
+
+    def get_history(self, session_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Get the message history, or the history of a session.
+        """
+        if session_id is not None:
+            return self.conversation_store.load(session_id)
+        return self.message_history.to_list()
+
+    def set_history(self, history: Union[List[Dict[str, Any]], History]) -> None:
         """
         Set the message history.
         """
+        if not isinstance(history, History):
+            history = History(history)
         self.message_history = history
 
+    def fork(self) -> "LLM":
+        """
+        Create a copy of the LLM whose history branches off the current one.
+
+        The messages so far are shared with the fork, not copied, and the fork
+        tracks its own costs.
+        """
+        forked = super().fork()
+        forked.run_cost = []
+        forked.run_usage = []
+        forked.hedge_cost = []
+        forked.hedge_stats = {"fired": 0, "won": 0}
+        forked.output_stats = {"repaired": 0, "reasked": 0}
+        # Each history prunes the images it no longer references
+        forked.image_store = self.image_store.copy()
+        return forked
+
     def add_message(self, message: Dict[str, Any]) -> None:
         """
         Add a message to the message history.
         """
         self.message_history.append(message)
 
+    def _completion(self, **params) -> Any:
+        """
+        Call the sync client applying the retry policy and circuit breaker.
+        """
+        return call_with_retry(
+            self.sync_client, self.retry_policy, self.circuit_breaker, **params
+        )
+
+    async def _acompletion(self, **params) -> Any:
+        """
+        Call the async client, coalescing identical in-flight requests when
+        the request is deterministic.
+        """
+        if not self._should_coalesce(params):
+            return await self._hedged_acompletion(**params)
+
+        raw_response, shared = await single_flight.do(
+            self._request_key(params), lambda: self._hedged_acompletion(**params)
+        )
+        if shared:
+            # Every caller gets its own copy; the upstream spend (tokens and
+            # cost) belongs to the leader, so budgets and metrics count it once
+            raw_response = copy.deepcopy(raw_response)
+            raw_response.usage = litellm.Usage(
+                prompt_tokens=0, completion_tokens=0, total_tokens=0
+            )
+            raw_response._hidden_params = {
+                **(raw_response._hidden_params or {}),
+                "response_cost": 0,
+                "coalesced": True,
+            }
+        return raw_response
+
+    def _request_key(self, params: Dict[str, Any]) -> str:
+        """
+        Get the coalescing key of a request, reusing the serialized schema of
+        a cached response_format.
+        """
+        response_format = params.get("response_format")
+        if isinstance(response_format, ResponseFormat):
+            params = {**params, "response_format": response_format.serialized}
+        return make_request_key(params)
+
+    def _should_coalesce(self, params: Dict[str, Any]) -> bool:
+        """
+        Check if a request may share an upstream call with identical ones.
+        """
+        if params.get("stream", False) or self.coalesce_requests is False:
+            return False
+        return bool(self.coalesce_requests) or params.get("temperature") == 0
+
+    async def _hedged_acompletion(self, **params) -> Any:
+        """
+        Call the async client applying the retry policy and circuit breaker,
+        hedging the request when a hedge policy is set.
+        """
+        stream = params.get("stream", False)
+        if stream and not self.hedge_policy:
+            return await acall_with_retry(
+                self.async_client, self.retry_policy, self.circuit_breaker, **params
+            )
+
+        # Streams are raced (and measured) on time-to-first-token
+        kind = "ttft" if stream else "latency"
+        histogram = get_latency_histogram(self.model, kind)
+        if not self.hedge_policy:
+            return await self._timed_acompletion(
+                histogram, self.circuit_breaker, **params
+            )
+
+        hedge_model = self.hedge_policy.hedge_model or self.model
+        hedge_params = {
+            **params,
+            **self.hedge_policy.hedge_params,
+            "model": hedge_model,
+        }
+        if hedge_model == self.model:
+            hedge_breaker = self.circuit_breaker
+        else:
+            hedge_breaker = (
+                get_circuit_breaker(hedge_model) if self.circuit_breaker else None
+            )
+
+        outcome = await hedged_call(
+            lambda: self._timed_acompletion(histogram, self.circuit_breaker, **params),
+            lambda: self._timed_acompletion(
+                get_latency_histogram(hedge_model, kind), hedge_breaker, **hedge_params
+            ),
+            self.hedge_policy.get_delay(histogram),
+        )
+        if outcome.hedged:
+            self.hedge_stats["fired"] += 1
+            self.hedge_stats["won"] += int(outcome.hedge_won)
+        for discarded in outcome.discarded:
+            hidden_params = getattr(discarded, "_hidden_params", None) or {}
+            self.hedge_cost.append(hidden_params.get("response_cost") or 0)
+        return outcome.result
+
+    async def _timed_acompletion(
+        self,
+        histogram: LatencyHistogram,
+        breaker: Optional[CircuitBreaker],
+        **params,
+    ) -> Any:
+        """
+        Call the async client and record its latency (or time-to-first-token).
+        """
+        start = time.perf_counter()
+        result = await acall_with_retry(
+            self.async_client, self.retry_policy, breaker, **params
+        )
+        if params.get("stream", False):
+            result = await prefetch_first_chunk(result)
+        histogram.record(time.perf_counter() - start)
+        return result
+
     def get_total_cost(self) -> float:
         """
         Get cost of all runs.
         """
         return sum(self.run_cost)
 
+    def get_total_usage(self) -> TokenUsage:
+        """
+        Get the tokens used by all runs.
+        """
+        return TokenUsage.sum(self.run_usage)
+
+    def get_hedge_cost(self) -> float:
+        """
+        Get the extra cost spent on hedged requests that lost the race.
+        """
+        return sum(self.hedge_cost)
+
     def _parse_structured_output(
-        self, response: str, response_format: BaseModel
+        self,
+        response: str,
+        response_format: BaseModel,
+        finish_reason: Optional[str] = None,
     ) -> BaseModel:
         """
-        Parse a structured output from a response.
+        Parse a structured output from a response, repairing malformed JSON
+        locally when possible.
+
+        Args:
+            finish_reason: Why the model stopped; outputs cut off by the
+                token limit ("length") are not repaired
         """
-        return response_format.model_validate_json(response)
+        try:
+            return validate_output(response, response_format)
+        except ValidationError as error:
+            if not is_json_error(error) or finish_reason == "length":
+                raise
+            repaired = repair_json(response)
+            if repaired is None or repaired == response:
+                raise
+            try:
+                parsed = validate_output(repaired, response_format)
+            except ValidationError:
+                raise error from None
+            self.output_stats["repaired"] += 1
+            return parsed
 
     def _prepare_user_message(
-        self, prompt: str, images: Optional[List[Image]] = None
+        self,
+        prompt: str,
+        images: Optional[List[Image]] = None,
+        by_reference: bool = True,
     ) -> List[Dict[str, Any]]:
         """
         Prepare a user message.
+
+        Args:
+            by_reference: With an image policy or `release_images`, keep
+                references to the images in the image store instead of
+                their data URIs
         """
         if images:
+            # Images are only encoded now, when the request is built
+            image_parts = []
+            for image in images:
+                url, mime_type = image.encode()
+                if by_reference and (
+                    self.image_policy is not None or self.release_images
+                ):
+                    # The history only keeps references, expanded when sending
+                    url = self.image_store.put(
+                        url, image if self.release_images else None
+                    )
+                image_url = {"url": url, "format": mime_type}
+                if image.detail:
+                    image_url["detail"] = image.detail
+                image_parts.append({"type": "image_url", "image_url": image_url})
             return {
                 "role": "user",
-                "content": [
-                    {"type": "text", "text": prompt},
-                    *[
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": image.url,
-                                "format": image.mime_type,
-                            },
-                        }
-                        for image in images
-                    ],
-                ],
+                "content": [{"type": "text", "text": prompt}, *image_parts],
             }
 
         else:
@@ -416,141 +1164,168 @@ class LLM(BaseInferenceModel):
 
         return tool_calls
 
-    async def _parse_streaming_response(self, stream_response) -> List[Dict[str, Any]]:
-        id = None
-        response = ""
-        tool_call_deltas = []  # store last values for all tool calls (id, function_name, function_arguments)
-        latest_tool_calls = []
-
-        # Start cost tracking
-        cost_tracker.start_cost_capture()
-
-        async for chunk in stream_response:
-            id = chunk.id if chunk.id else id
-
-            choice_content = (
-                chunk.choices[0].delta.content
-                if chunk.choices[0].delta.content
-                else None
-            )
-            # print(f"chunk: {chunk}")
-            # print(f"choice_content: {choice_content}")
-            if choice_content:
-                # model text response
-                response += choice_content or ""
-
-            # parsing tool calls
-            if not chunk.choices[0].delta.tool_calls:
-                yield LLMStreamingResponse(
-                    id=id,
-                    response=response,
-                    tool_calls=latest_tool_calls,
+    async def _parse_streaming_response(
+        self,
+        stream_response,
+        history: History,
+        history_length: int,
+        session_id: Optional[str] = None,
+        response_format: Optional[Any] = None,
+        budgets: Optional[CallBudgets] = None,
+        timer: Optional[PhaseTimer] = None,
+    ) -> List[Dict[str, Any]]:
+        budgets = budgets or CallBudgets()
+        try:
+            timer = timer or PhaseTimer()
+            first_chunk = True
+            id = None
+            response = ""
+            # Only reported by the last chunk, when requested with stream_options
+            # (added automatically when a budget applies)
+            usage = TokenUsage()
+            # Structured output: yield partial model instances as the JSON streams in
+            structured = is_output_model(response_format)
+            json_parser = PartialJSONParser() if structured else None
+            partial = None
+            finish_reason = None
+            tool_call_deltas = []  # store last values for all tool calls (id, function_name, function_arguments)
+            latest_tool_calls = []
+
+            # Start cost tracking
+            cost_tracker.start_cost_capture()
+
+            async for chunk in stream_response:
+                if first_chunk:
+                    timer.mark("ttft")
+                    first_chunk = False
+                id = chunk.id if chunk.id else id
+                if getattr(chunk, "usage", None):
+                    usage = TokenUsage.from_litellm(chunk.usage)
+                if not chunk.choices:
+                    continue
+                finish_reason = chunk.choices[0].finish_reason or finish_reason
+
+                choice_content = (
+                    chunk.choices[0].delta.content
+                    if chunk.choices[0].delta.content
+                    else None
                 )
-                continue
-
-            for i, tool_call_delta in enumerate(chunk.choices[0].delta.tool_calls):
-                if tool_call_delta:
-                    if i >= len(tool_call_deltas):
-                        tool_call_deltas.append(
-                            ToolCallDelta(
-                                id=None, function_name=None, function_arguments=""
+                # print(f"chunk: {chunk}")
+                # print(f"choice_content: {choice_content}")
+                if choice_content:
+                    # model text response
+                    response += choice_content or ""
+                    if structured:
+                        json_parser.scan(choice_content)
+                        # Parsing reads the whole text, so it is spaced out
+                        if json_parser.is_due():
+                            partial = partial_model(response_format, json_parser.value)
+
+                # parsing tool calls
+                if not chunk.choices[0].delta.tool_calls:
+                    yield LLMStreamingResponse(
+                        id=id,
+                        response=partial if structured else response,
+                        tool_calls=latest_tool_calls,
+                    )
+                    continue
+
+                for i, tool_call_delta in enumerate(chunk.choices[0].delta.tool_calls):
+                    if tool_call_delta:
+                        if i >= len(tool_call_deltas):
+                            tool_call_deltas.append(
+                                ToolCallDelta(
+                                    id=None, function_name=None, function_arguments=""
+                                )
                             )
+                        tool_call_deltas[i].id = (
+                            tool_call_delta.id or tool_call_deltas[i].id
                         )
-                    tool_call_deltas[i].id = (
-                        tool_call_delta.id or tool_call_deltas[i].id
-                    )
-                    tool_call_deltas[i].function_name = (
-                        tool_call_delta.function.name
-                        or tool_call_deltas[i].function_name
-                    )
-                    tool_call_deltas[i].function_arguments += (
-                        tool_call_delta.function.arguments or ""
-                    )
-
-                    try:
-                        args = (
-                            json.loads(tool_call_deltas[i].function_arguments)
-                            if tool_call_deltas[i].function_arguments
-                            else {}
+                        tool_call_deltas[i].function_name = (
+                            tool_call_delta.function.name
+                            or tool_call_deltas[i].function_name
                         )
-                    except json.decoder.JSONDecodeError:
-                        logger.warning(
-                            f"Failed to parse tool call arguments: {tool_call_deltas[i].function_arguments}"
+                        tool_call_deltas[i].function_arguments += (
+                            tool_call_delta.function.arguments or ""
                         )
-                        args = {}
 
-                    # Create the new tool call
-                    new_tool_call = ToolCall(
-                        function_name=tool_call_deltas[i].function_name,
-                        args=args,
-                        id=tool_call_deltas[i].id,
-                    )
+                        try:
+                            args = (
+                                json.loads(tool_call_deltas[i].function_arguments)
+                                if tool_call_deltas[i].function_arguments
+                                else {}
+                            )
+                        except json.decoder.JSONDecodeError:
+                            logger.warning(
+                                f"Failed to parse tool call arguments: {tool_call_deltas[i].function_arguments}"
+                            )
+                            args = {}
 
-                    # Check if a tool call with the same ID already exists
-                    existing_index = None
-                    for idx, existing_tool_call in enumerate(latest_tool_calls):
-                        if existing_tool_call.id == new_tool_call.id:
-                            existing_index = idx
-                            break
-
-                    # Replace existing or append new
-                    if existing_index is not None:
-                        latest_tool_calls[existing_index] = new_tool_call
-                    else:
-                        latest_tool_calls.append(new_tool_call)
-                    yield LLMStreamingResponse(
-                        id=id,
-                        response=response,
-                        tool_calls=latest_tool_calls,
-                    )
+                        # Create the new tool call
+                        new_tool_call = ToolCall(
+                            function_name=tool_call_deltas[i].function_name,
+                            args=args,
+                            id=tool_call_deltas[i].id,
+                        )
 
-        # adding tool calls and response to history
-        if latest_tool_calls:
-            # Add a well-formed assistant message that contains tool_calls
-            # OpenAI expects `content` to be a string (use empty string when using tool_calls)
-            self.add_message(
-                {
-                    "role": "assistant",
-                    "content": response or "",
-                    "tool_calls": [
-                        {
-                            "id": tc.id,
-                            "type": "function",
-                            "function": {
-                                "name": tc.function_name,
-                                "arguments": json.dumps(tc.args),
-                            },
-                        }
-                        for tc in latest_tool_calls
-                    ],
-                }
-            )
+                        # Check if a tool call with the same ID already exists
+                        existing_index = None
+                        for idx, existing_tool_call in enumerate(latest_tool_calls):
+                            if existing_tool_call.id == new_tool_call.id:
+                                existing_index = idx
+                                break
+
+                        # Replace existing or append new
+                        if existing_index is not None:
+                            latest_tool_calls[existing_index] = new_tool_call
+                        else:
+                            latest_tool_calls.append(new_tool_call)
+                        yield LLMStreamingResponse(
+                            id=id,
+                            response=response,
+                            tool_calls=latest_tool_calls,
+                        )
 
-        if response and not latest_tool_calls:
-            self.add_message(
-                {
-                    "role": "assistant",
-                    "content": response,
-                }
+            timer.mark("stream")
+
+            # adding tool calls and response to history
+            history.extend(
+                self._prepare_assistant_messages(response, latest_tool_calls)
             )
+            await self._asave_turn(session_id, history, history_length)
 
-        # Wait for cost callback to complete (with timeout)
-        await cost_tracker.wait_for_cost(timeout=2.0)
+            # Wait for cost callback to complete (with timeout)
+            await cost_tracker.wait_for_cost(timeout=2.0)
 
-        # Stop cost tracking and restore stdout
-        cost_tracker.stop_cost_capture()
+            # Stop cost tracking and restore stdout
+            cost_tracker.stop_cost_capture()
 
-        # Get captured cost
-        captured_cost = cost_tracker.get_latest_cost()
-        print(f"captured_cost: {captured_cost}")
+            # Get captured cost
+            captured_cost = cost_tracker.get_latest_cost()
+            print(f"captured_cost: {captured_cost}")
 
-        # Add cost to run_cost tracking
-        self.run_cost.append(captured_cost)
+            self._record_spend(usage, captured_cost, budgets)
+            timer.mark("cost")
 
-        yield LLMResponse(
-            response=response,
-            tool_calls=latest_tool_calls,
-            message_history=self.get_history(),
-            cost=captured_cost,
-            hidden_fields={},
-        )
+            final_response = self._build_response(
+                response=(
+                    self._parse_structured_output(
+                        response, response_format, finish_reason
+                    )
+                    if structured and response
+                    else response
+                ),
+                content=response,
+                tool_calls=latest_tool_calls,
+                history=history,
+                usage=usage,
+                cost=captured_cost,
+            )
+            timer.mark("parse")
+            final_response.timings = timer.finish()
+            # The tracing wrapper returned when the stream started
+            self._record_call(final_response.timings)
+            yield final_response
+        finally:
+            # Nothing is left reserved once the usage is recorded
+            budgets.release()
@@ -0,0 +1,109 @@
+"""
+Provider prompt-caching hints for the stable prefix of requests.
+
+Some providers (Anthropic, and Claude on Bedrock and Vertex AI) only cache a
+prompt prefix that ends at an explicit `cache_control` breakpoint; others
+(OpenAI, Gemini, DeepSeek) cache long prefixes automatically. A per-model
+capability table decides if breakpoints are added, on the system prompt, the
+tool definitions and the last completed turn. The newest message is only
+marked when the next request is known to extend it (the iterations of a
+ToolLoop): otherwise one-shot calls would pay for a cache write never read.
+"""
+
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+CACHE_CONTROL = {"type": "ephemeral"}
+
+
+@dataclass(frozen=True)
+class PromptCacheSupport:
+    """
+    How a model caches prompts.
+
+    Args:
+        breakpoints: Whether cached prefixes must be marked with `cache_control`
+        max_breakpoints: Maximum number of breakpoints per request
+    """
+
+    breakpoints: bool
+    max_breakpoints: int = 4
+
+
+_MARKED = PromptCacheSupport(breakpoints=True)
+_AUTOMATIC = PromptCacheSupport(breakpoints=False, max_breakpoints=0)
+
+# Matched in order against the lowercased model name
+PROMPT_CACHE_CAPABILITIES: List[Tuple[str, PromptCacheSupport]] = [
+    ("claude", _MARKED),
+    ("anthropic", _MARKED),
+    ("gpt-", _AUTOMATIC),
+    ("openai/o", _AUTOMATIC),
+    ("gemini", _AUTOMATIC),
+    ("deepseek", _AUTOMATIC),
+]
+
+
+def get_prompt_cache_support(model: str) -> Optional[PromptCacheSupport]:
+    """Look a model up in the capability table (None if unknown)."""
+    name = model.lower()
+    for pattern, support in PROMPT_CACHE_CAPABILITIES:
+        if pattern in name:
+            return support
+    return None
+
+
+def mark_messages(
+    messages: List[Dict[str, Any]],
+    max_breakpoints: int = 3,
+    mark_newest: bool = False,
+) -> List[Dict[str, Any]]:
+    """
+    Add breakpoints on the system prompt and the last completed turn, and
+    on the newest message if `mark_newest`.
+
+    Marked messages are copies; the given list and its messages are left
+    untouched.
+    """
+    indexes = []
+    if messages and messages[0].get("role") == "system":
+        indexes.append(0)
+    # The newest message writes the prefix the next request reads; the last
+    # completed turn ends with the last assistant message (or, when it only
+    # holds tool calls, with the message it answered)
+    last = len(messages) - 1
+    completed = next(
+        (
+            index
+            for index in range(last - 1, 0, -1)
+            if messages[index].get("role") == "assistant"
+        ),
+        0,
+    )
+    if completed and not messages[completed].get("content"):
+        completed -= 1
+    if completed > 0 and messages[completed].get("content"):
+        indexes.append(completed)
+    if mark_newest and messages and messages[last].get("content"):
+        indexes.append(last)
+
+    marked = list(messages)
+    for index in sorted(set(indexes))[:max_breakpoints]:
+        marked[index] = _mark_message(messages[index])
+    return marked
+
+
+def mark_tools(tools: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Add a breakpoint after the tool definitions."""
+    if not tools:
+        return tools
+    return [*tools[:-1], {**tools[-1], "cache_control": CACHE_CONTROL}]
+
+
+def _mark_message(message: Dict[str, Any]) -> Dict[str, Any]:
+    content = message["content"]
+    if isinstance(content, list):
+        parts = list(content)
+        parts[-1] = {**parts[-1], "cache_control": CACHE_CONTROL}
+        return {**message, "content": parts}
+    return {**message, "cache_control": CACHE_CONTROL}
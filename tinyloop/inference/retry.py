@@ -0,0 +1,275 @@
+"""
+Retry policy and circuit breaker for LLM inference calls.
+"""
+
+import asyncio
+import logging
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from tinyloop.utils.metrics import current_module, llm_metrics
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUS_CODES = (408, 409, 429, 500, 502, 503, 504)
+
+
+class CircuitOpenError(Exception):
+    """Raised when calls to a model are rejected because its circuit is open."""
+
+    def __init__(self, model: str, retry_in: float):
+        self.model = model
+        self.retry_in = retry_in
+        super().__init__(
+            f"Circuit breaker for model '{model}' is open, retry in {retry_in:.1f}s"
+        )
+
+
+@dataclass
+class RetryPolicy:
+    """
+    Jittered exponential backoff for transient provider errors.
+
+    Args:
+        max_retries: Number of retries after the first attempt
+        initial_delay: Base delay in seconds before the first retry
+        max_delay: Upper bound for the computed backoff delay
+        multiplier: Growth factor of the delay between attempts
+        jitter: Fraction of the delay that is randomized (0 disables jitter)
+        retry_on_status: HTTP status codes considered transient
+        respect_retry_after: Whether to honor `Retry-After` headers
+        max_retry_after: Upper bound for delays requested by `Retry-After`
+    """
+
+    max_retries: int = 3
+    initial_delay: float = 0.5
+    max_delay: float = 30.0
+    multiplier: float = 2.0
+    jitter: float = 1.0
+    retry_on_status: Tuple[int, ...] = RETRYABLE_STATUS_CODES
+    respect_retry_after: bool = True
+    max_retry_after: float = 60.0
+
+    def is_retryable(self, exc: BaseException) -> bool:
+        """Check if an exception is a transient error worth retrying."""
+        if isinstance(exc, (asyncio.TimeoutError, ConnectionError)):
+            return True
+        status_code = getattr(exc, "status_code", None)
+        if status_code is None:
+            return False
+        try:
+            return int(status_code) in self.retry_on_status
+        except (TypeError, ValueError):
+            return False
+
+    def get_delay(self, attempt: int, exc: Optional[BaseException] = None) -> float:
+        """Get the delay before retry number `attempt` (starting at 1)."""
+        if exc is not None and self.respect_retry_after:
+            retry_after = get_retry_after(exc)
+            if retry_after is not None:
+                return min(retry_after, self.max_retry_after)
+
+        delay = min(
+            self.initial_delay * self.multiplier ** (attempt - 1), self.max_delay
+        )
+        if self.jitter:
+            delay = delay * (1 - self.jitter) + random.uniform(0, delay * self.jitter)
+        return delay
+
+
+@dataclass
+class CircuitBreaker:
+    """
+    Per-model circuit breaker that fails fast while a provider is down.
+
+    The breaker opens after `failure_threshold` consecutive transient failures.
+    Once `recovery_timeout` seconds have passed, a single probe call is let
+    through; its outcome closes the circuit again or re-opens it.
+
+    Args:
+        model: Model name the breaker protects
+        failure_threshold: Consecutive failures before the circuit opens
+        recovery_timeout: Seconds to wait before probing an open circuit
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    model: str = ""
+    failure_threshold: int = 5
+    recovery_timeout: float = 30.0
+    state: str = field(default="closed", init=False)
+    failures: int = field(default=0, init=False)
+    opened_at: float = field(default=0.0, init=False)
+    _lock: threading.Lock = field(
+        default_factory=threading.Lock, init=False, repr=False
+    )
+
+    def before_call(self) -> None:
+        """Raise `CircuitOpenError` if the call must not be attempted."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            elapsed = time.monotonic() - self.opened_at
+            if self.state == self.OPEN and elapsed >= self.recovery_timeout:
+                # Let exactly one probe through
+                self.state = self.HALF_OPEN
+                return
+            raise CircuitOpenError(self.model, max(self.recovery_timeout - elapsed, 0))
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning(f"Circuit breaker opened for model '{self.model}'")
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self.opened_at = 0.0
+
+
+_DEFAULT_POLICY = RetryPolicy()
+
+# Breakers are shared by every LLM instance that targets the same model
+_circuit_breakers: Dict[str, CircuitBreaker] = {}
+_circuit_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(
+    model: str, failure_threshold: int = 5, recovery_timeout: float = 30.0
+) -> CircuitBreaker:
+    """Get the shared circuit breaker for a model, creating it if needed."""
+    with _circuit_breakers_lock:
+        breaker = _circuit_breakers.get(model)
+        if breaker is None:
+            breaker = CircuitBreaker(
+                model=model,
+                failure_threshold=failure_threshold,
+                recovery_timeout=recovery_timeout,
+            )
+            _circuit_breakers[model] = breaker
+        return breaker
+
+
+def get_retry_after(exc: BaseException) -> Optional[float]:
+    """Extract the delay requested by a `Retry-After` header, if any."""
+    headers = None
+    response = getattr(exc, "response", None)
+    if response is not None:
+        headers = getattr(response, "headers", None)
+    if not headers:
+        headers = getattr(exc, "litellm_response_headers", None) or getattr(
+            exc, "headers", None
+        )
+    if not headers:
+        return None
+
+    try:
+        headers = {str(k).lower(): v for k, v in dict(headers).items()}
+        retry_after_ms = headers.get("retry-after-ms")
+        if retry_after_ms is not None:
+            return max(float(retry_after_ms) / 1000, 0.0)
+
+        retry_after = headers.get("retry-after")
+        if retry_after is None:
+            return None
+        try:
+            return max(float(retry_after), 0.0)
+        except ValueError:
+            # HTTP-date format
+            retry_at = parsedate_to_datetime(retry_after)
+            return max(retry_at.timestamp() - time.time(), 0.0)
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+def _next_delay(
+    exc: Exception,
+    attempt: int,
+    policy: Optional[RetryPolicy],
+    breaker: Optional[CircuitBreaker],
+    model: Optional[str],
+) -> Optional[float]:
+    """Record a failed attempt and get the delay before retrying, or None to give up."""
+    retryable = (policy or _DEFAULT_POLICY).is_retryable(exc)
+    if breaker:
+        # Non-transient errors (bad request, auth...) mean the provider is up
+        if retryable:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+    if not policy or not retryable or attempt >= policy.max_retries:
+        return None
+
+    delay = policy.get_delay(attempt + 1, exc)
+    llm_metrics.retries.inc(model or "", current_module.get()[0])
+    logger.warning(
+        f"Retrying {model} in {delay:.2f}s "
+        f"(attempt {attempt + 1}/{policy.max_retries}): {exc}"
+    )
+    return delay
+
+
+def call_with_retry(
+    func: Callable[..., Any],
+    policy: Optional[RetryPolicy] = None,
+    breaker: Optional[CircuitBreaker] = None,
+    **kwargs,
+) -> Any:
+    """Call `func(**kwargs)` applying the retry policy and circuit breaker."""
+    attempt = 0
+    while True:
+        if breaker:
+            breaker.before_call()
+        try:
+            result = func(**kwargs)
+        except Exception as e:
+            delay = _next_delay(e, attempt, policy, breaker, kwargs.get("model"))
+            if delay is None:
+                raise
+            attempt += 1
+            time.sleep(delay)
+            continue
+        if breaker:
+            breaker.record_success()
+        return result
+
+
+async def acall_with_retry(
+    func: Callable[..., Any],
+    policy: Optional[RetryPolicy] = None,
+    breaker: Optional[CircuitBreaker] = None,
+    **kwargs,
+) -> Any:
+    """Async version of `call_with_retry`."""
+    attempt = 0
+    while True:
+        if breaker:
+            breaker.before_call()
+        try:
+            result = await func(**kwargs)
+        except Exception as e:
+            delay = _next_delay(e, attempt, policy, breaker, kwargs.get("model"))
+            if delay is None:
+                raise
+            attempt += 1
+            await asyncio.sleep(delay)
+            continue
+        if breaker:
+            breaker.record_success()
+        return result
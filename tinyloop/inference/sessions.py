@@ -0,0 +1,289 @@
+"""
+Session-keyed conversation stores.
+
+A conversation store keeps one message history per session id so a single
+LLM instance can serve many users. Persistent backends only keep a small LRU
+cache of hot sessions in memory and load older sessions lazily on access.
+Their async methods run the storage I/O in a worker thread.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ConversationStore(ABC):
+    """
+    Abstract base class for conversation stores.
+
+    Subclasses implement the storage primitives; this class adds an LRU cache
+    of recently used sessions in front of them.
+
+    Args:
+        cache_size: Number of sessions kept in memory
+    """
+
+    def __init__(self, cache_size: int = 128):
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, List[Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.RLock()
+
+    def load(self, session_id: str) -> List[Dict[str, Any]]:
+        """
+        Get a copy of the messages of a session (empty if unknown).
+        """
+        with self._lock:
+            messages = self._cache.get(session_id)
+            if messages is None:
+                messages = self._read(session_id)
+                if messages is None:
+                    return []
+                self._cache_put(session_id, messages)
+            else:
+                self._cache.move_to_end(session_id)
+            return list(messages)
+
+    def append(self, session_id: str, messages: List[Dict[str, Any]]) -> None:
+        """
+        Append messages to a session.
+        """
+        if not messages:
+            return
+        with self._lock:
+            self._append(session_id, messages)
+            cached = self._cache.get(session_id)
+            if cached is not None:
+                cached.extend(messages)
+                self._cache.move_to_end(session_id)
+            elif self._read_is_cheap():
+                self._cache_put(session_id, list(messages))
+
+    def replace(self, session_id: str, messages: List[Dict[str, Any]]) -> None:
+        """
+        Replace all the messages of a session.
+        """
+        with self._lock:
+            self._replace(session_id, messages)
+            self._cache_put(session_id, list(messages))
+
+    def delete(self, session_id: str) -> None:
+        """
+        Delete a session.
+        """
+        with self._lock:
+            self._cache.pop(session_id, None)
+            self._delete(session_id)
+
+    async def aload(self, session_id: str) -> List[Dict[str, Any]]:
+        """
+        Async version of `load`, not blocking the event loop on storage I/O.
+        """
+        if self._io_is_blocking():
+            return await asyncio.to_thread(self.load, session_id)
+        return self.load(session_id)
+
+    async def aappend(self, session_id: str, messages: List[Dict[str, Any]]) -> None:
+        """
+        Async version of `append`, not blocking the event loop on storage I/O.
+        """
+        if self._io_is_blocking():
+            await asyncio.to_thread(self.append, session_id, messages)
+        else:
+            self.append(session_id, messages)
+
+    def __contains__(self, session_id: str) -> bool:
+        with self._lock:
+            return session_id in self._cache or self._read(session_id) is not None
+
+    def _cache_put(self, session_id: str, messages: List[Dict[str, Any]]) -> None:
+        self._cache[session_id] = messages
+        self._cache.move_to_end(session_id)
+        while len(self._cache) > self.cache_size:
+            evicted_id, evicted = self._cache.popitem(last=False)
+            self._on_evict(evicted_id, evicted)
+
+    def _on_evict(self, session_id: str, messages: List[Dict[str, Any]]) -> None:
+        """Called when a session leaves the in-memory cache."""
+
+    def _read_is_cheap(self) -> bool:
+        """Whether sessions appended to without being loaded should be cached."""
+        return False
+
+    def _io_is_blocking(self) -> bool:
+        """Whether the storage primitives block, e.g. on disk or network I/O."""
+        return True
+
+    @abstractmethod
+    def _read(self, session_id: str) -> Optional[List[Dict[str, Any]]]:
+        """Read a session from storage, None if it does not exist."""
+        raise NotImplementedError("Subclasses must implement this method")
+
+    @abstractmethod
+    def _append(self, session_id: str, messages: List[Dict[str, Any]]) -> None:
+        raise NotImplementedError("Subclasses must implement this method")
+
+    @abstractmethod
+    def _replace(self, session_id: str, messages: List[Dict[str, Any]]) -> None:
+        raise NotImplementedError("Subclasses must implement this method")
+
+    @abstractmethod
+    def _delete(self, session_id: str) -> None:
+        raise NotImplementedError("Subclasses must implement this method")
+
+
+class InMemoryConversationStore(ConversationStore):
+    """
+    Conversation store that keeps sessions in memory only.
+
+    The least recently used sessions are dropped once `max_sessions` is reached.
+
+    Args:
+        max_sessions: Maximum number of sessions kept
+    """
+
+    def __init__(self, max_sessions: int = 10_000):
+        super().__init__(cache_size=max_sessions)
+
+    def _on_evict(self, session_id: str, messages: List[Dict[str, Any]]) -> None:
+        logger.debug(f"Evicted session '{session_id}' ({len(messages)} messages)")
+
+    def _read_is_cheap(self) -> bool:
+        return True
+
+    def _io_is_blocking(self) -> bool:
+        return False
+
+    def _read(self, session_id: str) -> Optional[List[Dict[str, Any]]]:
+        # Everything that exists is in the cache
+        return None
+
+    def _append(self, session_id: str, messages: List[Dict[str, Any]]) -> None:
+        pass
+
+    def _replace(self, session_id: str, messages: List[Dict[str, Any]]) -> None:
+        pass
+
+    def _delete(self, session_id: str) -> None:
+        pass
+
+
+class SQLiteConversationStore(ConversationStore):
+    """
+    Conversation store backed by a SQLite database.
+
+    Args:
+        path: Database file path (":memory:" for a throwaway database)
+        cache_size: Number of sessions kept in memory
+    """
+
+    def __init__(self, path: str, cache_size: int = 128):
+        super().__init__(cache_size=cache_size)
+        self.path = path
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS messages ("
+                " session_id TEXT NOT NULL,"
+                " position INTEGER NOT NULL,"
+                " message TEXT NOT NULL,"
+                " PRIMARY KEY (session_id, position))"
+            )
+
+    def _read(self, session_id: str) -> Optional[List[Dict[str, Any]]]:
+        rows = self._connection.execute(
+            "SELECT message FROM messages WHERE session_id = ? ORDER BY position",
+            (session_id,),
+        ).fetchall()
+        if not rows:
+            return None
+        return [json.loads(row[0]) for row in rows]
+
+    def _append(self, session_id: str, messages: List[Dict[str, Any]]) -> None:
+        with self._connection:
+            (start,) = self._connection.execute(
+                "SELECT COALESCE(MAX(position) + 1, 0) FROM messages"
+                " WHERE session_id = ?",
+                (session_id,),
+            ).fetchone()
+            self._connection.executemany(
+                "INSERT INTO messages (session_id, position, message) VALUES (?, ?, ?)",
+                [
+                    (session_id, start + i, json.dumps(message))
+                    for i, message in enumerate(messages)
+                ],
+            )
+
+    def _replace(self, session_id: str, messages: List[Dict[str, Any]]) -> None:
+        with self._connection:
+            self._connection.execute(
+                "DELETE FROM messages WHERE session_id = ?", (session_id,)
+            )
+            self._connection.executemany(
+                "INSERT INTO messages (session_id, position, message) VALUES (?, ?, ?)",
+                [
+                    (session_id, i, json.dumps(message))
+                    for i, message in enumerate(messages)
+                ],
+            )
+
+    def _delete(self, session_id: str) -> None:
+        with self._connection:
+            self._connection.execute(
+                "DELETE FROM messages WHERE session_id = ?", (session_id,)
+            )
+
+    def close(self) -> None:
+        self._connection.close()
+
+
+class FileConversationStore(ConversationStore):
+    """
+    Conversation store that keeps each session in an append-only JSONL file.
+
+    Args:
+        directory: Directory holding one file per session
+        cache_size: Number of sessions kept in memory
+    """
+
+    def __init__(self, directory: str, cache_size: int = 128):
+        super().__init__(cache_size=cache_size)
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, session_id: str) -> str:
+        # Session ids are user provided, never use them as file names directly
+        digest = hashlib.sha256(session_id.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, f"{digest}.jsonl")
+
+    def _read(self, session_id: str) -> Optional[List[Dict[str, Any]]]:
+        path = self._path(session_id)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as file:
+            return [json.loads(line) for line in file if line.strip()]
+
+    def _append(self, session_id: str, messages: List[Dict[str, Any]]) -> None:
+        with open(self._path(session_id), "a", encoding="utf-8") as file:
+            file.writelines(json.dumps(message) + "\n" for message in messages)
+
+    def _replace(self, session_id: str, messages: List[Dict[str, Any]]) -> None:
+        path = self._path(session_id)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            file.writelines(json.dumps(message) + "\n" for message in messages)
+        os.replace(tmp_path, path)
+
+    def _delete(self, session_id: str) -> None:
+        try:
+            os.remove(self._path(session_id))
+        except FileNotFoundError:
+            pass
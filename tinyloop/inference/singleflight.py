@@ -0,0 +1,78 @@
+"""
+Single-flight coalescing of identical in-flight requests.
+
+Concurrent requests with the same key share one upstream call: the first
+caller (the leader) performs it and every other caller awaits its result.
+"""
+
+import asyncio
+import hashlib
+import json
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+
+def make_request_key(params: Dict[str, Any]) -> str:
+    """Build a stable hash of completion params (model, messages, options)."""
+    payload = json.dumps(params, sort_keys=True, default=repr)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class SingleFlight:
+    """
+    Deduplicates concurrent async calls that share the same key.
+
+    Calls are only coalesced while in flight: once the leader finishes, the
+    next call with the same key goes upstream again.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Tuple[int, Hashable], asyncio.Future] = {}
+
+    async def do(
+        self, key: Hashable, func: Callable[[], Awaitable[Any]]
+    ) -> Tuple[Any, bool]:
+        """
+        Run `func` unless an identical call is in flight.
+
+        Returns:
+            Tuple of (result, shared), shared being True when the result
+            comes from another caller's upstream call
+        """
+        loop = asyncio.get_running_loop()
+        call_key = (id(loop), key)
+
+        future = self._calls.get(call_key)
+        if future is not None:
+            try:
+                return await asyncio.shield(future), True
+            except asyncio.CancelledError:
+                # The leader was cancelled, not us: do the call ourselves
+                if future.cancelled() and not asyncio.current_task().cancelling():
+                    return await func(), False
+                raise
+
+        future = loop.create_future()
+        self._calls[call_key] = future
+        try:
+            result = await func()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved in case nobody else was waiting
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            del self._calls[call_key]
+
+    def in_flight(self) -> int:
+        """Get the number of upstream calls currently in flight."""
+        return len(self._calls)
+
+
+# Shared by every LLM instance so identical requests from different users coalesce
+single_flight = SingleFlight()
@@ -0,0 +1,121 @@
+"""
+Per-phase latency breakdown of LLM calls.
+
+Each call splits its wall time into consecutive phases (message preparation,
+tool definitions, network wait, time-to-first-token, parsing, tracing...),
+attached to the response as `timings` and aggregated process-wide so
+percentiles can be reported per model and phase.
+"""
+
+import contextvars
+import threading
+import time
+from typing import Dict, Iterable, Optional, Tuple
+
+from tinyloop.inference.hedging import LatencyHistogram
+
+# Phases, in the order they happen during a call
+PHASES = (
+    "prepare",  # history, user message, images, request params
+    "tools",  # tool definitions
+    "network",  # waiting for the provider (until the stream starts when streaming)
+    "ttft",  # first streamed chunk
+    "stream",  # remaining streamed chunks
+    "parse",  # parsing, validation, history update
+    "cost",  # waiting for the streaming cost callback
+    "tracing",  # tracing decorators around the call
+)
+
+# Set by the tracing wrapper of LLM.__call__/acall to the time it was entered
+call_started: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar(
+    "tinyloop_call_started", default=None
+)
+
+
+class PhaseTimer:
+    """
+    Splits the wall time of a call into consecutive phases.
+
+    Example:
+        timer = PhaseTimer()
+        messages = prepare()
+        timer.mark("prepare")
+        response = send(messages)
+        timer.mark("network")
+        timings = timer.finish()  # {"prepare": ..., "network": ..., "total": ...}
+    """
+
+    __slots__ = ("phases", "start", "_last")
+
+    def __init__(self, start: Optional[float] = None):
+        self.start = time.perf_counter() if start is None else start
+        self._last = self.start
+        self.phases: Dict[str, float] = {}
+
+    def mark(self, phase: str) -> None:
+        """End the current phase, adding its time to `phase`."""
+        now = time.perf_counter()
+        self.phases[phase] = self.phases.get(phase, 0.0) + now - self._last
+        self._last = now
+
+    def finish(self) -> Dict[str, float]:
+        """Get the phases, with the total wall time since the start."""
+        self.phases["total"] = self._last - self.start
+        return self.phases
+
+
+class PhaseStats:
+    """
+    Process-wide rolling percentiles of phase timings, per model.
+
+    Args:
+        window: Number of recent samples kept per model and phase
+    """
+
+    def __init__(self, window: int = 1000):
+        self.window = window
+        self._histograms: Dict[Tuple[str, str], LatencyHistogram] = {}
+        self._lock = threading.Lock()
+
+    def _histogram(self, model: str, phase: str) -> LatencyHistogram:
+        key = (model, phase)
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(
+                    key, LatencyHistogram(self.window)
+                )
+        return histogram
+
+    def record(self, model: str, timings: Dict[str, float]) -> None:
+        for phase, seconds in timings.items():
+            self._histogram(model, phase).record(seconds)
+
+    def percentiles(
+        self, model: str, phase: str, qs: Iterable[float] = (0.5, 0.9, 0.99)
+    ) -> Dict[str, Optional[float]]:
+        """Get percentiles (0-1) of a phase, e.g. {"p50": 0.8, "p90": 1.4}."""
+        histogram = self._histograms.get((model, phase))
+        return {
+            f"p{q * 100:g}": histogram.percentile(q) if histogram else None for q in qs
+        }
+
+    def report(
+        self, qs: Iterable[float] = (0.5, 0.9, 0.99)
+    ) -> Dict[str, Dict[str, Dict[str, Optional[float]]]]:
+        """Get the percentiles of every model and phase seen so far."""
+        qs = tuple(qs)
+        with self._lock:
+            keys = sorted(self._histograms)
+        report: Dict[str, Dict[str, Dict[str, Optional[float]]]] = {}
+        for model, phase in keys:
+            report.setdefault(model, {})[phase] = self.percentiles(model, phase, qs)
+        return report
+
+    def reset(self) -> None:
+        with self._lock:
+            self._histograms.clear()
+
+
+# Shared by every LLM instance
+phase_stats = PhaseStats()
@@ -1,10 +1,10 @@
 from abc import abstractmethod
-from typing import List, Optional
+from typing import Any, List, Optional
 
 import mlflow
 from pydantic import BaseModel
 
-from tinyloop.features.function_calling import Tool
+from tinyloop.features.function_calling import Tool, ToolArgumentsError
 from tinyloop.inference.litellm import LLM, ToolCall
 
 mlflow.config.enable_async_logging(True)
@@ -40,6 +40,30 @@ class BaseLoop:
     async def acall(self, prompt: str, **kwargs):
         raise NotImplementedError("Subclasses must implement this method")
 
+    def _run_tool_call(self, tool_call: ToolCall) -> Any:
+        """
+        Run a tool call, returning errors caused by the model as the response
+        so it can correct itself.
+        """
+        tool = self.tools_map.get(tool_call.function_name)
+        if tool is None:
+            return f"Unknown tool '{tool_call.function_name}'"
+        try:
+            args = tool.validate_args(tool_call.args)
+        except ToolArgumentsError as e:
+            return str(e)
+        return tool(**args)
+
+    async def _arun_tool_call(self, tool_call: ToolCall) -> Any:
+        tool = self.tools_map.get(tool_call.function_name)
+        if tool is None:
+            return f"Unknown tool '{tool_call.function_name}'"
+        try:
+            args = tool.validate_args(tool_call.args)
+        except ToolArgumentsError as e:
+            return str(e)
+        return await tool.acall(**args)
+
     def _format_tool_response(self, tool_call: ToolCall, function_response: str):
         return {
             "tool_call_id": tool_call.id,
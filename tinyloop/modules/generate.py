@@ -1,4 +1,5 @@
 from tinyloop.inference.litellm import LLM
+from tinyloop.utils.metrics import track_module
 
 
 class Generate:
@@ -18,9 +19,11 @@ class Generate:
             **llm_kwargs,
         )
 
+    @track_module("Generate", lambda self: self.model)
     def call(self, prompt: str, **kwargs):
         return self.llm(prompt, **kwargs)
 
+    @track_module("Generate", lambda self: self.model)
     async def acall(self, prompt: str, **kwargs):
         result = await self.llm.acall(prompt, **kwargs)
         return result
@@ -1,10 +1,13 @@
-from typing import List
+from typing import Any, Dict, List, Optional
 
 import mlflow
 from pydantic import BaseModel
 
 from tinyloop.features.function_calling import Tool
+from tinyloop.features.tool_retrieval import ToolRetriever
+from tinyloop.inference.budget import Budget
 from tinyloop.modules.base_loop import BaseLoop
+from tinyloop.utils.metrics import track_module
 from tinyloop.utils.observability import set_trace_custom
 
 mlflow.litellm.autolog()
@@ -20,7 +23,21 @@ class ToolLoop(BaseLoop):
         temperature: float = 1.0,
         system_prompt: str = None,
         llm_kwargs: dict = {},
+        tool_retriever: Optional[ToolRetriever] = None,
+        budget: Optional[Budget] = None,
     ):
+        """
+        Args:
+            tool_retriever: Send only the tools relevant to each iteration
+                instead of the whole catalog. `finish`, pinned tools and
+                tools already used in the run are always sent.
+            budget: Token and dollar limits for all the runs of this loop.
+                A run can also be given its own: `loop(prompt, budget=...)`.
+                Once a budget is spent the run stops with BudgetExceededError.
+        """
+        if budget is not None:
+            llm_kwargs = {**llm_kwargs, "budget": budget}
+
         def finish_func():
             return True
 
@@ -41,22 +58,46 @@ class ToolLoop(BaseLoop):
             llm_kwargs=llm_kwargs,
         )
         self.max_iterations = max_iterations
-
+        self.tool_retriever = tool_retriever
+
+    def _select_tools(
+        self, prompt: str, messages: List[Dict[str, Any]], used: set
+    ) -> List[Tool]:
+        """
+        Get the tools to send for the next iteration.
+        """
+        if self.tool_retriever is None:
+            return self.tools
+        # The task plus the latest step (tool result or assistant text)
+        query = prompt
+        if messages and isinstance(messages[-1].get("content"), str):
+            query = f"{prompt} {messages[-1]['content']}"
+        include = [self.tools_map["finish"]]
+        include.extend(self.tools_map[name] for name in used if name in self.tools_map)
+        return self.tool_retriever.select(query, include=include)
+
+    @track_module("ToolLoop", lambda self: self.llm.model)
     @set_trace_custom(
         mlflow.entities.SpanType.AGENT, lambda self, func: "tinyloop.tool_loop"
     )
-    def __call__(self, prompt: str, **kwargs):
+    def __call__(self, prompt: str, budget: Optional[Budget] = None, **kwargs):
         self.llm.add_message(self.llm._prepare_user_message(prompt))
+        used_tools = set()
         for _ in range(self.max_iterations):
+            messages = self.llm.get_history()
             response = self.llm(
-                messages=self.llm.get_history(), tools=self.tools, **kwargs
+                messages=messages,
+                tools=self._select_tools(prompt, messages, used_tools),
+                budget=budget,
+                # The next iteration extends this request
+                cache_newest=True,
+                **kwargs,
             )
             if response.tool_calls:
                 should_finish = False
                 for tool_call in response.tool_calls:
-                    tool_response = self.tools_map[tool_call.function_name](
-                        **tool_call.args
-                    )
+                    used_tools.add(tool_call.function_name)
+                    tool_response = self._run_tool_call(tool_call)
 
                     self.llm.add_message(
                         self._format_tool_response(tool_call, str(tool_response))
@@ -71,24 +112,32 @@ class ToolLoop(BaseLoop):
         final_response = self.llm(
             messages=self.llm.get_history(),
             response_format=self.output_format,
+            budget=budget,
         )
         return final_response
 
+    @track_module("ToolLoop", lambda self: self.llm.model)
     @set_trace_custom(
         mlflow.entities.SpanType.AGENT, lambda self, func: "tinyloop.tool_loop"
     )
-    async def acall(self, prompt: str, **kwargs):
+    async def acall(self, prompt: str, budget: Optional[Budget] = None, **kwargs):
         self.llm.add_message(self.llm._prepare_user_message(prompt))
+        used_tools = set()
         for _ in range(self.max_iterations):
+            messages = self.llm.get_history()
             response = await self.llm.acall(
-                messages=self.llm.get_history(), tools=self.tools, **kwargs
+                messages=messages,
+                tools=self._select_tools(prompt, messages, used_tools),
+                budget=budget,
+                # The next iteration extends this request
+                cache_newest=True,
+                **kwargs,
             )
             if response.tool_calls:
                 should_finish = False
                 for tool_call in response.tool_calls:
-                    tool_response = await self.tools_map[tool_call.function_name].acall(
-                        **tool_call.args
-                    )
+                    used_tools.add(tool_call.function_name)
+                    tool_response = await self._arun_tool_call(tool_call)
 
                     self.llm.add_message(
                         self._format_tool_response(tool_call, str(tool_response))
@@ -102,6 +151,8 @@ class ToolLoop(BaseLoop):
                     break
 
         final_response = await self.llm.acall(
-            messages=self.llm.get_history(), response_format=self.output_format
+            messages=self.llm.get_history(),
+            response_format=self.output_format,
+            budget=budget,
         )
         return final_response
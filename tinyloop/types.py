@@ -1,16 +1,27 @@
-from typing import Any, Dict, List, Optional
+"""
+Response types.
+
+The types returned by LLM calls are slot-based dataclasses: they are built
+per call and per streamed chunk without validation. Each one converts to
+its pydantic counterpart (`to_model()`, `model_dump()`) when needed.
+"""
+
+from dataclasses import dataclass
+from typing import Any, ClassVar, Dict, List, Optional, Sequence
 
 from litellm.types.utils import ModelResponse
 from pydantic import BaseModel, Field
 
+from tinyloop.inference.budget import TokenUsage
+
 
-class ToolCall(BaseModel):
+class ToolCallModel(BaseModel):
     function_name: str
     args: dict[str, Any]
     id: str
 
 
-class ToolCallDelta(BaseModel):
+class ToolCallDeltaModel(BaseModel):
     id: Optional[str] = None
     function_name: Optional[str] = None
     function_arguments: Optional[str] = None
@@ -22,16 +33,80 @@ class ToolCallResponse(BaseModel):
     metadata: dict[str, Any] = Field(default_factory=dict)
 
 
-class LLMResponse(BaseModel):
+class LLMResponseModel(BaseModel):
     response: Any
+    content: Optional[str] = None
     raw_response: Optional[ModelResponse] = None
-    tool_calls: Optional[List[ToolCall]] = None
+    tool_calls: Optional[List[ToolCallModel]] = None
     message_history: Optional[List[Dict[str, Any]]] = None
+    usage: Optional[TokenUsage] = None
+    # Seconds spent in each phase of the call, see tinyloop.inference.timings
+    timings: Optional[Dict[str, float]] = None
     cost: float
     hidden_fields: dict[str, Any]
 
 
-class LLMStreamingResponse(BaseModel):
+class LLMStreamingResponseModel(BaseModel):
+    id: str
+    response: Any
+    tool_calls: Optional[List[ToolCallModel]] = None
+
+
+class _PydanticConvertible:
+    """Conversion of a lightweight type to its pydantic model."""
+
+    __slots__ = ()
+
+    _model: ClassVar[type[BaseModel]]
+
+    def to_model(self) -> BaseModel:
+        """Get the validated pydantic model of this object."""
+        return self._model.model_validate(self, from_attributes=True)
+
+    def model_dump(self, **kwargs) -> Dict[str, Any]:
+        """Dump this object like the pydantic model would."""
+        return self.to_model().model_dump(**kwargs)
+
+
+@dataclass(slots=True, kw_only=True)
+class ToolCall(_PydanticConvertible):
+    _model: ClassVar[type[BaseModel]] = ToolCallModel
+
+    function_name: str
+    args: dict[str, Any]
+    id: str
+
+
+@dataclass(slots=True, kw_only=True)
+class ToolCallDelta(_PydanticConvertible):
+    _model: ClassVar[type[BaseModel]] = ToolCallDeltaModel
+
+    id: Optional[str] = None
+    function_name: Optional[str] = None
+    function_arguments: Optional[str] = None
+
+
+@dataclass(slots=True, kw_only=True)
+class LLMResponse(_PydanticConvertible):
+    _model: ClassVar[type[BaseModel]] = LLMResponseModel
+
+    response: Any
+    content: Optional[str] = None
+    raw_response: Optional[ModelResponse] = None
+    tool_calls: Optional[List[ToolCall]] = None
+    # A list, or a History view built into a list only when read
+    message_history: Optional[Sequence[Dict[str, Any]]] = None
+    usage: Optional[TokenUsage] = None
+    # Seconds spent in each phase of the call, see tinyloop.inference.timings
+    timings: Optional[Dict[str, float]] = None
+    cost: float
+    hidden_fields: dict[str, Any]
+
+
+@dataclass(slots=True, kw_only=True)
+class LLMStreamingResponse(_PydanticConvertible):
+    _model: ClassVar[type[BaseModel]] = LLMStreamingResponseModel
+
     id: str
     response: Any
     tool_calls: Optional[List[ToolCall]] = None
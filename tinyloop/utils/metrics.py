@@ -0,0 +1,408 @@
+"""
+Operational metrics with Prometheus text exposition.
+
+Counters, gauges and histograms are sharded per thread: each thread updates
+its own values without locking and the shards are only merged when the
+metrics are collected. The shards of finished threads are folded into a
+shared base, so short-lived threads do not accumulate. Calls are labelled by model and by the module they
+run in (`Generate`, `ToolLoop`, `Tool`, or `LLM` when called directly).
+
+Example:
+    from tinyloop.utils.metrics import start_http_server
+
+    start_http_server(9464)  # serves http://localhost:9464/metrics
+"""
+
+import contextvars
+import functools
+import inspect
+import threading
+import time
+import weakref
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, ClassVar, Dict, List, Optional, Sequence, Tuple
+
+Labels = Tuple[str, ...]
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# Module and model of the call in progress, set by `track_module`
+current_module: contextvars.ContextVar[Tuple[str, str]] = contextvars.ContextVar(
+    "tinyloop_module", default=("LLM", "")
+)
+
+
+class _Metric:
+    """Metric whose values are kept in one shard per updating thread."""
+
+    type: ClassVar[str]
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        # Values of the finished threads, then the shard of each thread
+        self._base: Dict[Labels, Any] = {}
+        self._shards: List[Tuple[weakref.ref, Dict[Labels, Any]]] = []
+        self._lock = threading.Lock()
+
+    def _shard(self) -> Dict[Labels, Any]:
+        """Get the values updated by the current thread."""
+        try:
+            return self._local.values
+        except AttributeError:
+            values: Dict[Labels, Any] = {}
+            # Only taken the first time a thread updates the metric
+            with self._lock:
+                self._compact()
+                self._shards.append((weakref.ref(threading.current_thread()), values))
+            self._local.values = values
+            return values
+
+    def _compact(self) -> None:
+        """Fold the shards of finished threads into the base (under the lock)."""
+        live = []
+        for thread_ref, values in self._shards:
+            thread = thread_ref()
+            if thread is not None and thread.is_alive():
+                live.append((thread_ref, values))
+                continue
+            # A finished thread no longer updates its values
+            for labels, value in values.items():
+                self._base[labels] = self._merge(self._base.get(labels), value)
+        self._shards = live
+
+    def _merge(self, total: Any, value: Any) -> Any:
+        return value if total is None else total + value
+
+    def collect(self) -> Dict[Labels, Any]:
+        """Merge the values of every thread, per label values."""
+        with self._lock:
+            self._compact()
+            merged = {
+                labels: self._merge(None, value) for labels, value in self._base.items()
+            }
+            shards = [values for _, values in self._shards]
+        for shard in shards:
+            for labels, value in shard.copy().items():
+                merged[labels] = self._merge(merged.get(labels), value)
+        return merged
+
+    def reset(self) -> None:
+        with self._lock:
+            self._base.clear()
+            for _, shard in self._shards:
+                shard.clear()
+
+    def _samples(self) -> List[Tuple[str, Labels, Tuple[str, ...], float]]:
+        return [
+            (self.name, labels, (), value)
+            for labels, value in sorted(self.collect().items())
+        ]
+
+
+class Counter(_Metric):
+    """Value that only goes up, e.g. requests or tokens."""
+
+    type = "counter"
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        shard = self._shard()
+        shard[labels] = shard.get(labels, 0.0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self.collect().get(labels, 0.0)
+
+
+class Gauge(Counter):
+    """Value that goes up and down, e.g. requests in flight."""
+
+    type = "gauge"
+
+    def dec(self, *labels: str, amount: float = 1.0) -> None:
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(_Metric):
+    """
+    Distribution of observed values, e.g. latencies.
+
+    Args:
+        buckets: Upper bounds of the buckets, in increasing order
+    """
+
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, *labels: str, value: float) -> None:
+        shard = self._shard()
+        # Counts per bucket (the last one being +Inf), then the sum
+        counts = shard.get(labels)
+        if counts is None:
+            counts = shard[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        counts[bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    def _merge(self, total: Any, value: Any) -> Any:
+        if total is None:
+            return list(value)
+        return [a + b for a, b in zip(total, value)]
+
+    def count(self, *labels: str) -> int:
+        counts = self.collect().get(labels)
+        return sum(counts[:-1]) if counts else 0
+
+    def sum(self, *labels: str) -> float:
+        counts = self.collect().get(labels)
+        return counts[-1] if counts else 0.0
+
+    def _samples(self) -> List[Tuple[str, Labels, Tuple[str, ...], float]]:
+        samples = []
+        for labels, counts in sorted(self.collect().items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(float(bound))
+                samples.append((f"{self.name}_bucket", labels, (le,), cumulative))
+            samples.append((f"{self.name}_sum", labels, (), counts[-1]))
+            samples.append((f"{self.name}_count", labels, (), cumulative))
+        return samples
+
+
+class MetricsRegistry:
+    """Named metrics, exposed together in the Prometheus text format."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls: type, name: str, *args, **kwargs) -> Any:
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            elif type(metric) is not cls:
+                raise ValueError(f"Metric '{name}' is already a {metric.type}")
+            return metric
+
+    def counter(
+        self, name: str, documentation: str, labelnames: Sequence[str] = ()
+    ) -> Counter:
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(
+        self, name: str, documentation: str, labelnames: Sequence[str] = ()
+    ) -> Gauge:
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._get_or_create(
+            Histogram, name, documentation, labelnames, buckets=buckets
+        )
+
+    def reset(self) -> None:
+        """Clear the values of every metric, keeping the metrics."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            metric.reset()
+
+    def exposition(self) -> str:
+        """Render every metric in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {_escape_help(metric.documentation)}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, labels, le, value in metric._samples():
+                names = metric.labelnames + (("le",) if le else ())
+                pairs = ",".join(
+                    f'{key}="{_escape_label(str(val))}"'
+                    for key, val in zip(names, labels + le)
+                )
+                lines.append(
+                    f"{name}{{{pairs}}} {float(value)!r}"
+                    if pairs
+                    else f"{name} {float(value)!r}"
+                )
+        return "\n".join(lines) + "\n"
+
+
+def _escape_help(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("\n", "\\n")
+
+
+def _escape_label(text: str) -> str:
+    return _escape_help(text).replace('"', '\\"')
+
+
+# Shared by every LLM instance and module
+registry = MetricsRegistry()
+
+
+class LLMMetrics:
+    """Metrics of LLM calls, labelled by model and calling module."""
+
+    def __init__(self, registry: MetricsRegistry):
+        labels = ("model", "module")
+        self.requests = registry.counter(
+            "tinyloop_llm_requests_total", "LLM calls", (*labels, "status")
+        )
+        self.in_flight = registry.gauge(
+            "tinyloop_llm_requests_in_flight", "LLM calls in progress", labels
+        )
+        self.latency = registry.histogram(
+            "tinyloop_llm_request_duration_seconds", "Duration of LLM calls", labels
+        )
+        self.ttft = registry.histogram(
+            "tinyloop_llm_time_to_first_token_seconds",
+            "Time to the first streamed chunk of LLM calls",
+            labels,
+        )
+        self.tokens = registry.counter(
+            "tinyloop_llm_tokens_total",
+            "Tokens used by LLM calls, by type (input, output, cached, "
+            "cache_write, reasoning)",
+            (*labels, "type"),
+        )
+        self.cost = registry.counter(
+            "tinyloop_llm_cost_dollars_total", "Cost of LLM calls", labels
+        )
+        self.retries = registry.counter(
+            "tinyloop_llm_retries_total", "Retries of failed LLM calls", labels
+        )
+        self.cache_requests = registry.counter(
+            "tinyloop_llm_response_cache_requests_total",
+            "LLM calls looked up in the response cache, by result (hit, miss)",
+            (*labels, "result"),
+        )
+
+
+class ModuleMetrics:
+    """Metrics of module calls (`Generate`, `ToolLoop`, `Tool`)."""
+
+    def __init__(self, registry: MetricsRegistry):
+        labels = ("module", "model")
+        self.calls = registry.counter(
+            "tinyloop_module_calls_total", "Module calls", (*labels, "status")
+        )
+        self.in_flight = registry.gauge(
+            "tinyloop_module_calls_in_flight", "Module calls in progress", labels
+        )
+        self.latency = registry.histogram(
+            "tinyloop_module_call_duration_seconds", "Duration of module calls", labels
+        )
+
+
+llm_metrics = LLMMetrics(registry)
+module_metrics = ModuleMetrics(registry)
+
+
+def track_module(module: str, get_model: Optional[Callable[[Any], str]] = None):
+    """
+    Record the calls of a module method and label the LLM calls made
+    inside it with the module.
+
+    Args:
+        module: Module label, e.g. "ToolLoop"
+        get_model: Get the model from the instance; the model of the
+            enclosing module is used if None
+    """
+
+    def decorator(func):
+        def enter(self) -> Tuple[Tuple[str, str], contextvars.Token]:
+            model = get_model(self) if get_model else current_module.get()[1]
+            labels = (module, model)
+            module_metrics.in_flight.inc(*labels)
+            return labels, current_module.set(labels)
+
+        def leave(labels, token, start: float, status: str) -> None:
+            current_module.reset(token)
+            module_metrics.in_flight.dec(*labels)
+            module_metrics.calls.inc(*labels, status)
+            module_metrics.latency.observe(*labels, value=time.perf_counter() - start)
+
+        if inspect.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(self, *args, **kwargs):
+                labels, token = enter(self)
+                start = time.perf_counter()
+                status = "error"
+                try:
+                    result = await func(self, *args, **kwargs)
+                    status = "ok"
+                    return result
+                finally:
+                    leave(labels, token, start, status)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            labels, token = enter(self)
+            start = time.perf_counter()
+            status = "error"
+            try:
+                result = func(self, *args, **kwargs)
+                status = "ok"
+                return result
+            finally:
+                leave(labels, token, start, status)
+
+        return wrapper
+
+    return decorator
+
+
+def generate_latest(registry: MetricsRegistry = registry) -> str:
+    """Get the metrics in the Prometheus text exposition format."""
+    return registry.exposition()
+
+
+def start_http_server(
+    port: int, addr: str = "", registry: MetricsRegistry = registry
+) -> ThreadingHTTPServer:
+    """
+    Serve the metrics on `/metrics` from a daemon thread.
+
+    Returns:
+        The server, to be stopped with `shutdown()`
+    """
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.exposition().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((addr, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server